@@ -40,7 +40,7 @@ def main(argv):
 
     for dictdata_id in dictdata_ids:
         for head, translation in cr.heads_with_translations_for_dictdata_id(dictdata_id):
-            graphemes = qlc.utils.parseGraphemes(head)
+            graphemes = qlc.utils.parse_graphemes(head)
             for grapheme in graphemes:
                 grapheme_count += 1
                 grapheme_frequency_dict[grapheme] += 1
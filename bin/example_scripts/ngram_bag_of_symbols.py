@@ -21,97 +21,85 @@ Authors:
 #-----------------------------------------------------------------------------
 # Imports
 #-----------------------------------------------------------------------------
-import sys, os, itertools, collections
+import sys, os
 
 import numpy
-import scipy.misc
 
 import qlc
 from qlc.corpusreader import CorpusReaderWordlist
 from qlc.orthography import OrthographyParser
-from qlc.datatypes import WordlistStoreWithNgrams
+from qlc.matrix import Matrix
+from qlc.ngramtensor import LanguageConceptNgramTensor, expectation
 
 def main(argv):
 
     if len(argv) < 2:
-        print("call: counterparts_huber1992.py data_path")
+        print("call: ngram_bag_of_symbols.py data_path [language1 language2 | --all [processes]]")
         exit(1)
 
     cr = CorpusReaderWordlist(argv[1])
-    o = OrthographyParser(qlc.get_data("orthography_profiles/huber1992.txt"))
+    o = OrthographyParser(qlc.get_orthography_profile("huber1992.txt"))
     
     wordlist_iterator = ( (wordlistdata_id, concept, counterpart)
         for wordlistdata_id in cr.wordlistdata_ids_for_bibtex_key('huber1992')
         for concept, counterpart in cr.concepts_with_counterparts_for_wordlistdata_id(wordlistdata_id)
     )
+
+    # the Matrix writes the unparsable counterparts to output/unparsables.txt
+    if not os.path.isdir("output"):
+        os.makedirs("output")
+    m = Matrix(wordlist_iterator, o, "graphemes", 2)
+
+    # concepts x bigrams matrix for each language
+    tensor = LanguageConceptNgramTensor.from_matrix(m)
+
+    booknames = dict( (wordlistdata_id, cr.get_language_bookname_for_wordlistdata_id(wordlistdata_id))
+        for wordlistdata_id in tensor.languages )
+    wordlistdata_ids = dict( (bookname, wordlistdata_id)
+        for wordlistdata_id, bookname in booknames.items() )
+
+    if len(argv) > 2 and argv[2] == "--all":
+        processes = int(argv[3]) if len(argv) > 3 else None
+        print("Comparing all {0} languages...".format(len(tensor.languages)))
+        for language1, language2, (k, sig) in tensor.pairwise_significance(processes=processes):
+            if sig.nnz == 0:
+                continue
+            i = sig.data.argmax()
+            row, col = sig.nonzero()
+            print("{0}\t{1}\t{2}\t{3}\t{4}".format(booknames[language1], booknames[language2],
+                tensor.ngrams[row[i]], tensor.ngrams[col[i]], sig.data[i]))
+        return
+
+    language1, language2 = ("bora", "muinane") if len(argv) < 4 else (argv[2], argv[3])
+    print("Begin comparison of two languages... {0} and {1}!".format(language1, language2))
+    print()
     
-    wordlist = WordlistStoreWithNgrams(wordlist_iterator, o)
-    
-    matrix_dict = dict()
-
-    for wordlistdata_id in wordlist.languages:
-
-        language_bookname = cr.get_language_bookname_for_wordlistdata_id(wordlistdata_id)
-        #language_code = cr.get_language_code_for_wordlistdata_id(wordlistdata_id)
-
-        if language_bookname != "bora" and language_bookname != "muinane":
-            continue
-
-        print("Creating matrix for language {0}...".format(language_bookname))
-                
-        matrix = numpy.zeros( (len(wordlist.concepts), len(wordlist.unique_ngrams)) )
-        
-        for i, concept in enumerate(wordlist.concepts):
-            for j, n in enumerate(wordlist.unique_ngrams):
-                if n in wordlist.counterpart_for_language_and_concept(wordlistdata_id, concept):
-                    matrix[i][j] = 1
-        
-        matrix_dict[language_bookname] = matrix
-    
-    # sum up over all languages
-    #languages = matrix_dict.keys()
-    #matrix_languages = numpy.zeros( (len(languages), len(master_ngrams)) )
-    #for i, l in enumerate(languages):
-    #    matrix_languages[i] = numpy.sum(matrix_dict[l], 0)[0]
-            
-    #numpy.savetxt("matrix_languages.txt", matrix_languages)
-    
-    print('Begin comparison of two languages... Bora and Muninane!')
-    print
-    
-    languages_tuples = [ ("bora", "muinane") ]
-    
-    # for each language to get a matrix of bigrams by meanings
-    
-    for language1, language2 in languages_tuples:
-        matrix1 = matrix_dict[language1]
-        matrix2 = matrix_dict[language2]
-        
-        n1 = wordlist.unique_ngrams.index(('e', '#'))
-        n2 = wordlist.unique_ngrams.index(('o', '#'))
-        
-        matrix_cooccurrences = numpy.dot(numpy.transpose(matrix1), matrix2)
-        
-        vector1 = numpy.sum(matrix1, 0)
-        vector2 = numpy.sum(matrix2, 0)
-        
-        print(vector1[n1])
-        print(vector2[n2])
-        
-        print(matrix_cooccurrences[n1][n2])
-        
-        matrix_expectations = numpy.outer(vector1, vector2) / len(wordlist.concepts)
-
-        print(matrix_expectations[n1][n2])
-
-        matrix_significance = matrix_expectations + \
-                              numpy.log(scipy.misc.factorial(matrix_cooccurrences)) - \
-                              matrix_cooccurrences * numpy.log(matrix_expectations)
-        
-        numpy.savetxt("matrix_significance.txt", matrix_significance)
-        
-        print(matrix_significance[n1][n2])
-        
+    l1, l2 = wordlistdata_ids[language1], wordlistdata_ids[language2]
+    k, matrix_significance = tensor.significance(l1, l2)
+
+    n1 = tensor.ngrams_index["e#"]
+    n2 = tensor.ngrams_index["o#"]
+
+    vector1 = tensor.counts(l1)
+    vector2 = tensor.counts(l2)
+
+    print(vector1[n1])
+    print(vector2[n2])
+
+    print(k[n1, n2])
+
+    print(expectation(vector1, vector2, len(tensor.concepts), [ n1 ], [ n2 ])[0][0])
+
+    # the significance of the ngram pairs that co-occur; for all other pairs
+    # it is the expectation
+    row, col = matrix_significance.nonzero()
+    numpy.savetxt("matrix_significance.txt",
+        numpy.column_stack([ row, col, matrix_significance.data ]), fmt="%d %d %f")
+
+    if k[n1, n2] > 0:
+        print(matrix_significance[n1, n2])
+    else:
+        print(expectation(vector1, vector2, len(tensor.concepts), [ n1 ], [ n2 ])[0][0])
 
     
 if __name__ == "__main__":
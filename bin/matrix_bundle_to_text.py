@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Copyright (c) 2012, Quantitative Language Comparison Team
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""
+Script that converts a matrix bundle written by qlc.matrix (e.g.
+output/huber1992/huber1992.npz) into the old text layout: the MatrixMarket
+files of the WG, WL, WM and GP matrices and the header files.
+
+Usage: python matrix_bundle_to_text.py bundle output_dir source
+"""
+
+import sys
+
+from qlc.matrix import bundle_to_text
+
+def main(argv):
+
+    if len(argv) != 4:
+        print("call: matrix_bundle_to_text.py bundle output_dir source")
+        print()
+        print("python matrix_bundle_to_text.py output/huber1992/huber1992.npz output/huber1992 huber1992")
+        sys.exit(1)
+
+    bundle_to_text(argv[1], argv[2], argv[3])
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -1,19 +1,21 @@
 # -*- coding: utf-8 -*-
-#!/usr/bin/env python
+#!/usr/bin/env python3
 
-import codecs, unicodedata, sys
+import codecs, sys
+import qlc.utils
 
 def main(argv):
 
     if len(argv) < 3:
-        print "call: nfd2nfc.py in.txt out.txt"
+        print("call: nfd2nfc.py in.txt out.txt")
         exit(1)
         
     IN = codecs.open(argv[1], "r", "utf-8")
     OUT = codecs.open(argv[2], "w", "utf-8")
     
     for line in IN:
-        o = unicodedata.normalize("NFC", line)
+        # lines that are already NFC are written as they are
+        o = qlc.utils.normalize(line, "NFC")
         OUT.write(o)
 
 if __name__ == "__main__":
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Copyright (c) 2012, Quantitative Language Comparison Team
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""
+Script that runs the orthography profiles of one or more sources over the
+wordlist counterparts of the corpus and writes a JSON report with parse rate,
+unparsable rate and most frequent unmatched graphemes per source, the
+longest and slowest inputs and the throughput.
+
+Usage: python orthography_coverage.py data_path bibtex_key [bibtex_key ...]
+"""
+
+import sys
+
+from qlc.corpusreader import CorpusReaderWordlist
+from qlc.orthography import OrthographyProfileRegistry
+from qlc.orthographycoverage import OrthographyCoverage
+
+def main(argv):
+
+    if len(argv) < 3:
+        print("call: orthography_coverage.py data_path bibtex_key [bibtex_key ...]")
+        print()
+        print("python orthography_coverage.py data/csv huber1992 > huber1992_coverage.json")
+        sys.exit(1)
+
+    cr = CorpusReaderWordlist(argv[1])
+    print("Data loaded", file=sys.stderr)
+
+    registry = OrthographyProfileRegistry()
+    coverage = OrthographyCoverage(registry)
+
+    for bibtex_key in argv[2:]:
+        if bibtex_key not in registry:
+            print("There is no orthography profile for the source {0}.".format(bibtex_key), file=sys.stderr)
+            sys.exit(1)
+        coverage.add_records( (bibtex_key, wordlistdata_id, concept, counterpart)
+            for wordlistdata_id in cr.wordlistdata_ids_for_bibtex_key(bibtex_key)
+            for concept, counterpart in cr.concepts_with_counterparts_for_wordlistdata_id(wordlistdata_id) )
+
+    print(coverage.to_json())
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -43,12 +43,12 @@ def main(argv):
 
     stemmer = Stemmer.Stemmer('spanish')
     stopwords = qlc.utils.stopwords_from_file("data/stopwords/spa.txt")
+    normalizer = qlc.utils.PhraseNormalizer(stopwords, stemmer)
 
     i = 0    
     for n in nodes:
         if "lang" in gr.node[n] and gr.node[n]["lang"] == "spa":
-            phrase_without_stopwords = qlc.utils.remove_stopwords(n, stopwords)
-            phrase_stems = qlc.utils.stem_phrase(phrase_without_stopwords, stemmer, split_multiwords)
+            phrase_stems = normalizer.normalize(n, split_multiwords)
             for stem in phrase_stems:
                 stem = stem + "|stem"
                 gr.add_node(stem, is_stem=True)
@@ -14,6 +14,7 @@ import networkx
 
 stopwords = qlc.utils.stopwords_from_file("src/qlc/data/stopwords/spa.txt")
 stemmer = SpanishStemmer(False)
+normalizer = qlc.utils.PhraseNormalizer(stopwords, stemmer)
 
 cr = CorpusReaderDict("data")
 dictdata_ids = cr.dictdata_ids_for_component("Witotoan")
@@ -46,8 +47,7 @@ for dictdata_id in dictdata_ids:
 
         head_with_source = re_quotes.sub('', "{0}|{1}".format(head, bibtex_key))
         translation = re_quotes.sub('', translation)
-        translation = qlc.utils.remove_stopwords(translation, stopwords)
-        translation = qlc.utils.stem_phrase(translation, stemmer, False)
+        translation = normalizer.normalize(translation)
         if len(translation) > 0:
             if len(translation) > 1:
                 print("error")
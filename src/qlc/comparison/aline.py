@@ -1,8 +1,10 @@
 import sys, copy
-from alineutils import *
-from types import *
 from math import log
 
+import numpy
+
+from qlc.comparison.alineutils import *
+
 # supported types of input strings
 (ALINE, ASJP) = range(2)
 
@@ -30,7 +32,7 @@ class AlineRepr(object):
             if input_string[i] in self.__letters.keys():
                 found = True
                 output_vector.append(copy.copy(self.__letters[input_string[i]]))
-            elif self.__modifiers.has_key(input_string[i]):
+            elif input_string[i] in self.__modifiers:
                 found = True
                 output_vector[len(output_vector) - 1][self.__modifiers[input_string[i]]['feature']] = self.__modifiers[input_string[i]]['value']
 
@@ -91,8 +93,12 @@ class Aline(object):
         'round': 5
     }
 
-    def __init__(self, x, y, pretty_print = True):
+    # the scoring models of the Aline classes, see scoring_model()
+    _scoring_models = {}
+
+    def __init__(self, x, y, pretty_print = True, compiled = True):
         self.pretty_print = pretty_print
+        self.compiled = compiled
         self.found = False
         self.x = x
         self.y = y
@@ -111,7 +117,7 @@ class Aline(object):
         return int(self.c_sub - s_d - s_v_p - s_v_q)
     
     def sigma_exp(self, p, q1, q2, output = False):
-        if q1.has_key('null') or q2.has_key('null'):
+        if 'null' in q1 or 'null' in q2:
             return -Infinity
         s_d_p_q1 = self.delta(p, q1)
         s_d_p_q2 = self.delta(p, q2)
@@ -128,7 +134,7 @@ class Aline(object):
             return 0
 
     def delta(self, p, q, output = False):
-        if (p.has_key('vowel') and p['vowel'] == 1) and (q.has_key('vowel') and q['vowel'] == 1):
+        if p.get('vowel') == 1 and q.get('vowel') == 1:
             self.output_func(output, "delta features: r_v")
             features = self.r_v
         else:
@@ -141,14 +147,14 @@ class Aline(object):
 
     def diff(self, p, q, feature, output = False):
         self.output_func(output, "feature: %s p[feature]: %s q[feature]: %s feature_salience: %s" % (feature, p.get(feature, 0), q.get(feature, 0), self.feature_salience[feature]))
-        temp = sys.maxint
+        temp = sys.maxsize
         p_val = p.get(feature, 0)
         q_val = q.get(feature, 0)
-        if type(p_val) is not ListType and type(p_val) is not TupleType:
+        if not isinstance(p_val, (list, tuple)):
             p_vals = (p_val, )
         else:
             p_vals = p_val
-        if type(q_val) is not ListType and type(q_val) is not TupleType:
+        if not isinstance(q_val, (list, tuple)):
             q_vals = (q_val, )
         else:
             q_vals = q_val
@@ -164,23 +170,57 @@ class Aline(object):
         if output:
             print(string)
 
+    @classmethod
+    def scoring_model(cls):
+        """
+        Returns the AlineScoring model with the costs of this class. It is
+        built once and shared by all instances of the class.
+        """
+        if cls not in Aline._scoring_models:
+            Aline._scoring_models[cls] = AlineScoring(cls)
+        return Aline._scoring_models[cls]
+
     def compute_similarity(self):
         if self.S is not None:
             return
+        if self.compiled:
+            self._compute_similarity_compiled()
+        else:
+            self._compute_similarity()
+                
+        self.T = (1-self.epsilon) * max([ max(w) for w in self.S ])
+        self.out = []
+        self.out_score = (max([ max(row) for row in self.S ]) // 100)
+        return
+
+    def _compute_similarity(self):
         self.S = AlineMatrix(self.x, self.y)
-        for i in xrange(1, len(self.x) + 1):
-            for j in xrange(1, len(self.y) + 1):
+        for i in range(1, len(self.x) + 1):
+            for j in range(1, len(self.y) + 1):
                 self.S[i][j] = max(self.S[i-1][j] + self.sigma_skip(self.x[i]),
                                    self.S[i][j-1] + self.sigma_skip(self.y[j]),
                                    self.S[i-1][j-1] + self.sigma_sub(self.x[i], self.y[j]),
                                    self.S[i-1][j-2] + self.sigma_exp(self.x[i], self.y[j-1],self.y[j]),
                                    self.S[i-2][j-1] + self.sigma_exp(self.y[j], self.x[i-1], self.x[i]),
                                    0)
-                
-        self.T = (1-self.epsilon) * max([ max(w) for w in self.S ])
-        self.out = []
-        self.out_score = (max([ max(row) for row in self.S ]) / 100)
-        return
+
+    def _compute_similarity_compiled(self):
+        # the same recurrence with the scores looked up in the tables of
+        # the scoring model
+        model = self.scoring_model()
+        skip_x, skip_y, sub, exp_x, exp_y = [ table.tolist() for table in
+            model.pair_tables(model.encode(self.x), model.encode(self.y)) ]
+        self.S = AlineMatrix(self.x, self.y)
+        for i in range(1, len(self.x) + 1):
+            row, up, up2 = self.S[i], self.S[i-1], self.S[i-2]
+            sub_i, exp_x_i, exp_y_i = sub[i], exp_x[i], exp_y[i]
+            for j in range(1, len(self.y) + 1):
+                row[j] = int(max(up[j] + skip_x[i],
+                                 row[j-1] + skip_y[j],
+                                 up[j-1] + sub_i[j],
+                                 up[j-2] + exp_x_i[j],
+                                 up2[j-1] + exp_y_i[j],
+                                 0))
 
     def get_similarity(self):
         if self.S is None:
@@ -191,10 +231,15 @@ class Aline(object):
         if self.x.input_string != self.y.input_string:
             self.self_similarity = -Infinity;
             return
-        sum = 0
-        for i in xrange(1, len(self.x) + 1):
-            sum += self.sigma_sub(self.x[i], self.y[i])
-        self.self_similarity = sum / 100
+        if self.compiled:
+            model = self.scoring_model()
+            ids = model.encode(self.x)[1:]
+            sum = int(model.sub[ids, ids].sum())
+        else:
+            sum = 0
+            for i in range(1, len(self.x) + 1):
+                sum += self.sigma_sub(self.x[i], self.y[i])
+        self.self_similarity = sum // 100
         return
 
     def get_self_similarity(self):
@@ -203,8 +248,8 @@ class Aline(object):
         return self.self_similarity
 
     def get_normalized_similarity(self):
-        AlineX = Aline(self.x, self.x)
-        AlineY = Aline(self.y, self.y)
+        AlineX = self.__class__(self.x, self.x, compiled = self.compiled)
+        AlineY = self.__class__(self.y, self.y, compiled = self.compiled)
         s = self.get_similarity()
         s1 = AlineX.get_self_similarity()
         s2 = AlineY.get_self_similarity()
@@ -288,6 +333,261 @@ class Aline(object):
         print(out_string_1)
         print(out_string_2)
 
+class AlineScoring(object):
+    """
+    Compiled scoring model of an Aline class. Segments, i.e. the feature
+    dictionaries of an AlineRepr, are encoded as integer IDs, and the
+    feature distances and scores of the segments are computed once, so that
+    an alignment only looks them up in arrays:
+
+        delta[p, q] = delta(p, q)
+        vowel[p] = vowel_cost(p)
+        sub[p, q] = sigma_sub(p, q)
+        skip[p] = sigma_skip(p)
+
+    The expansion scores sigma_exp(p, q1, q2) are computed from the delta
+    and vowel tables with array operations, see expansion(); a table of all
+    triples would grow with the cube of the segments with modifiers.
+
+    ID 0 is the empty segment before the first segment of a string, and all
+    substitution and expansion scores with it are -Infinity.
+
+    The tables are built for the letters of ALINE and ASJP strings when the
+    model is created. Segments with modifiers are added when they are
+    encoded for the first time.
+    """
+
+    def __init__(self, aline_class = Aline):
+        """
+        Constructor of AlineScoring class.
+
+        Parameters
+        ----------
+        aline_class : class
+            Aline or a subclass with other costs or feature saliences
+
+        Returns
+        -------
+        Nothing
+        """
+        self.costs = aline_class(None, None)
+        self.segments = [ {'null': 1, 'input_string': 'NaS'} ]
+        self.ids = {}
+        self.delta = numpy.zeros((1, 1))
+        self.vowel = numpy.zeros(1)
+        self.add_segments(list(aline_letters.values()) + list(asjp_letters.values()))
+
+    def _key(self, segment):
+        return tuple(sorted( (feature, value) for feature, value in segment.items()
+            if feature != 'input_string' ))
+
+    def add_segments(self, segments):
+        """
+        Adds segments to the inventory and updates the tables.
+        """
+        n_old = len(self.segments)
+        for segment in segments:
+            key = self._key(segment)
+            if key not in self.ids:
+                self.ids[key] = len(self.segments)
+                self.segments.append(segment)
+        n = len(self.segments)
+        if n == n_old:
+            return
+
+        delta = numpy.zeros((n, n))
+        delta[:n_old, :n_old] = self.delta
+        vowel = numpy.zeros(n)
+        vowel[:n_old] = self.vowel
+        for i in range(n_old, n):
+            vowel[i] = self.costs.vowel_cost(self.segments[i])
+            for j in range(1, i + 1):
+                # delta() is symmetric
+                delta[i, j] = delta[j, i] = self.costs.delta(self.segments[i], self.segments[j])
+        self.delta = delta
+        self.vowel = vowel
+        self._build_tables()
+
+    def _build_tables(self):
+        costs, delta, vowel = self.costs, self.delta, self.vowel
+        n = len(self.segments)
+
+        self.skip = numpy.full(n, float(costs.c_skip))
+
+        # int() in sigma_sub() and sigma_exp() truncates
+        self.sub = numpy.trunc(costs.c_sub - delta - vowel[:, None] - vowel[None, :])
+        self.sub[0, :] = self.sub[:, 0] = -Infinity
+
+    def expansion(self, p, q1, q2):
+        """
+        Returns the scores sigma_exp(p, q1, q2) for arrays of segment IDs.
+        """
+        p, q1, q2 = numpy.broadcast_arrays(p, q1, q2)
+        delta1 = self.delta[p, q1]
+        delta2 = self.delta[p, q2]
+        scores = numpy.trunc(self.costs.c_exp - delta1 - delta2 - self.vowel[p]
+            - numpy.maximum(self.vowel[q1], self.vowel[q2]))
+        # the delta of the empty segment 0 is 0 as well
+        scores[(delta1 == 0) | (delta2 == 0)] = -Infinity
+        return scores
+
+    def encode(self, aline_repr):
+        """
+        Returns the IDs of the segments of an AlineRepr as an array, with
+        the empty segment 0 at index 0 so that the indices are the same as
+        for the AlineRepr.
+        """
+        segments = list(aline_repr)
+        keys = [ self._key(segment) for segment in segments ]
+        if any(key not in self.ids for key in keys):
+            self.add_segments(segments)
+        return numpy.array([ 0 ] + [ self.ids[key] for key in keys ], dtype=numpy.intp)
+
+    def pair_tables(self, x, y):
+        """
+        Returns the scores of the cells of the alignment matrix of two
+        encoded strings.
+
+        Returns
+        -------
+        skip_x, skip_y : array
+            the scores for skipping x[i] and y[j]
+        sub : array
+            (len(x), len(y)), the scores for substituting x[i] and y[j]
+        exp_x, exp_y : array
+            (len(x), len(y)), the scores for expanding x[i] to y[j-1] y[j]
+            and y[j] to x[i-1] x[i]
+        """
+        x_prev = numpy.concatenate(([ 0 ], x[:-1]))
+        y_prev = numpy.concatenate(([ 0 ], y[:-1]))
+        return (self.skip[x], self.skip[y],
+                self.sub[x[:, None], y[None, :]],
+                self.expansion(x[:, None], y_prev[None, :], y[None, :]),
+                self.expansion(y[None, :], x_prev[:, None], x[:, None]))
+
+class AlineEngine(object):
+    """
+    ALINE similarities of many pairs of strings. The results are the same
+    as those of Aline, but the alignment matrix is computed with NumPy: the
+    cells of an anti-diagonal i + j = d only depend on the previous three
+    anti-diagonals, so each anti-diagonal is computed with a few vector
+    operations on the score tables of an AlineScoring model.
+
+    The matrix is stored in a preallocated buffer with two rows and columns
+    of -Infinity before row and column 0, so the cells (i-2, j-1) and
+    (i-1, j-2) of the expansions need no bounds checks.
+
+    Example:
+
+    >>> engine = AlineEngine(ASJP)
+    >>> engine.similarity("hant", "hEnd")
+    >>> engine.distance("hant", "mano")
+    """
+
+    def __init__(self, string_type = ALINE, aline_class = Aline):
+        """
+        Constructor of AlineEngine class.
+
+        Parameters
+        ----------
+        string_type : int
+            ALINE or ASJP, the format of the input strings
+        aline_class : class
+            Aline or a subclass with other costs or feature saliences
+
+        Returns
+        -------
+        Nothing
+        """
+        self.string_type = string_type
+        self.model = aline_class.scoring_model()
+        self._encoded = {}
+        self._self_similarities = {}
+        self._buffer = numpy.empty(0)
+
+    def encode(self, string):
+        """
+        Returns the segment IDs of a string, see AlineScoring.encode().
+        """
+        if string not in self._encoded:
+            self._encoded[string] = self.model.encode(AlineRepr(string, self.string_type))
+        return self._encoded[string]
+
+    def _compute(self, x, y):
+        n, m = len(x) - 1, len(y) - 1
+        width = m + 3
+        if len(self._buffer) < (n + 3) * width:
+            self._buffer = numpy.empty(2 * (n + 3) * width)
+        S = self._buffer[:(n + 3) * width].reshape(n + 3, width)
+        S[:2, :] = -Infinity
+        S[:, :2] = -Infinity
+        S[2, 2:] = 0
+        S[2:, 2] = 0
+        if n == 0 or m == 0:
+            return S
+
+        skip_x, skip_y, sub, exp_x, exp_y = self.model.pair_tables(x, y)
+        sub, exp_x, exp_y = sub.ravel(), exp_x.ravel(), exp_y.ravel()
+
+        # the cells of an anti-diagonal are strided views of the flat arrays
+        flat = self._buffer
+        step = width - 1
+        for d in range(2, n + m + 1):
+            i0, i1 = max(1, d - m), min(n, d - 1)
+            count = i1 - i0 + 1
+            start = (i0 + 2) * width + d - i0 + 2
+            cells = slice(start, start + (count - 1) * step + 1, step)
+            def shifted(offset):
+                return flat[start + offset:start + offset + (count - 1) * step + 1:step]
+            table_start = i0 * (m + 1) + d - i0
+            table = slice(table_start, table_start + (count - 1) * m + 1, m)
+
+            best = shifted(-width) + skip_x[i0:i1 + 1]
+            numpy.maximum(best, shifted(-1) + skip_y[d - i1:d - i0 + 1][::-1], out=best)
+            numpy.maximum(best, shifted(-width - 1) + sub[table], out=best)
+            numpy.maximum(best, shifted(-width - 2) + exp_x[table], out=best)
+            numpy.maximum(best, shifted(-2 * width - 1) + exp_y[table], out=best)
+            numpy.maximum(best, 0, out=best)
+            flat[cells] = best
+        return S
+
+    def score_matrix(self, x, y):
+        """
+        Returns the alignment matrix of two strings as an integer array,
+        with the same values as Aline.S.
+        """
+        return self._compute(self.encode(x), self.encode(y))[2:, 2:].astype(numpy.int64)
+
+    def similarity(self, x, y):
+        """
+        Returns the similarity of two strings, like Aline.get_similarity().
+        """
+        return int(self._compute(self.encode(x), self.encode(y))[2:, 2:].max()) // 100
+
+    def self_similarity(self, x):
+        """
+        Returns the self similarity of a string, like
+        Aline.get_self_similarity().
+        """
+        if x not in self._self_similarities:
+            ids = self.encode(x)[1:]
+            self._self_similarities[x] = int(self.model.sub[ids, ids].sum()) // 100
+        return self._self_similarities[x]
+
+    def normalized_similarity(self, x, y):
+        """
+        Returns the similarity of two strings divided by the mean of their
+        self similarities, like Aline.get_normalized_similarity().
+        """
+        s = self.similarity(x, y)
+        return float((2*s))/float((self.self_similarity(x) + self.self_similarity(y)))
+
+    def distance(self, x, y):
+        return 1 - self.normalized_similarity(x, y)
+
+    def geographic_distance(self, x, y):
+        return -1 * log(self.normalized_similarity(x, y))
+
 
 if __name__ == '__main__':
     from optparse import OptionParser
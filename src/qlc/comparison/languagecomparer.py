@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-import aline
+from qlc.comparison import aline
 import numpy
 import sys
 
@@ -12,6 +12,7 @@ class LanguageComparer(object):
         self.__matrix = None
         self.__input_string_type = input_string_type
         self.__divided = divided
+        self.__engine = aline.AlineEngine(input_string_type)
 
     def compare_individual_languages(self, x, y):
         return "%s,%s\t%s" % (x, y, self.__compare_languages(self.__data[x], self.__data[y]))
@@ -19,8 +20,8 @@ class LanguageComparer(object):
     def generate_matrix(self):
         if self.__matrix == None:
             self.__matrix = numpy.zeros( (self.__nr_of_languages, self.__nr_of_languages) )
-            for i in xrange(self.__nr_of_languages):
-                for j in xrange(i+1, self.__nr_of_languages):
+            for i in range(self.__nr_of_languages):
+                for j in range(i+1, self.__nr_of_languages):
                     sys.stderr.write("language count: %s,%s\n" % (i, j))
                     
                     self.__matrix[i][j] = self.__matrix[j][i] = self.__compare_languages(self.__data[i], self.__data[j])
@@ -34,19 +35,15 @@ class LanguageComparer(object):
     def __str__(self):
         return self.__matrix.__str__()
         
-    def __aline_repr(self, string):
-        return aline.AlineRepr(string, self.__input_string_type)
-        
     def __compare_languages(self, x, y):
         sum = 0
         count = 0
-        for i in xrange(len(x)):
+        for i in range(len(x)):
             if len(x[i]) == 0 or len(y[i]) == 0:
                 continue
             try:
                 sum += min(
-                    aline.Aline(self.__aline_repr(x_string),
-                                self.__aline_repr(y_string)).get_distance()
+                    self.__engine.distance(x_string, y_string)
                     for x_string in x[i] for y_string in y[i])
             except ZeroDivisionError:
                 sys.stderr.write("ZeroDision! initial sum i: %s x_strings: %s y_strings: %s\n" % (i, x[i], y[i]))
@@ -61,15 +58,14 @@ class LanguageComparer(object):
             dividend = float(sum)/float(count)
             divisor_sum = 0
             divisor_count = 0
-            for i in xrange(len(x)):
-                for j in xrange(len(y)):
+            for i in range(len(x)):
+                for j in range(len(y)):
                     if i == j or len(x[i]) == 0 or len(y[j]) == 0:
                         continue
                     else:
                         try:
                             divisor_sum += min(
-                                aline.Aline(self.__aline_repr(x_string),
-                                            self.__aline_repr(y_string)).get_distance()
+                                self.__engine.distance(x_string, y_string)
                                 for x_string in x[i] for y_string in y[j])
                         except ZeroDivisionError:
                             sys.stderr.write("ZeroDision! initial sum i: %s i: %s j: %s x[i]: %s y[j]: %s\n" % (i, i, j, x[i], y[j]))
@@ -98,7 +94,7 @@ if __name__ == "__main__":
     import csv
     words = csv.reader(open(options.filename), quoting=csv.QUOTE_NONE, delimiter="\t")
     if options.header:
-        words.next()
+        next(words)
     languages = {}
     for row in words:
         if options.asjp:
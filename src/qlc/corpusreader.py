@@ -16,7 +16,7 @@ Corpus Reader for data of the project Quantitative Language Comparison.
 #-----------------------------------------------------------------------------
 
 import sys, os.path
-import codecs, re, collections, fileinput, shutil
+import codecs, re, collections, fileinput, shutil, unicodedata
 
 
 #-----------------------------------------------------------------------------
@@ -80,9 +80,9 @@ class CorpusReaderDict(object):
     __slots__ = ("__datapath", "__components", "__books", "__languages_iso",
                  "__languages_src", "__languages_tgt", "__dictdata",
                  "__entries", "__annotations", "__entry_annotations_cache",
-                 "dictdata_string_ids" )
+                 "dictdata_string_ids", "normalization" )
     
-    def __init__(self, datapath):
+    def __init__(self, datapath, normalization=None):
         """
         Constructor of CorpusReaderDict class.
         
@@ -90,6 +90,11 @@ class CorpusReaderDict(object):
         ----------
         datapath : str
             The path to the dictionary data files (*.csv) in the file system.
+        normalization : str
+            The Unicode normalization form (e.g. "NFD") that is applied once
+            to all annotation strings (heads, translations, ...) when the
+            data is read. The default None keeps the strings as they are in
+            the files.
         
         Returns
         -------
@@ -97,6 +102,7 @@ class CorpusReaderDict(object):
         """
         
         self.__datapath = datapath
+        self.normalization = normalization
         self.__components = {}
         self.__books = {}
         self.__languages_iso = {}
@@ -174,6 +180,8 @@ class CorpusReaderDict(object):
                 is_first_line = False
                 continue
             line = line.rstrip("\r\n")
+            if normalization:
+                line = unicodedata.normalize(normalization, line)
             data = line.split("\t")
             data_stripped = []
             for d in data:
@@ -473,9 +481,10 @@ class CorpusReaderWordlist(object):
     __slots__ = ("__datapath", "__components", "__books", "__languages_iso",
                  "__languages_bookname",
                  "__wordlistdata", "__entries", "__annotations", "__concepts",
-                 "__entry_annotations_cache", "wordlistdata_string_ids" )
+                 "__entry_annotations_cache", "wordlistdata_string_ids",
+                 "normalization" )
     
-    def __init__(self, datapath):
+    def __init__(self, datapath, normalization=None):
         """
         Constructor of CorpusReaderWordlist class.
         
@@ -483,6 +492,11 @@ class CorpusReaderWordlist(object):
         ----------
         datapath : string
             The path to the dictionary data files (*.csv) in the file system.
+        normalization : str
+            The Unicode normalization form (e.g. "NFD") that is applied once
+            to all annotation strings (counterparts, ...) when the data is
+            read. The default None keeps the strings as they are in the
+            files.
         
         Returns
         -------
@@ -490,6 +504,7 @@ class CorpusReaderWordlist(object):
         """
         
         self.__datapath = datapath
+        self.normalization = normalization
         self.__components = {}
         self.__books = {}
         self.__languages_iso = {}
@@ -559,6 +574,8 @@ class CorpusReaderWordlist(object):
                 is_first_line = False
                 continue
             line = line.rstrip("\r\n")
+            if normalization:
+                line = unicodedata.normalize(normalization, line)
             data = line.split("\t")
             id = data.pop(0)
             entry_id = data[_wordlistannotation_table_columns['entry_id']]
@@ -868,6 +885,7 @@ def export_swadesh_entries(input_path, output_path=None):
     stopwords = qlc.utils.stopwords_from_file(os.path.join(os.path.dirname(
         os.path.realpath(
             __file__)), "data", "stopwords", "spa.txt"))
+    normalizer = qlc.utils.PhraseNormalizer(stopwords, stemmer)
 
     # load swadesh list
     swadesh_file = codecs.open(os.path.join(os.path.dirname(
@@ -878,7 +896,7 @@ def export_swadesh_entries(input_path, output_path=None):
     for line in swadesh_file:
         line = line.strip()
         for e in line.split(","):
-            stem = stemmer.stem(e)
+            stem = normalizer.stem(e)
             swadesh_entries.append(stem)
 
     # find all entries that contain one of the swadesh words
@@ -903,8 +921,7 @@ def export_swadesh_entries(input_path, output_path=None):
             if translation in stopwords:
                 entry_ids.append(entry_id)
             else:
-                translation = qlc.utils.remove_stopwords(translation, stopwords)
-                phrase_stems = qlc.utils.stem_phrase(translation, stemmer, True)
+                phrase_stems = normalizer.normalize(translation, True)
                 for stem in phrase_stems:
                     if stem in swadesh_entries:
                         entry_ids.append(entry_id)
@@ -985,10 +1002,7 @@ def export_swadesh_entries(input_path, output_path=None):
                 if counterpart in stopwords:
                     entry_ids.append(entry_id)
                 else:
-                    counterpart = qlc.utils.remove_stopwords(
-                        counterpart, stopwords)
-                    phrase_stems = qlc.utils.stem_phrase(
-                        counterpart, stemmer, True)
+                    phrase_stems = normalizer.normalize(counterpart, True)
                     for stem in phrase_stems:
                         if stem in swadesh_entries:
                             concepts.append(concept)
@@ -1139,4 +1153,4 @@ if __name__ == "__main__":
 
     fileinput.nextfile()
     output.close()
-    output_annotation.close()
\ No newline at end of file
+    output_annotation.close()
\ No newline at end of file
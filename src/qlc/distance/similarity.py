@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+#-----------------------------------------------------------------------------
+# Copyright (c) 2012, Quantitative Language Comparison Team
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""
+Similarity of languages by their ngram profiles. The profiles are rows of a
+sparse languages x ngrams matrix, and the similarities of all pairs of
+languages are computed with sparse matrix products, a block of rows at a
+time, so that only a block x languages matrix is held in memory. The result
+is either the condensed similarity matrix, in the order of
+scipy.spatial.distance.pdist(), or the top k most similar languages for
+each language.
+"""
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+import numpy
+import scipy.sparse
+
+#-----------------------------------------------------------------------------
+# Globals
+#-----------------------------------------------------------------------------
+
+metrics = ("cosine", "jaccard", "dice")
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def language_ngram_profiles(m, binary=False):
+    """
+    Returns the ngram profiles of the languages of a Matrix, the product
+    WL^T * WG * GP: the number of distinct words of the language that
+    contain each ngram. The columns are the unique ngrams that are shared
+    by all languages.
+
+    Parameters
+    ----------
+    m : Matrix
+        the matrix with the words, languages and ngrams
+    binary : bool
+        if True, the profiles only contain 1 for the ngrams of the language
+
+    Returns
+    -------
+    profiles : scipy.sparse.csr_matrix
+        languages x ngrams
+    languages : list
+        the languages of the rows
+    ngrams : list
+        the ngram tuples of the columns
+    """
+    wl = m.get_wl_matrix()
+    profiles = (wl.T @ m.get_wg_matrix() @ m.get_gp_matrix()).tocsr()
+
+    # leave out the empty rows and columns of removed items (stable numbering)
+    rows = [ i for i, language in enumerate(m.languages) if language is not None ]
+    cols = [ j for j, ngram in enumerate(m.unique_ngrams) if ngram is not None ]
+    profiles = profiles[rows][:, cols]
+    if binary:
+        profiles = (profiles > 0).astype(numpy.int64)
+    return (profiles, [ m.languages[i] for i in rows ],
+            [ m.unique_ngrams[j] for j in cols ])
+
+def _prepare(profiles, metric):
+    profiles = scipy.sparse.csr_matrix(profiles, dtype=float)
+    if metric == "cosine":
+        norms = numpy.sqrt(numpy.asarray(profiles.multiply(profiles).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return scipy.sparse.diags(1.0 / norms) @ profiles, None
+    if metric in ("jaccard", "dice"):
+        profiles = (profiles > 0).astype(float)
+        return profiles, numpy.asarray(profiles.sum(axis=1)).ravel()
+    raise ValueError("unknown metric {0}, use one of {1}".format(metric, ", ".join(metrics)))
+
+def iter_similarity_blocks(profiles, metric="cosine", block_size=256):
+    """
+    Yields the similarities of all languages in blocks of rows.
+
+    Parameters
+    ----------
+    profiles : scipy.sparse matrix
+        languages x ngrams
+    metric : str
+        "cosine" on the (weighted) profiles, or "jaccard" or "dice" on the
+        sets of ngrams of the languages
+    block_size : int
+        the number of rows per block
+
+    Returns
+    -------
+    A generator of (start, block) tuples, where block is a dense
+    block_size x languages array with the similarities of the languages
+    start, start+1, ... with all languages.
+    """
+    profiles, sizes = _prepare(profiles, metric)
+    transposed = profiles.T.tocsc()
+    n = profiles.shape[0]
+    for start in range(0, n, block_size):
+        end = min(start + block_size, n)
+        block = (profiles[start:end] @ transposed).toarray()
+        if metric == "jaccard":
+            union = sizes[start:end, None] + sizes[None, :] - block
+            block = numpy.divide(block, union, out=numpy.zeros_like(block), where=union > 0)
+        elif metric == "dice":
+            total = sizes[start:end, None] + sizes[None, :]
+            block = numpy.divide(2 * block, total, out=numpy.zeros_like(block), where=total > 0)
+        yield start, block
+
+def pairwise_similarity(profiles, metric="cosine", block_size=256):
+    """
+    Returns the condensed similarity matrix of all pairs of languages: the
+    similarities of the pairs (0, 1), (0, 2), ..., (1, 2), ... as in
+    scipy.spatial.distance.pdist(). Use scipy.spatial.distance.squareform()
+    for the square matrix.
+    """
+    n = profiles.shape[0]
+    condensed = numpy.zeros(n * (n - 1) // 2)
+    for start, block in iter_similarity_blocks(profiles, metric, block_size):
+        for offset, row in enumerate(block):
+            i = start + offset
+            position = i * n - i * (i + 1) // 2
+            condensed[position:position + n - i - 1] = row[i+1:]
+    return condensed
+
+def top_k_similar(profiles, k=10, metric="cosine", block_size=256):
+    """
+    Returns the k most similar other languages for each language, without
+    building the full similarity matrix.
+
+    Returns
+    -------
+    indices : array
+        languages x k, the row indices of the most similar languages, most
+        similar first; -1 if there are less than k other languages
+    similarities : array
+        languages x k, the similarities
+    """
+    n = profiles.shape[0]
+    k_found = min(k, max(n - 1, 0))
+    indices = numpy.full((n, k), -1, dtype=numpy.int64)
+    similarities = numpy.zeros((n, k))
+    if k_found == 0:
+        return indices, similarities
+    for start, block in iter_similarity_blocks(profiles, metric, block_size):
+        rows = numpy.arange(block.shape[0])
+        # a language is not its own neighbour
+        block[rows, start + rows] = -numpy.inf
+        top = numpy.argpartition(-block, k_found - 1, axis=1)[:, :k_found]
+        scores = block[rows[:, None], top]
+        order = numpy.argsort(-scores, axis=1, kind="stable")
+        indices[start:start + len(rows), :k_found] = top[rows[:, None], order]
+        similarities[start:start + len(rows), :k_found] = scores[rows[:, None], order]
+    return indices, similarities
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+#-----------------------------------------------------------------------------
+# Copyright (c) 2012, Quantitative Language Comparison Team
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""
+Low dimensional embeddings of the rows of the sparse matrices of a Matrix,
+e.g. of the words in WG or WM, with a randomized truncated SVD (Halko,
+Martinsson and Tropp 2011). The matrix is never converted to a dense array:
+it is only read in blocks of rows, so it may be memory mapped from a bundle
+(see qlc.matrix.load_bundle()), and only the rows x k and k x columns
+factors are held in memory.
+
+The rows can be weighted with TF-IDF before the decomposition:
+
+    tfidf(i, j) = a(i, j) * (log((1 + n) / (1 + df(j))) + 1)
+
+with n the number of rows and df(j) the number of rows with a non-zero in
+column j; each weighted row is then normalized to unit length.
+"""
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+import numpy
+import scipy.sparse
+
+import qlc.matrix
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def idf(matrix, block_size=65536):
+    """
+    Returns the inverse document frequency of each column of a sparse
+    matrix, counting the rows with a non-zero value block by block.
+    """
+    n_rows, n_cols = matrix.shape
+    df = numpy.zeros(n_cols)
+    for start in range(0, n_rows, block_size):
+        block = scipy.sparse.csr_matrix(matrix[start:start + block_size])
+        block.eliminate_zeros()
+        df += numpy.bincount(block.indices, minlength=n_cols)
+    return numpy.log((1.0 + n_rows) / (1.0 + df)) + 1.0
+
+def iter_row_blocks(matrix, block_size=65536, weights=None, normalize=False):
+    """
+    Yields the rows of a sparse matrix in blocks, optionally with weighted
+    columns and rows of unit length.
+
+    Returns
+    -------
+    A generator of (start, block) tuples, where block is a float CSR matrix
+    of the rows start, start+1, ...
+    """
+    n_rows = matrix.shape[0]
+    for start in range(0, n_rows, block_size):
+        block = scipy.sparse.csr_matrix(matrix[start:start + block_size], dtype=float)
+        if weights is not None:
+            block = scipy.sparse.csr_matrix(block.multiply(weights[None, :]))
+        if normalize:
+            norms = numpy.sqrt(numpy.asarray(block.multiply(block).sum(axis=1)).ravel())
+            norms[norms == 0] = 1.0
+            block = scipy.sparse.diags(1.0 / norms) @ block
+        yield start, block
+
+def randomized_svd(matrix, k=32, n_oversamples=10, n_iter=4, tfidf=False,
+                   block_size=65536, random_state=None):
+    """
+    Computes the truncated SVD A ~ U * diag(s) * Vt of a sparse matrix with
+    a randomized range finder and power iterations.
+
+    Parameters
+    ----------
+    matrix : scipy.sparse matrix
+        rows x columns, e.g. bundle.get_wg_matrix() of a memory mapped
+        bundle
+    k : int
+        the number of components
+    n_oversamples : int
+        the number of additional random vectors, for a more accurate range
+    n_iter : int
+        the number of power iterations, more are needed if the singular
+        values decay slowly
+    tfidf : bool
+        if True, decompose the TF-IDF weighted matrix
+    block_size : int
+        the number of rows that are read at once
+    random_state : int or numpy.random.Generator
+        the seed of the random vectors
+
+    Returns
+    -------
+    embedding : array
+        rows x k, the rows in the space of the components, U * diag(s)
+    s : array
+        k, the singular values in descending order
+    vt : array
+        k x columns, the components
+    """
+    n_rows, n_cols = matrix.shape
+    k = min(k, n_rows, n_cols)
+    n_random = min(k + n_oversamples, n_rows, n_cols)
+    rng = numpy.random.default_rng(random_state)
+
+    weights = idf(matrix, block_size) if tfidf else None
+    def blocks():
+        return iter_row_blocks(matrix, block_size, weights, normalize=tfidf)
+
+    def times(x):
+        # A * x, the rows of the result are computed block by block
+        y = numpy.empty((n_rows, x.shape[1]))
+        for start, block in blocks():
+            y[start:start + block.shape[0]] = block @ x
+        return y
+
+    def transposed_times(y):
+        # A^T * y, summed over the blocks
+        z = numpy.zeros((n_cols, y.shape[1]))
+        for start, block in blocks():
+            z += block.T @ y[start:start + block.shape[0]]
+        return z
+
+    q, _ = numpy.linalg.qr(times(rng.standard_normal((n_cols, n_random))))
+    for _ in range(n_iter):
+        z, _ = numpy.linalg.qr(transposed_times(q))
+        q, _ = numpy.linalg.qr(times(z))
+
+    # B = Q^T * A is small: n_random x columns
+    b = transposed_times(q).T
+    ub, s, vt = numpy.linalg.svd(b, full_matrices=False)
+    u = q @ ub[:, :k]
+    s = s[:k]
+    vt = vt[:k]
+
+    # the signs of singular vectors are arbitrary; make the largest
+    # component of each column of U positive, so results are reproducible
+    signs = numpy.sign(u[numpy.argmax(numpy.abs(u), axis=0), numpy.arange(k)])
+    signs[signs == 0] = 1.0
+    return u * (s * signs), s, vt * signs[:, None]
+
+def embedding_name(matrix_name, k, tfidf):
+    """
+    Returns the prefix of the arrays of an embedding in a bundle, e.g.
+    "embedding_wg_32_tfidf".
+    """
+    return "embedding_{0}_{1}{2}".format(matrix_name, k, "_tfidf" if tfidf else "")
+
+def bundle_embedding(bundle, matrix_name="wg", k=32, tfidf=False, cache=True,
+                     mmap_mode="r", **kwargs):
+    """
+    Returns the embedding of the rows of a matrix in a bundle. The result is
+    cached in the bundle file: if it was computed before with the same k
+    and weighting it is loaded instead of computed, whatever the other
+    arguments of randomized_svd() were.
+
+    Parameters
+    ----------
+    bundle : str or MatrixBundle
+        the path of a bundle written by Matrix.save_bundle(), or a bundle
+        loaded with qlc.matrix.load_bundle()
+    matrix_name : str
+        "wg", "wl", "wm" or "gp"
+    k : int
+        the number of components
+    tfidf : bool
+        if True, decompose the TF-IDF weighted matrix
+    cache : bool
+        if False, the embedding is neither read from nor written to the
+        bundle
+    mmap_mode : str
+        the mode to map the bundle with if bundle is a path
+    kwargs
+        further arguments of randomized_svd(), e.g. n_iter or random_state
+
+    Returns
+    -------
+    embedding, s, vt : arrays
+        see randomized_svd()
+    """
+    if isinstance(bundle, qlc.matrix.MatrixBundle):
+        path = bundle.path
+    else:
+        path = bundle
+        bundle = qlc.matrix.load_bundle(path, mmap_mode)
+
+    name = embedding_name(matrix_name, k, tfidf)
+    arrays = bundle.arrays
+    if cache and name + "_vectors" in arrays:
+        return (numpy.asarray(arrays[name + "_vectors"]),
+                numpy.asarray(arrays[name + "_singular_values"]),
+                numpy.asarray(arrays[name + "_components"]))
+
+    embedding, s, vt = randomized_svd(bundle.matrix(matrix_name), k, tfidf=tfidf, **kwargs)
+    if cache:
+        if path is None:
+            raise ValueError("cannot cache the embedding of a bundle without a path")
+        results = {
+            name + "_vectors" : embedding,
+            name + "_singular_values" : s,
+            name + "_components" : vt }
+        qlc.matrix.add_to_bundle(path, results)
+        arrays.update(results)
+    return embedding, s, vt
@@ -7,68 +7,428 @@ Module to create sparse matrices and headers for Quantitative Language Compariso
 # modules
 
 import sys
+import os
+import array
 import collections
 import gc
+import io
+import json
+import itertools
+import multiprocessing
+import shutil
+import struct
+import tempfile
+import weakref
+import zipfile
 
 import qlc.ngram
 
 from qlc.corpusreader import CorpusReaderWordlist
 
 import numpy
-from numpy import array
 from scipy.sparse import csr_matrix, lil_matrix, coo_matrix # do we need this to run this code?
 
-numpy.set_printoptions(threshold=numpy.nan) # set so everything will print
+numpy.set_printoptions(threshold=sys.maxsize) # set so everything will print
+
+#-----------------------------------------------------------------------------
+# Sharded builds
+#-----------------------------------------------------------------------------
+
+_shard_matrix = None
+
+def _init_shard_worker(orthography_parser, gram_type, ngram_length):
+    # the parser is sent once to each worker process, not with every shard
+    global _shard_matrix
+    _shard_matrix = (orthography_parser, gram_type, ngram_length)
+
+def _build_shard(records):
+    """
+    Parses the records of a shard into the tables of an empty Matrix and
+    returns them as integer arrays with the shard's vocabularies (see
+    Matrix._fragment()), and the lines for the unparsables file.
+    """
+    orthography_parser, gram_type, ngram_length = _shard_matrix
+    m = Matrix.__new__(Matrix)
+    m.orthography_parser = orthography_parser
+    m.gram_type = gram_type
+    m.ngram_length = ngram_length
+    m._init_tables()
+    unparsables = io.StringIO()
+    m._parse(records, unparsables)
+    return m._fragment(), unparsables.getvalue()
+
+#-----------------------------------------------------------------------------
+# Spilling to disk
+#-----------------------------------------------------------------------------
+
+def _aggregate(rows, cols, counts):
+    """
+    Sorts (row, col, count) triples by row and column and sums the counts
+    of equal (row, col) pairs. Returns an array of shape (n, 3).
+    """
+    if len(rows) == 0:
+        return numpy.zeros((0, 3), dtype=numpy.int64)
+    order = numpy.lexsort((cols, rows))
+    rows, cols, counts = rows[order], cols[order], counts[order]
+    starts = numpy.concatenate(([ True ], (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])))
+    index = numpy.nonzero(starts)[0]
+    return numpy.stack([ rows[index], cols[index], numpy.add.reduceat(counts, index) ], axis=1)
+
+def _count_until(triples, row, col):
+    # the number of (row, col, count) triples, sorted by row and column,
+    # that are less than or equal to (row, col)
+    rows = triples[:, 0]
+    start, end = numpy.searchsorted(rows, [ row, row + 1 ])
+    return int(start + numpy.searchsorted(triples[start:end, 1], col, side="right"))
+
+
+class TripleRuns(object):
+    """
+    Collection of (row, col, count) triples, e.g. the counts of words by
+    concepts, with a bounded memory budget. The triples are collected in a
+    buffer. A full buffer is sorted, its counts are summed and it is stored
+    as a run; if a budget is given, the runs are written to temporary files.
+    iter_merged() combines the runs with a k-way merge that reads a block of
+    each run at a time and merges the blocks with array operations; merge()
+    returns all merged triples at once. If every (row, col) pair is added
+    only once, the "count" can be any integer value, e.g. the ngram at a
+    position of a word, as it is never summed.
+
+    Rows can be dropped with drop_rows(). Runs on disk are not rewritten;
+    instead, the triples of a dropped row that are in older runs are
+    skipped by merge().
+    """
+
+    def __init__(self, budget=None, directory=None, block_size=65536):
+        """
+        Constructor of TripleRuns class.
+
+        Parameters
+        ----------
+        budget : int
+            the maximal number of triples in the buffer, None to keep all
+            runs in memory
+        directory : str
+            the directory for the temporary files of the runs, defaults to
+            the system's temporary directory
+        block_size : int
+            the number of triples that are read at once from each run by
+            merge()
+
+        Returns
+        -------
+        Nothing
+        """
+        self.budget = budget
+        self.directory = directory
+        self.block_size = block_size
+        self._rows = array.array("q")
+        self._cols = array.array("q")
+        self._counts = array.array("q")
+        # numpy arrays, or paths of .npy files if there is a budget
+        self._runs = []
+        # { row : index of the first run whose triples of the row are kept }
+        self._first_runs = {}
+        self._tmp_dir = None
+
+    def append(self, row, col, count=1):
+        self._rows.append(row)
+        self._cols.append(col)
+        self._counts.append(count)
+        if self.budget is not None and len(self._rows) >= self.budget:
+            self.flush()
+
+    def extend(self, rows, cols, counts):
+        rows = numpy.asarray(rows, dtype=numpy.int64)
+        cols = numpy.asarray(cols, dtype=numpy.int64)
+        counts = numpy.asarray(counts, dtype=numpy.int64)
+        start = 0
+        while start < len(rows):
+            end = len(rows)
+            if self.budget is not None:
+                end = min(end, start + self.budget - len(self._rows))
+            self._rows.frombytes(rows[start:end].tobytes())
+            self._cols.frombytes(cols[start:end].tobytes())
+            self._counts.frombytes(counts[start:end].tobytes())
+            start = end
+            if self.budget is not None and len(self._rows) >= self.budget:
+                self.flush()
+
+    def flush(self):
+        """
+        Stores the buffer as a run.
+        """
+        if len(self._rows) == 0:
+            return
+        run = _aggregate(numpy.array(self._rows, dtype=numpy.int64),
+                         numpy.array(self._cols, dtype=numpy.int64),
+                         numpy.array(self._counts, dtype=numpy.int64))
+        self._rows = array.array("q")
+        self._cols = array.array("q")
+        self._counts = array.array("q")
+        if self.budget is None:
+            self._runs.append(run)
+            return
+        if self._tmp_dir is None:
+            self._tmp_dir = tempfile.mkdtemp(prefix="qlc-runs-", dir=self.directory)
+            # remove the files when the object is garbage collected
+            self._finalizer = weakref.finalize(self, shutil.rmtree, self._tmp_dir, True)
+        path = os.path.join(self._tmp_dir, "run{0:06d}.npy".format(len(self._runs)))
+        numpy.save(path, run)
+        self._runs.append(path)
+
+    def drop_rows(self, rows):
+        """
+        Drops all triples of the given rows that were added so far.
+        """
+        rows = numpy.asarray(rows, dtype=numpy.int64)
+        self.flush()
+        if self.budget is None:
+            self._runs = [ run[~numpy.isin(run[:, 0], rows)] for run in self._runs ]
+            return
+        for row in rows.tolist():
+            self._first_runs[row] = len(self._runs)
+
+    def iter_merged(self):
+        """
+        Yields the rows, cols and summed counts of all triples in blocks of
+        arrays, sorted by row and column. At most a block of each run is in
+        memory at a time.
+        """
+        self.flush()
+        if self.budget is None:
+            # the runs in memory are merged into one, so the next merge only
+            # has to sort the triples that were added since
+            if len(self._runs) > 1:
+                runs = numpy.concatenate(self._runs)
+                self._runs = [ _aggregate(runs[:, 0], runs[:, 1], runs[:, 2]) ]
+            if len(self._runs) > 0 and len(self._runs[0]) > 0:
+                run = self._runs[0]
+                yield run[:, 0], run[:, 1], run[:, 2]
+            return
+
+        runs = [ numpy.load(path, mmap_mode="r") for path in self._runs ]
+        # the dropped rows whose triples in run i are skipped
+        skipped = [ numpy.array([ row for row, first_run in self._first_runs.items()
+            if first_run > i ], dtype=numpy.int64) for i in range(len(runs)) ]
+        positions = [ 0 ] * len(runs)
+        while True:
+            blocks = [ (i, runs[i][positions[i]:positions[i]+self.block_size])
+                for i in range(len(runs)) if positions[i] < len(runs[i]) ]
+            if not blocks:
+                return
+            # all triples up to the smallest last triple of the blocks are
+            # complete: the rest of each run only has larger triples
+            row, col = min((int(block[-1, 0]), int(block[-1, 1])) for i, block in blocks)
+            pieces = []
+            for i, block in blocks:
+                n = _count_until(block, row, col)
+                positions[i] += n
+                piece = numpy.array(block[:n])
+                if len(skipped[i]):
+                    piece = piece[~numpy.isin(piece[:, 0], skipped[i])]
+                pieces.append(piece)
+            pieces = numpy.concatenate(pieces)
+            if len(pieces):
+                merged = _aggregate(pieces[:, 0], pieces[:, 1], pieces[:, 2])
+                yield merged[:, 0], merged[:, 1], merged[:, 2]
+
+    def merge(self):
+        """
+        Returns the rows, cols and summed counts of all triples as arrays,
+        sorted by row and column. All triples are in memory at once; use
+        iter_merged() for large collections.
+        """
+        blocks = list(self.iter_merged())
+        if not blocks:
+            empty = numpy.zeros(0, dtype=numpy.int64)
+            return empty, empty, empty
+        return tuple(numpy.concatenate(arrays) for arrays in zip(*blocks))
+
+    def close(self):
+        """
+        Removes the temporary files of the runs.
+        """
+        if self._tmp_dir is not None:
+            self._finalizer()
+            self._tmp_dir = None
+        self._runs = []
+
+def _csr_from_blocks(blocks, shape):
+    """
+    Builds a CSR matrix from blocks of (rows, cols, data) arrays, e.g. from
+    TripleRuns.iter_merged(), without collecting the blocks. blocks() is
+    called twice: first to count the entries of each row, then to copy the
+    entries into the preallocated arrays of the matrix. The entries of a
+    row must be contiguous in the blocks. Duplicate entries are summed.
+    """
+    n_rows, n_cols = shape
+    lengths = numpy.zeros(n_rows, dtype=numpy.int64)
+    for rows, cols, data in blocks():
+        lengths += numpy.bincount(rows, minlength=n_rows)
+    nnz = int(lengths.sum())
+
+    index_dtype = numpy.int32 if max(nnz, n_rows, n_cols) < 2**31 else numpy.int64
+    indptr = numpy.zeros(n_rows + 1, dtype=index_dtype)
+    indptr[1:] = numpy.cumsum(lengths)
+    indices = numpy.empty(nnz, dtype=index_dtype)
+    values = numpy.empty(nnz, dtype=int)
+    # the next free position of each row
+    ends = indptr[:-1].astype(numpy.int64)
+    for rows, cols, data in blocks():
+        if len(rows) == 0:
+            continue
+        starts = numpy.flatnonzero(numpy.concatenate(([ True ], rows[1:] != rows[:-1])))
+        sizes = numpy.diff(numpy.append(starts, len(rows)))
+        group_rows = rows[starts]
+        positions = numpy.repeat(ends[group_rows] - starts, sizes) + numpy.arange(len(rows))
+        indices[positions] = cols
+        values[positions] = data
+        ends[group_rows] += sizes
+
+    matrix = csr_matrix( (values, indices, indptr), shape=shape, copy=False)
+    matrix.sum_duplicates()
+    return matrix
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
 
 class Matrix:
 
     """
     Basic class for creating matrices for QLC data
+
+    Words, languages, concepts and ngrams are interned to integer IDs in the
+    order in which they first appear. The counts are kept as arrays of these
+    IDs, and the string headers (e.g. "anene_7522" for a language specific
+    word) are only built when they are accessed for export. The rows and
+    columns of the matrices follow the sorted string headers.
+
+    The matrix can be built incrementally: add() parses another batch of
+    counterparts and remove_language() drops all counterparts of a language.
+    With stable_numbering=True the rows and columns are numbered in the
+    order in which the items first appeared, so the numbers of existing rows
+    and columns in the headers do not change when data is added or removed.
+    Rows and columns of items that have no counterparts left stay empty and
+    are left out of the headers.
+
+    With processes > 1 the counterparts are read in shards of consecutive
+    counterparts that are parsed and counted in worker processes. The shards
+    are merged into the global tables in input order; the sorted headers,
+    the matrices and the unparsables file are the same as for a serial
+    build.
     
     Parameters
     ----------
+    language_concept_counterpart_iterator : iterable
+        (language, concept, counterpart) tuples
+    orthography_parser : OrthographyParser
+        the parser for the counterparts
+    gram_type : str
+        "graphemes" or "phonemes"
+    ngram_length : int
+        the length of the ngrams
+    stable_numbering : bool
+        number rows and columns by first appearance instead of sorting them
+    processes : int
+        the number of worker processes, None for the number of CPUs
+    memory_budget : int
+        if given, the counts of words by concepts and the ngrams of each
+        word are written to sorted runs on disk whenever this many are
+        buffered. The WG and WM matrices are built from a block by block
+        merge of the runs, directly into the arrays of the CSR matrices. The
+        interned words, ngrams, languages and concepts, a few numbers per
+        word and the sort order of the headers stay in memory
+    spill_dir : str
+        the directory for the runs, defaults to the system's temporary
+        directory
     
     """
     
-    def __init__(self, language_concept_counterpart_iterator, orthography_parser, gram_type, ngram_length):
+    def __init__(self, language_concept_counterpart_iterator, orthography_parser, gram_type, ngram_length, stable_numbering=False, processes=1, memory_budget=None, spill_dir=None):
         self.ngram_length = ngram_length
-        
-        # write to disk the forms that can't be parsed
-        unparsables = open("output/unparsables.txt", "w")
+        self.orthography_parser = orthography_parser
+        self.gram_type = gram_type
+        self.stable_numbering = stable_numbering
 
-        # data structures
-        self._ngram_to_split_ngram = collections.defaultdict() # {"pb":"p_b"}
-        
-        # { word_id : { "#w_id":1, "wo_id":1, ...} } -- not ordered
-        self._words_ngrams_counts = collections.defaultdict(lambda : collections.defaultdict(int)) 
-
-        # { word_id : ["#w_id", "wo_id", ...] } -- ordered
-        self._words_ngrams = collections.defaultdict(list)
+        # write to disk the forms that can't be parsed
+        self.unparsables_path = "output/unparsables.txt"
+        open(self.unparsables_path, "w").close()
 
-        # data stored: {language: {counterpart: count} }
-        self._languages_words_counts = collections.defaultdict(lambda : collections.defaultdict(int))
+        self._init_tables(memory_budget, spill_dir)
+        self.add(language_concept_counterpart_iterator, processes)
 
-        # data stored: {concept: {counterpart: count} }
-        self._concepts_words_counts = collections.defaultdict(lambda : collections.defaultdict(int))
+    def close(self):
+        """
+        Removes the temporary files of an out of core build.
+        """
+        self._occurrences.close()
+        self._word_ngrams.close()
 
+    def _init_tables(self, memory_budget=None, spill_dir=None):
+        # data structures
+        self._ngram_to_split_ngram = collections.defaultdict() # {"pb":"p_b"}
 
+        # interned IDs: { string : ID } and [ string, ... ] by ID
+        self._language_ids = {}
+        self._language_strings = []
+        self._concept_ids = {}
+        self._concept_strings = []
+        # composed ngrams, e.g. "#a"
+        self._ngram_ids = {}
+        self._ngram_strings = []
+        # ngram tuples, e.g. ("#", "a"), and their composed ngram IDs
+        self._unique_ngram_ids = {}
+        self._unique_ngram_tuples = []
+        self._unique_ngram_ngrams = array.array("q")
+
+        # { (parsed word, language ID) : word ID }
+        self._word_ids = {}
+        self._word_strings = []
+        self._word_languages = array.array("q")
+
+        # { (ngram ID, language ID) : language specific ngram ID }
+        self._non_unique_ngram_ids = {}
+        self._non_unique_ngram_ngrams = array.array("q")
+        self._non_unique_ngram_languages = array.array("q")
+
+        # (word ID, position, language specific ngram ID) of the ordered
+        # ngrams of each word, and the number of ngrams per word ID
+        self._word_ngrams = TripleRuns(memory_budget, spill_dir)
+        self._word_ngram_counts = array.array("q")
+
+        # (word ID, concept ID, count) of the parsed counterparts; the
+        # words and concepts with counterparts are counted from them
+        self._occurrences = TripleRuns(memory_budget, spill_dir)
+
+    def add(self, language_concept_counterpart_iterator, processes=1):
+        """
+        Parses a batch of (language, concept, counterpart) tuples and adds
+        them to the matrix. New words, ngrams, languages and concepts get new
+        rows and columns; counterparts that cannot be parsed are appended to
+        the unparsables file.
 
-        # data containers
-        non_unique_parsed_words = set()
-        non_unique_ngrams = set()
-        languages = set()
-        concepts = set()
-        unique_ngrams = set() # using a Python set discards duplicate ngrams
+        With processes other than 1, the languages are parsed in parallel
+        shards, see add_sharded().
+        """
+        if processes != 1:
+            self.add_sharded(language_concept_counterpart_iterator, processes)
+            return
 
+        unparsables = open(self.unparsables_path, "a")
+        self._parse(language_concept_counterpart_iterator, unparsables)
+        unparsables.close()
+        self._sort()
 
-        
+    def _parse(self, language_concept_counterpart_iterator, unparsables):
         # loop over the corpus reader data and parse into data structures
         for language, concept, counterpart in language_concept_counterpart_iterator:
             # First do orthography parsing.
-            if gram_type == "graphemes":
-                parsed_counterpart_tuple = orthography_parser.parse_string_to_graphemes(counterpart) # graphemes
-            elif gram_type == "phonemes":
-                parsed_counterpart_tuple = orthography_parser.parse_string_to_ipa_phonemes(counterpart) # phonemes
+            if self.gram_type == "graphemes":
+                parsed_counterpart_tuple = self.orthography_parser.parse_string_to_graphemes(counterpart) # graphemes
+            elif self.gram_type == "phonemes":
+                parsed_counterpart_tuple = self.orthography_parser.parse_string_to_ipa_phonemes(counterpart) # phonemes
             else:
                 sys.exit('\ninvalid gram type: specify "phonemes" or "graphemes"\n')
                 
@@ -80,109 +440,421 @@ class Matrix:
                 continue
             parsed_counterpart = parsed_counterpart_tuple[1]
 
-            # Get ngrams as a tuple of tuples.
-            ngram_tuples = qlc.ngram.ngrams_from_graphemes(parsed_counterpart, ngram_length)
-
-            # Format that tuple of tuples into a space-delimed string.
-            ngrams_string = qlc.ngram.formatted_string_from_ngrams(ngram_tuples)
-            # print(ngrams_string)
-
-            # Format tuple into unigrams split on "_" into a space-delimited string.
-            split_ngrams_string = qlc.ngram.split_formatted_string_from_ngrams(ngram_tuples)
-            # print(split_ngrams_string)
-
-            # check to make sure ngrams string ("#a ab b#") 
-            # and split ngrams string ("#_a a_b b_#") are the same
-            ngrams_string_list = ngrams_string.split()
-            split_ngrams_string_list = split_ngrams_string.split()
-            if len(ngrams_string_list) != len(split_ngrams_string_list):
-                print("ngrams string and split ngrams sting do not match")
-                sys.exit(1)
-
-            # store key value pairs for ngram and split ngram; if unigram store the same
-            for i in range(0, len(ngrams_string_list)):
-                if self.ngram_length > 1:
-                    self._ngram_to_split_ngram[ngrams_string_list[i]] = split_ngrams_string_list[i]
-                else:
-                    self._ngram_to_split_ngram[ngrams_string_list[i]] = ngrams_string_list[i]
-
-            # Get the parsed version of counterparts.
-            parsed_word = qlc.ngram.formatted_string_from_ngrams(parsed_counterpart)
-            # print("og: ", parsed_word)
-            parsed_word = parsed_word.replace(" ", "")
-            parsed_word = parsed_word.lstrip("#")
-            parsed_word = parsed_word.rstrip("#")
-            parsed_word = parsed_word.replace("#", " ")
-            # print("pg: ", parsed_word)
-            # print()
-
-            parsed_word_id = parsed_word+"_"+language
-
-            # if parsed_word not in dict:
-
-            if not parsed_word_id in self._words_ngrams_counts:
-                for ngram in ngrams_string.split():
-                    non_unique_ngram = ngram+"_"+language
-                    non_unique_ngrams.add(non_unique_ngram)
-                    self._words_ngrams_counts[parsed_word_id][non_unique_ngram] += 1
-                    self._words_ngrams[parsed_word_id].append(non_unique_ngram)            
-
-
-            # update data structures
-            self._languages_words_counts[language][parsed_word+"_"+language] += 1
-            self._concepts_words_counts[concept][parsed_word+"_"+language] += 1
-
+            self._add(language, concept, parsed_counterpart)
 
-            # add to header lists
-            languages.add(language) # Append languages to unique set of langauge.
-            concepts.add(concept)   # Append concepts to unique set of concepts.
-            unique_ngrams.update(set(ngram_tuples)) # Append all the elements of ngram_tuples to unique_ngrams.
-
-
-            # add to non-unique header lists
-            non_unique_parsed_words.add(parsed_word+"_"+language)
-
-
-        # listfy to sort
-        self.languages = list(languages)
-        self.languages.sort()
+    def add_sharded(self, language_concept_counterpart_iterator, processes=None, shards_per_process=4, shard_size=10000):
+        """
+        Parses a batch of (language, concept, counterpart) tuples in worker
+        processes. The tuples are read in shards of consecutive tuples, and
+        each worker builds the local tables of a shard and returns them as
+        integer arrays with the shard's vocabularies. The parent interns
+        each vocabulary in one pass and remaps the arrays of the shard to
+        its own IDs with array indexing. Only a limited
+        number of shards is read ahead of the merge, so the input is never
+        held in memory as a whole. The shards are merged in input order, so
+        the result does not depend on the scheduling of the workers, and the
+        unparsables file lists the counterparts in the same order as a
+        serial build.
+
+        Parameters
+        ----------
+        language_concept_counterpart_iterator : iterable
+            (language, concept, counterpart) tuples
+        processes : int
+            the number of worker processes, None for the number of CPUs
+        shards_per_process : int
+            the number of shards per process that are read ahead of the
+            merge
+        shard_size : int
+            the number of tuples per shard; corpus readers yield the
+            counterparts of a language together, so the words of a language
+            are mostly parsed in the same shard
+
+        Returns
+        -------
+        Nothing
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        iterator = iter(language_concept_counterpart_iterator)
+        shards = iter(lambda: list(itertools.islice(iterator, shard_size)), [])
+
+        unparsables = open(self.unparsables_path, "a")
+        pool = multiprocessing.Pool(processes, initializer=_init_shard_worker,
+            initargs=(self.orthography_parser, self.gram_type, self.ngram_length))
+        try:
+            pending = collections.deque()
+            for shard in shards:
+                pending.append(pool.apply_async(_build_shard, (shard,)))
+                if len(pending) >= processes * shards_per_process:
+                    self._merge_shard(pending.popleft().get(), unparsables)
+            while pending:
+                self._merge_shard(pending.popleft().get(), unparsables)
+            pool.close()
+        finally:
+            # stops the queued shards if the merge or a worker failed
+            pool.terminate()
+            pool.join()
+            unparsables.close()
+        self._sort()
+
+    def _merge_shard(self, result, unparsables):
+        fragment, unparsable_lines = result
+        unparsables.write(unparsable_lines)
+        self._merge(fragment)
+
+    def _fragment(self):
+        """
+        Returns the tables of this matrix as integer arrays and the lists of
+        its vocabularies, to be merged into another matrix with _merge().
+        """
+        word_ngrams = self._word_ngrams.merge()
+        occurrences = self._occurrences.merge()
+        return {
+            "languages": self._language_strings,
+            "concepts": self._concept_strings,
+            "ngrams": self._ngram_strings,
+            "split_ngrams": [ self._ngram_to_split_ngram[ngram] for ngram in self._ngram_strings ],
+            "unique_ngram_tuples": self._unique_ngram_tuples,
+            "unique_ngram_ngrams": self._array(self._unique_ngram_ngrams),
+            "words": self._word_strings,
+            "word_languages": self._array(self._word_languages),
+            "non_unique_ngram_ngrams": self._array(self._non_unique_ngram_ngrams),
+            "non_unique_ngram_languages": self._array(self._non_unique_ngram_languages),
+            "word_ngram_counts": self._array(self._word_ngram_counts),
+            # the ngrams of all words, ordered by word and position
+            "word_ngrams": word_ngrams[2],
+            "occurrences": occurrences
+        }
+
+    def _intern_many(self, ids, items, n):
+        """
+        Looks up distinct items in a dict of IDs; new items get the IDs n,
+        n+1, ... in their order. The lookups and updates of the dict run in
+        single calls of map() and dict.update(), without a Python loop.
+        Returns the array of the IDs and the indices of the new items.
+        """
+        found = numpy.fromiter(map(ids.get, items, itertools.repeat(-1)),
+            dtype=numpy.int64, count=len(items))
+        new = numpy.flatnonzero(found < 0)
+        found[new] = numpy.arange(n, n + len(new))
+        ids.update(zip(self._take(items, new), found[new].tolist()))
+        return found, new
 
-        self.concepts = list(concepts)
-        self.concepts.sort()
+    def _take(self, items, indices):
+        return list(map(items.__getitem__, indices.tolist()))
 
-        self.non_unique_parsed_words = list(non_unique_parsed_words)
-        self.non_unique_parsed_words.sort()
-        
-        self.non_unique_ngrams = list(non_unique_ngrams)
-        self.non_unique_ngrams.sort()
+    def _extend(self, table, values):
+        table.frombytes(numpy.asarray(values, dtype=numpy.int64).tobytes())
 
-        self.unique_ngrams = list(unique_ngrams)
-        self.unique_ngrams.sort()
+    def _merge(self, fragment):
+        """
+        Adds the fragment of a matrix that was built separately. Its
+        vocabularies are interned with _intern_many() and its integer
+        tables are remapped to the IDs of this matrix with array indexing.
+        """
+        languages, new = self._intern_many(self._language_ids,
+            fragment["languages"], len(self._language_strings))
+        self._language_strings.extend(self._take(fragment["languages"], new))
+        concepts, new = self._intern_many(self._concept_ids,
+            fragment["concepts"], len(self._concept_strings))
+        self._concept_strings.extend(self._take(fragment["concepts"], new))
+
+        ngrams, new = self._intern_many(self._ngram_ids,
+            fragment["ngrams"], len(self._ngram_strings))
+        new_ngrams = self._take(fragment["ngrams"], new)
+        self._ngram_strings.extend(new_ngrams)
+        # the composed ngrams are new, so they have no split ngram yet
+        self._ngram_to_split_ngram.update(zip(new_ngrams,
+            self._take(fragment["split_ngrams"], new)))
+
+        unique_ngrams, new = self._intern_many(self._unique_ngram_ids,
+            fragment["unique_ngram_tuples"], len(self._unique_ngram_tuples))
+        self._unique_ngram_tuples.extend(self._take(fragment["unique_ngram_tuples"], new))
+        self._extend(self._unique_ngram_ngrams, ngrams[fragment["unique_ngram_ngrams"][new]])
+
+        non_unique_ngram_ngrams = ngrams[fragment["non_unique_ngram_ngrams"]]
+        non_unique_ngram_languages = languages[fragment["non_unique_ngram_languages"]]
+        non_unique_ngrams, new = self._intern_many(self._non_unique_ngram_ids,
+            list(zip(non_unique_ngram_ngrams.tolist(), non_unique_ngram_languages.tolist())),
+            len(self._non_unique_ngram_ngrams))
+        self._extend(self._non_unique_ngram_ngrams, non_unique_ngram_ngrams[new])
+        self._extend(self._non_unique_ngram_languages, non_unique_ngram_languages[new])
+
+        word_languages = languages[fragment["word_languages"]]
+        words, new = self._intern_many(self._word_ids,
+            list(zip(fragment["words"], word_languages.tolist())), len(self._word_strings))
+        self._word_strings.extend(self._take(fragment["words"], new))
+        self._extend(self._word_languages, word_languages[new])
+
+        # the ngrams of the new words
+        counts = fragment["word_ngram_counts"]
+        offsets = numpy.concatenate(([ 0 ], numpy.cumsum(counts)))
+        lengths = counts[new]
+        starts = numpy.repeat(offsets[new], lengths)
+        positions = numpy.arange(lengths.sum()) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+        self._word_ngrams.extend(numpy.repeat(words[new], lengths), positions,
+            non_unique_ngrams[fragment["word_ngrams"][starts + positions]])
+        self._extend(self._word_ngram_counts, lengths)
+
+        rows, cols, occurrences = fragment["occurrences"]
+        self._occurrences.extend(words[rows], concepts[cols], occurrences)
+
+    def remove_language(self, language):
+        """
+        Removes all counterparts of a language. The interned words and ngrams
+        of the language are kept, so if the language is added again, e.g.
+        with corrected counterparts, its words get their old rows back.
+        """
+        language_id = self._language_ids.get(language)
+        if language_id is None:
+            return
+        words = numpy.nonzero(self._array(self._word_languages) == language_id)[0]
+        self._occurrences.drop_rows(words)
+        self._sort()
+
+    def _intern(self, ids, strings, item):
+        id = ids.get(item)
+        if id is None:
+            id = len(strings)
+            ids[item] = id
+            strings.append(item)
+        return id
+
+    def _add(self, language, concept, parsed_counterpart):
+        language_id = self._intern(self._language_ids, self._language_strings, language)
+        concept_id = self._intern(self._concept_ids, self._concept_strings, concept)
+
+        # Get the parsed version of counterparts, e.g. "#a#n#" -> "a n".
+        parsed_word = "".join(parsed_counterpart).strip("#").replace("#", " ")
+
+        word_key = (parsed_word, language_id)
+        word_id = self._word_ids.get(word_key)
+        if word_id is None:
+            word_id = len(self._word_strings)
+            self._word_ids[word_key] = word_id
+            self._word_strings.append(parsed_word)
+            self._word_languages.append(language_id)
 
+            # Get ngrams as a tuple of tuples.
+            ngrams = qlc.ngram.ngrams_from_graphemes(parsed_counterpart, self.ngram_length)
+            for position, ngram in enumerate(ngrams):
+                composed_ngram = "".join(ngram)
+                if composed_ngram not in self._ngram_ids:
+                    # store key value pairs for ngram and split ngram; if unigram store the same
+                    if self.ngram_length > 1:
+                        self._ngram_to_split_ngram[composed_ngram] = "_".join(ngram)
+                    else:
+                        self._ngram_to_split_ngram[composed_ngram] = composed_ngram
+                ngram_id = self._intern(self._ngram_ids, self._ngram_strings, composed_ngram)
+                if ngram not in self._unique_ngram_ids:
+                    self._intern(self._unique_ngram_ids, self._unique_ngram_tuples, ngram)
+                    self._unique_ngram_ngrams.append(ngram_id)
+
+                non_unique_key = (ngram_id, language_id)
+                non_unique_id = self._non_unique_ngram_ids.get(non_unique_key)
+                if non_unique_id is None:
+                    non_unique_id = len(self._non_unique_ngram_ngrams)
+                    self._non_unique_ngram_ids[non_unique_key] = non_unique_id
+                    self._non_unique_ngram_ngrams.append(ngram_id)
+                    self._non_unique_ngram_languages.append(language_id)
+                self._word_ngrams.append(word_id, position, non_unique_id)
+            self._word_ngram_counts.append(len(ngrams))
+
+        self._occurrences.append(word_id, concept_id)
+
+    def _order(self, key, alive):
+        """
+        Returns the IDs of the items that have counterparts, in header
+        order, and the position (row or column) of each ID. Items without
+        counterparts get the position -1 if the headers are sorted.
+        """
+        ids = numpy.nonzero(alive)[0]
+        if self.stable_numbering:
+            return ids, numpy.arange(len(alive))
+        order = numpy.array(sorted(ids.tolist(), key=key), dtype=numpy.int64)
+        positions = numpy.full(len(alive), -1, dtype=numpy.int64)
+        positions[order] = numpy.arange(len(order))
+        return order, positions
+
+    def _sort(self):
+        """
+        Computes which items have counterparts and the order of the headers.
+        The composite sort keys are only built temporarily, once per
+        distinct word and ngram.
+        """
+        languages = self._language_strings
+
+        word_alive = numpy.zeros(len(self._word_strings), dtype=bool)
+        concept_alive = numpy.zeros(len(self._concept_strings), dtype=bool)
+        for words, concepts, counts in self._occurrences.iter_merged():
+            word_alive[words] = True
+            concept_alive[concepts] = True
+        word_languages = self._array(self._word_languages)
+        language_alive = numpy.bincount(word_languages[word_alive],
+            minlength=len(languages)) > 0
+        non_unique_counts = numpy.zeros(len(self._non_unique_ngram_ngrams), dtype=numpy.int64)
+        for words, positions, ngrams in self._word_ngrams.iter_merged():
+            non_unique_counts += numpy.bincount(ngrams[word_alive[words]],
+                minlength=len(non_unique_counts))
+        non_unique_alive = non_unique_counts > 0
+        ngram_alive = numpy.bincount(
+            self._array(self._non_unique_ngram_ngrams)[non_unique_alive],
+            minlength=len(self._ngram_strings)) > 0
+        unique_alive = ngram_alive[self._array(self._unique_ngram_ngrams)]
+
+        self._word_alive = word_alive
+        self._non_unique_ngram_alive = non_unique_alive
+        self._unique_ngram_alive = unique_alive
+
+        (self._language_order, self._language_rows) = self._order(
+            languages.__getitem__, language_alive)
+        (self._concept_order, self._concept_rows) = self._order(
+            self._concept_strings.__getitem__, concept_alive)
+        (self._word_order, self._word_rows) = self._order(
+            self._word_string, word_alive)
+        (self._non_unique_ngram_order, self._non_unique_ngram_rows) = self._order(
+            self._non_unique_ngram_string, non_unique_alive)
+        (self._unique_ngram_order, self._unique_ngram_rows) = self._order(
+            self._unique_ngram_tuples.__getitem__, unique_alive)
+        self._headers = {}
+
+    def _size(self, order, positions):
+        # with stable numbering the matrices have a row or column for every
+        # ID, otherwise only for the items that have counterparts
+        if self.stable_numbering:
+            return len(positions)
+        return len(order)
+
+    def _header_list(self, order, positions, item):
+        return [ header_item for header_item in self._iter_items(order, positions, item) ]
+
+    def _iter_items(self, order, positions, item):
+        # with stable numbering the header has an entry for every ID, None
+        # for the items without counterparts
+        if self.stable_numbering:
+            alive = numpy.zeros(len(positions), dtype=bool)
+            alive[order] = True
+            for i in range(len(positions)):
+                yield item(i) if alive[i] else None
+        else:
+            for i in order:
+                yield item(i)
+
+    def _header(self, name, build):
+        if name not in self._headers:
+            self._headers[name] = build()
+        return self._headers[name]
+
+    @property
+    def languages(self):
+        return self._header("languages", lambda : self._header_list(
+            self._language_order, self._language_rows, self._language_strings.__getitem__))
+
+    @property
+    def concepts(self):
+        return self._header("concepts", lambda : self._header_list(
+            self._concept_order, self._concept_rows, self._concept_strings.__getitem__))
+
+    @property
+    def non_unique_parsed_words(self):
+        return self._header("non_unique_parsed_words", lambda : self._header_list(
+            self._word_order, self._word_rows, self._word_string))
+
+    @property
+    def non_unique_ngrams(self):
+        return self._header("non_unique_ngrams", lambda : self._header_list(
+            self._non_unique_ngram_order, self._non_unique_ngram_rows,
+            self._non_unique_ngram_string))
+
+    @property
+    def unique_ngrams(self):
+        return self._header("unique_ngrams", lambda : self._header_list(
+            self._unique_ngram_order, self._unique_ngram_rows,
+            self._unique_ngram_tuples.__getitem__))
+
+    def _word_string(self, word_id):
+        return self._word_strings[word_id]+"_"+\
+            self._language_strings[self._word_languages[word_id]]
+
+    def _non_unique_ngram_string(self, non_unique_id):
+        return self._ngram_strings[self._non_unique_ngram_ngrams[non_unique_id]]+"_"+\
+            self._language_strings[self._non_unique_ngram_languages[non_unique_id]]
+
+    def _index_map(self, list):
+        """
+        Returns a dict that maps each item of a header list to its row or
+        column index.
+        """
+        return dict( (item, i) for i, item in enumerate(list) if item is not None )
+
+    @property
+    def words_index(self):
+        # { "anene_7522" : row }
+        return self._header("words_index", lambda :
+            self._index_map(self.non_unique_parsed_words))
+
+    @property
+    def ngrams_index(self):
+        # { "#a_7522" : column }
+        return self._header("ngrams_index", lambda :
+            self._index_map(self.non_unique_ngrams))
+
+    @property
+    def phonemes_index(self):
+        # { "#a" : [column, ...] }, the composed unique ngrams; different
+        # ngram tuples may compose to the same string
+        def build():
+            phonemes_index = collections.defaultdict(list)
+            for j, ngram in enumerate(self.unique_ngrams):
+                if ngram is not None:
+                    phonemes_index["".join(ngram)].append(j)
+            return phonemes_index
+        return self._header("phonemes_index", build)
+
+    def _words_ngrams_by_row(self):
+        """
+        Returns the ordered language specific ngram IDs of the words, in the
+        order of the word rows, and the offsets of the rows: the ngrams of
+        row i are ngram_ids[offsets[i]:offsets[i+1]]. Unlike the matrices,
+        the result holds the ngrams of all words in memory.
+        """
+        n_rows = self._size(self._word_order, self._word_rows)
+        alive = numpy.nonzero(self._word_alive)[0]
+        lengths = numpy.zeros(n_rows, dtype=numpy.int64)
+        lengths[self._word_rows[alive]] = self._array(self._word_ngram_counts)[alive]
+        offsets = numpy.zeros(n_rows + 1, dtype=numpy.int64)
+        offsets[1:] = numpy.cumsum(lengths)
+        ngram_ids = numpy.empty(offsets[-1], dtype=numpy.int64)
+        for words, positions, ngrams in self._word_ngrams.iter_merged():
+            alive = self._word_alive[words]
+            ngram_ids[offsets[self._word_rows[words[alive]]] + positions[alive]] = ngrams[alive]
+        return ngram_ids, offsets
+
+    def _coo(self, rows, cols, data, shape):
+        return coo_matrix( (numpy.asarray(data, dtype=int),
+            (numpy.asarray(rows, dtype=numpy.int64), numpy.asarray(cols, dtype=numpy.int64))),
+            shape=shape, dtype=int).tocsr()
+
+    def _array(self, ids):
+        # a copy, the array.array must not be locked by exported buffers
+        return numpy.array(ids, dtype=numpy.int64)
 
     def get_wg_matrix(self):
         """
         Function returns a sparse matrix of language-specific words (rows) by language-specific graphemes (cols).
         The cells in the matrix contain the ngram count in the word.
         """
-        wg = lil_matrix( (len(self.non_unique_parsed_words),len(self.non_unique_ngrams)), dtype=int)
-
-        for i in range(0, len(self.non_unique_parsed_words)):
-            word_language_tokens = self.non_unique_parsed_words[i].partition("_")
-            word_language = word_language_tokens[2]
-
-            for j in range(0, len(self.non_unique_ngrams)):
-                ngram_language_tokens = self.non_unique_ngrams[j].partition("_")
-                ngram_language = ngram_language_tokens[2]
-
-                # if the language IDs don't match, continue...
-                if word_language != ngram_language:
-                    continue
-
-                # check to see if the word has the ngram
-                if self._words_ngrams_counts[self.non_unique_parsed_words[i]][self.non_unique_ngrams[j]]:
-                    wg[i,j] = self._words_ngrams_counts[self.non_unique_parsed_words[i]][self.non_unique_ngrams[j]]
-        return wg
+        def blocks():
+            for words, positions, ngrams in self._word_ngrams.iter_merged():
+                alive = self._word_alive[words]
+                words, ngrams = words[alive], ngrams[alive]
+                # the duplicate (word, ngram) entries are summed up to the counts
+                yield (self._word_rows[words], self._non_unique_ngram_rows[ngrams],
+                       numpy.ones(len(words), dtype=int))
+        return _csr_from_blocks(blocks,
+            (self._size(self._word_order, self._word_rows),
+             self._size(self._non_unique_ngram_order, self._non_unique_ngram_rows)))
 
     # words/counterparts (rows) x languages (cols) x index (= if counterpart appears in that language)
     def get_wl_matrix(self):
@@ -190,21 +862,12 @@ class Matrix:
         Function returns a sparse matrix of words (rows) by languages (cols).
         The cells contain "1" if the word appears in the language.
         """
-        wl = lil_matrix( (len(self.non_unique_parsed_words),len(self.languages)), dtype=int )
-
-        for i in range(0, len(self.non_unique_parsed_words)):
-            word_language_tokens = self.non_unique_parsed_words[i].partition("_")
-            word_language = word_language_tokens[2]
-            
-            for j in range(0, len(self.languages)):
-                # if the language IDs don't match, continue
-                if word_language != self.languages[j]:
-                    continue
-
-                if self._languages_words_counts[self.languages[j]][self.non_unique_parsed_words[i]]:
-                    wl[i,j] = 1
-        return wl
-
+        words = numpy.nonzero(self._word_alive)[0]
+        languages = self._array(self._word_languages)[words]
+        return self._coo(self._word_rows[words], self._language_rows[languages],
+            numpy.ones(len(words), dtype=int),
+            (self._size(self._word_order, self._word_rows),
+             self._size(self._language_order, self._language_rows)))
 
     def get_wm_matrix(self):
         """
@@ -212,40 +875,123 @@ class Matrix:
         The cells contain "1" if the word appears with that meaning.
         
         """
-        wm = lil_matrix( (len(self.non_unique_parsed_words),len(self.concepts)), dtype=int )
-
-        for i in range(0, len(self.non_unique_parsed_words)):
-            for j in range(0, len(self.concepts)):
-                if self._concepts_words_counts[self.concepts[j]][self.non_unique_parsed_words[i]]:
-                    wm[i,j] = 1
-        return wm
+        def blocks():
+            for words, concepts, counts in self._occurrences.iter_merged():
+                yield (self._word_rows[words], self._concept_rows[concepts],
+                       numpy.ones(len(words), dtype=int))
+        return _csr_from_blocks(blocks,
+            (self._size(self._word_order, self._word_rows),
+             self._size(self._concept_order, self._concept_rows)))
 
     def get_gp_matrix(self):
-        gp = lil_matrix( (len(self.non_unique_ngrams),len(self.unique_ngrams)), dtype=int )
-        for i in range(0, len(self.non_unique_ngrams)):
-            for j in range(0, len(self.unique_ngrams)):
-                grapheme, separator, language_id = self.non_unique_ngrams[i].partition("_")
-
-                # get the phoneme-ngram; recompose from tuples
-                phoneme = "" 
-                for ngram in self.unique_ngrams[j]:
-                    phoneme += ngram
-
-                if grapheme == phoneme:
-                    gp[i,j] = 1
-        return gp
+        """
+        Function returns a sparse matrix of language-specific ngrams (rows) by
+        unique ngrams ("phonemes"; cols). The cells contain "1" if the
+        language-specific ngram is the phoneme.
+        """
+        # { composed ngram ID : [ unique ngram ID, ... ] }
+        phonemes = collections.defaultdict(list)
+        for unique_id in numpy.nonzero(self._unique_ngram_alive)[0]:
+            phonemes[self._unique_ngram_ngrams[unique_id]].append(unique_id)
+        rows, cols = [], []
+        for non_unique_id in numpy.nonzero(self._non_unique_ngram_alive)[0]:
+            for unique_id in phonemes[self._non_unique_ngram_ngrams[non_unique_id]]:
+                rows.append(non_unique_id)
+                cols.append(unique_id)
+        rows = numpy.array(rows, dtype=numpy.int64)
+        cols = numpy.array(cols, dtype=numpy.int64)
+        return self._coo(self._non_unique_ngram_rows[rows], self._unique_ngram_rows[cols],
+            numpy.ones(len(rows), dtype=int),
+            (self._size(self._non_unique_ngram_order, self._non_unique_ngram_rows),
+             self._size(self._unique_ngram_order, self._unique_ngram_rows)))
+
+    def write_lines(self, path, lines):
+        """
+        Writes the lines of a header or an export to a file, one at a time.
+        """
+        file = open(path, "w")
+        for line in lines:
+            file.write(line+"\n")
+        file.close()
 
+    def save_bundle(self, path, wordlist_ids_names=None):
+        """
+        Writes the WG, WL, WM and GP matrices, the headers and the
+        word-ngram indices into a single uncompressed .npz file, that can be
+        loaded with load_bundle(), also memory mapped.
+
+        Parameters
+        ----------
+        path : str
+            the path of the bundle, e.g. "output/huber1992/huber1992.npz"
+        wordlist_ids_names : list
+            optional (wordlistdata_id, language bookname) tuples for the
+            header of the languages
+
+        Returns
+        -------
+        Nothing
+        """
+        arrays = {}
+        for name in matrix_names:
+            matrix = getattr(self, "get_"+name+"_matrix")()
+            arrays[name+"_data"] = matrix.data
+            arrays[name+"_indices"] = matrix.indices
+            arrays[name+"_indptr"] = matrix.indptr
+            arrays[name+"_shape"] = numpy.array(matrix.shape, dtype=numpy.int64)
+
+        # string tables; "" for the rows without counterparts (stable numbering)
+        def table(items):
+            return numpy.array([ item if item is not None else "" for item in items ], dtype=str)
+        arrays["languages"] = table(self.languages)
+        arrays["concepts"] = table(self.concepts)
+        arrays["words"] = table(self.non_unique_parsed_words)
+        arrays["ngrams"] = table(self.non_unique_ngrams)
+        arrays["split_ngrams"] = table(
+            self._ngram_to_split_ngram[ngram.partition("_")[0]]+"_"+ngram.partition("_")[2]
+            if ngram is not None else None for ngram in self.non_unique_ngrams)
+        arrays["phonemes"] = table("".join(ngram) if ngram is not None else None
+            for ngram in self.unique_ngrams)
+
+        # the ordered ngram columns of each word row
+        ngram_ids, offsets = self._words_ngrams_by_row()
+        arrays["words_ngrams_indices"] = self._non_unique_ngram_rows[ngram_ids]
+        arrays["words_ngrams_offsets"] = offsets
+
+        if wordlist_ids_names is None:
+            wordlist_ids_names = []
+        arrays["wordlist_ids"] = table(id for id, name in wordlist_ids_names)
+        arrays["language_names"] = table(name for id, name in wordlist_ids_names)
+
+        arrays["metadata"] = numpy.array(json.dumps({
+            "format": bundle_format,
+            "ngram_length": self.ngram_length,
+            "gram_type": self.gram_type,
+            "stable_numbering": self.stable_numbering
+        }))
+        # uncompressed, so that the arrays can be memory mapped
+        numpy.savez(path, **arrays)
 
+    def write_header(self, list, source, ext):
+        self.write_lines(source+"/"+source+ext, self.iter_header(list))
 
+    def iter_words_header(self):
+        """
+        Yields the lines of the words header without building the list of
+        header strings; each line is built from the interned tables when it
+        is written.
+        """
+        return self.iter_header(self._iter_items(
+            self._word_order, self._word_rows, self._word_string))
 
+    def iter_meanings_header(self):
+        return self.iter_header(self._iter_items(
+            self._concept_order, self._concept_rows, self._concept_strings.__getitem__))
 
-    def write_header(self, list, source, ext):
-        file = open(source+"/"+source+ext, "w")
-        count = 0
-        for item in list:
-            count += 1
-            file.write(str(count)+"\t"+item+"\n")
-        file.close()
+    def iter_ngrams_header(self):
+        return self.iter_header(self._iter_items(
+            self._non_unique_ngram_order, self._non_unique_ngram_rows,
+            self._non_unique_ngram_string))
 
     def get_words_header(self):
         return self.get_header(self.non_unique_parsed_words)
@@ -257,15 +1003,20 @@ class Matrix:
         return self.get_header(self.non_unique_ngrams)
 
     def get_header(self, list):
+        return [ line for line in self.iter_header(list) ]
+
+    def iter_header(self, list):
         count = 0
-        header = []
         for item in list:
             count += 1
-            header.append(str(count)+"\t"+item)
-        return header
+            # no entry for rows without counterparts (stable numbering)
+            if item is not None:
+                yield str(count)+"\t"+item
 
     def get_split_ngrams_header(self, list):
-        header = []
+        return [ line for line in self.iter_split_ngrams_header(list) ]
+
+    def iter_split_ngrams_header(self, list):
         for item in list:
             count, ngram_id = item.split("\t")
             ngram, separator, id = ngram_id.partition("_")
@@ -274,8 +1025,7 @@ class Matrix:
             if ngram != separated_ngram.replace("_", ""):
                 print("your grams aren't matching")
                 sys.exit(1)
-            header.append(count+"\t"+separated_ngram+"_"+id+"\t"+ngram_id)
-        return header
+            yield count+"\t"+separated_ngram+"_"+id+"\t"+ngram_id
 
 
     # makes phoneme_header ??
@@ -284,15 +1034,9 @@ class Matrix:
         Function to return a list of phonemes. 
         Count \t phoneme
         """
-        count = 0
-        header = []
-        for i in range(0, len(self.unique_ngrams)):
-            count += 1
-            composed_ngram = ""
-            for ngram in self.unique_ngrams[i]:
-                composed_ngram += ngram
-            header.append(str(count)+"\t"+composed_ngram)
-        return header
+        return [ line for line in self.iter_header(
+            "".join(ngram) if ngram is not None else None
+            for ngram in self.unique_ngrams) ]
 
 
     def get_words_ngrams_strings(self):
@@ -302,41 +1046,264 @@ class Matrix:
         return self._get_words_ngrams(True)
 
     def _get_words_ngrams(self, index):
-        header = []
-        for word in self.non_unique_parsed_words:
-            if not word in self._words_ngrams:
-                print("warning: non_unique_parsed words does not match _words.ngrams")
-                sys.exit(1)
-            result = word
+        return [ line for line in self.iter_words_ngrams(index) ]
 
-            for gram in self._words_ngrams[word]:
-                # creates word-ngram indices: anene_7522 1 126 468 230 468 208
-                if index:
-                    gram = str(self.non_unique_ngrams.index(gram)+1) # add 1 because Python indexes from 0
-                    result += "\t"+gram
-                    continue
+    def iter_words_ngrams(self, index):
+        """
+        Yields a line for each word with its ngrams, as strings or as column
+        indices (starting from 1) of the ngrams header.
+        """
+        words_ngram_ids, offsets = self._words_ngrams_by_row()
+        for word_id in self._word_order:
+            result = self._word_string(word_id)
+            row = self._word_rows[word_id]
+            ngram_ids = words_ngram_ids[offsets[row]:offsets[row+1]].tolist()
+
+            # creates word-ngram indices: anene_7522 1 126 468 230 468 208
+            if index:
+                for non_unique_id in ngram_ids:
+                    # add 1 because Python indexes from 0
+                    result += "\t"+str(self._non_unique_ngram_rows[non_unique_id]+1)
+                yield result
+                continue
 
+            for non_unique_id in ngram_ids:
                 # if not unigrams, delimit the graphemes on "_"
-                if self.ngram_length > 1:
-                    # creates word-ngram strings: anene_7522 #_a_7522 a_n_7522 n_e_7522 ... 
-                    tokens = gram.partition("_")
-                    unigram_item = self._ngram_to_split_ngram[tokens[0]]
-                
-                    # checks that the delimited ngrams are valid
-                    if tokens[0] != unigram_item.replace("_", ""):
-                        print("your grams aren't matching")
-                        sys.exit(1)
-                    result += "\t"+unigram_item+tokens[1]+tokens[2]
-                else:
-                    result += "\t"+gram
+                # creates word-ngram strings: anene_7522 #_a_7522 a_n_7522 n_e_7522 ... 
+                ngram = self._ngram_strings[self._non_unique_ngram_ngrams[non_unique_id]]
+                language = self._language_strings[self._non_unique_ngram_languages[non_unique_id]]
+                result += "\t"+self._ngram_to_split_ngram[ngram]+"_"+language
+
+            yield result
+
+
+
+
+
+
+
+#-----------------------------------------------------------------------------
+# Binary bundles
+#-----------------------------------------------------------------------------
+
+bundle_format = 1
+
+# the matrices in a bundle
+matrix_names = ("wg", "wl", "wm", "gp")
+
+def _npz_memmap(path, mmap_mode):
+    """
+    Memory maps the arrays of an uncompressed .npz file. numpy.load()
+    ignores mmap_mode for .npz files, but the members of an uncompressed zip
+    file are stored contiguously, so each .npy member can be mapped at its
+    offset.
+    """
+    arrays = {}
+    archive = zipfile.ZipFile(path)
+    file = open(path, "rb")
+    try:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError("cannot memory map the compressed member {0} of {1}".format(info.filename, path))
+            # skip the local file header of the member
+            file.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack("<HH", file.read(4))
+            file.seek(info.header_offset + 30 + name_length + extra_length)
+
+            version = numpy.lib.format.read_magic(file)
+            if version == (1, 0):
+                shape, fortran_order, dtype = numpy.lib.format.read_array_header_1_0(file)
+            else:
+                shape, fortran_order, dtype = numpy.lib.format.read_array_header_2_0(file)
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if int(numpy.prod(shape)) == 0:
+                arrays[name] = numpy.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = numpy.memmap(path, dtype=dtype, mode=mmap_mode,
+                    offset=file.tell(), shape=shape, order="F" if fortran_order else "C")
+    finally:
+        file.close()
+        archive.close()
+    return arrays
+
+def load_bundle(path, mmap_mode=None):
+    """
+    Loads a bundle that was written with Matrix.save_bundle().
+
+    Parameters
+    ----------
+    path : str
+        the path of the bundle
+    mmap_mode : str
+        None to read the arrays into memory, or a numpy.memmap mode like "r"
+        to map them from the file
+
+    Returns
+    -------
+    A MatrixBundle object.
+    """
+    if mmap_mode is None:
+        npz = numpy.load(path)
+        arrays = dict( (name, npz[name]) for name in npz.files )
+        npz.close()
+    else:
+        arrays = _npz_memmap(path, mmap_mode)
+    return MatrixBundle(arrays, path)
+
+def add_to_bundle(path, arrays):
+    """
+    Adds arrays to a bundle, e.g. cached results of an analysis of the
+    matrices. Arrays with the same names are replaced. The arrays are
+    stored uncompressed, so they can be memory mapped like the others.
+    """
+    archive = zipfile.ZipFile(path)
+    replaced = [ name for name in archive.namelist() if name[:-4] in arrays ]
+    archive.close()
+
+    if replaced:
+        # zip files cannot replace members; copy the others to a new file
+        tmp_path = path + ".tmp"
+        source = zipfile.ZipFile(path)
+        target = zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_STORED, allowZip64=True)
+        for info in source.infolist():
+            if info.filename not in replaced:
+                target.writestr(info, source.read(info))
+        source.close()
+        target.close()
+        os.replace(tmp_path, path)
+
+    archive = zipfile.ZipFile(path, "a", zipfile.ZIP_STORED, allowZip64=True)
+    for name, value in arrays.items():
+        buffer = io.BytesIO()
+        numpy.lib.format.write_array(buffer, numpy.asanyarray(value), allow_pickle=False)
+        archive.writestr(name + ".npy", buffer.getvalue())
+    archive.close()
+
+
+class MatrixBundle(object):
+    """
+    The matrices, headers and word-ngram indices of a Matrix, as loaded from
+    a binary bundle.
+
+    Example:
+
+    >>> bundle = load_bundle("output/huber1992/huber1992.npz", mmap_mode="r")
+    >>> wg = bundle.get_wg_matrix()
+    >>> bundle.header("words")[:3]
+    """
+
+    def __init__(self, arrays, path=None):
+        self.arrays = arrays
+        self.path = path
+        self.metadata = json.loads(str(arrays["metadata"][()]))
+        if self.metadata["format"] != bundle_format:
+            raise ValueError("unknown bundle format {0}".format(self.metadata["format"]))
+
+    def matrix(self, name):
+        """
+        Returns the CSR matrix "wg", "wl", "wm" or "gp". The arrays of the
+        matrix are not copied, so they stay memory mapped.
+        """
+        arrays = self.arrays
+        return csr_matrix( (arrays[name+"_data"], arrays[name+"_indices"], arrays[name+"_indptr"]),
+            shape=tuple(int(i) for i in arrays[name+"_shape"]), copy=False)
+
+    def get_wg_matrix(self):
+        return self.matrix("wg")
 
-            header.append(result)
-        return header
+    def get_wl_matrix(self):
+        return self.matrix("wl")
 
+    def get_wm_matrix(self):
+        return self.matrix("wm")
 
+    def get_gp_matrix(self):
+        return self.matrix("gp")
 
+    def header(self, name):
+        """
+        Returns a string table, e.g. "words" or "ngrams", as a list. Rows
+        without counterparts are None.
+        """
+        return [ item if item != "" else None for item in self.arrays[name].tolist() ]
 
+    def words_ngrams(self, row):
+        """
+        Returns the ordered ngram columns of a word row.
+        """
+        offsets = self.arrays["words_ngrams_offsets"]
+        return self.arrays["words_ngrams_indices"][offsets[row]:offsets[row+1]]
+
+
+def _write_lines(path, lines):
+    file = open(path, "w")
+    for line in lines:
+        file.write(line+"\n")
+    file.close()
 
+def _numbered(items):
+    for count, item in enumerate(items, 1):
+        if item is not None:
+            yield str(count)+"\t"+item
+
+def bundle_to_text(bundle, output_dir, source):
+    """
+    Writes the matrices and headers of a bundle in the text layout of the
+    matrix.py script: MatrixMarket files and the header files, e.g.
+    output_dir/huber1992_WG.mtx and output_dir/huber1992_words_header.txt.
+
+    Parameters
+    ----------
+    bundle : MatrixBundle or str
+        the bundle or its path
+    output_dir : str
+        the directory to write the files to
+    source : str
+        the prefix of the file names, usually the bibtex key of the source
+
+    Returns
+    -------
+    Nothing
+    """
+    from scipy.io import mmwrite
+
+    if isinstance(bundle, str):
+        bundle = load_bundle(bundle, mmap_mode="r")
+    prefix = os.path.join(output_dir, source)
+
+    for name in matrix_names:
+        mmwrite(prefix+"_"+name.upper()+".mtx", bundle.matrix(name))
+
+    # 1. write header: wordlistid \t language name
+    _write_lines(prefix+"_wordlistids_lgnames_header.txt",
+        [ id+"\t"+name for id, name in
+          sorted(zip(bundle.header("wordlist_ids"), bundle.header("language_names"))) ])
+
+    # 2. write words header: count \t word_id
+    words = bundle.header("words")
+    _write_lines(prefix+"_words_header.txt", _numbered(words))
+
+    # 3. write meanings header: count \t meaning (concept)
+    _write_lines(prefix+"_meanings_header.txt", _numbered(bundle.header("concepts")))
+
+    # 4. write ngrams header: count \t split ngram \t ngram
+    ngrams = bundle.header("ngrams")
+    split_ngrams = bundle.header("split_ngrams")
+    _write_lines(prefix+"_ngrams_header.txt",
+        (str(count)+"\t"+split_ngram+"\t"+ngram
+         for count, (split_ngram, ngram) in enumerate(zip(split_ngrams, ngrams), 1)
+         if ngram is not None))
+
+    # 5. write phonemes header: count \t phoneme
+    _write_lines(prefix+"_phonemes_header.txt", _numbered(bundle.header("phonemes")))
+
+    # 6. write the word and ngrams/ngrams-indices
+    _write_lines(prefix+"_words_ngrams_strings.txt",
+        ("\t".join([ word ] + [ split_ngrams[j] for j in bundle.words_ngrams(row) ])
+         for row, word in enumerate(words) if word is not None))
+    _write_lines(prefix+"_words_ngrams_indices.txt",
+        ("\t".join([ word ] + [ str(j+1) for j in bundle.words_ngrams(row) ])
+         for row, word in enumerate(words) if word is not None))
 
 
 if __name__=="__main__":
@@ -345,9 +1312,11 @@ if __name__=="__main__":
     from qlc.orthography import OrthographyParser, GraphemeParser
     from scipy.io import mmread, mmwrite # write sparse matrices
 
-    if len(sys.argv) != 2:
-        print("call: python matrix.py source\n")
+    if len(sys.argv) not in (2, 3):
+        print("call: python matrix.py source [--text]\n")
         print("python matrix.py huber1992\n")
+        print("writes output/huber1992/huber1992.npz; with --text also the")
+        print("MatrixMarket and header files\n")
 
     source = sys.argv[1] # dictionary/wordlist source key
     output_dir = "output/"+source+"/"
@@ -381,85 +1350,11 @@ if __name__=="__main__":
     # initialize matrix class
     m = Matrix(wordlist_iterator, o, "graphemes", 1) # pass ortho parser and ngram length
 
-    # write the sparse matrices to disk...
-    wg = m.get_wg_matrix()
-    wl = m.get_wl_matrix()
-    wm = m.get_wm_matrix()
-    gp = m.get_gp_matrix()    
-
-    mmwrite(output_dir+source+"_WG.mtx", wg)
-    mmwrite(output_dir+source+"_WL.mtx", wl)
-    mmwrite(output_dir+source+"_WM.mtx", wm)
-    mmwrite(output_dir+source+"_GP.mtx", gp)
-
-    # write header files...
-
-    # 1. write header: wordlistid \t language name
-    file = open(output_dir+source+"_wordlistids_lgnames_header.txt", "w")
-    wordlist_ids = []
-    for wordlistdata_id in cr.wordlistdata_ids_for_bibtex_key(source):
-        wordlist_ids.append(wordlistdata_id)
-        # print(len(wordlist_ids))
-        
-    wordlist_ids.sort()
-    for wordlist_id in wordlist_ids:
-        file.write(wordlist_id+"\t"+cr.get_language_bookname_for_wordlistdata_id(wordlist_id)+"\n")
-    file.close()
-
-    # 2. write words header: count \t word_id 
-    file = open(output_dir+source+"_words_header.txt", "w")    
-    words_header = m.get_words_header()
-    for item in words_header:
-        file.write(item+"\n")
-    file.close()
-    
-    # 3. write meanings header: count \t meaning (concept)
-    file = open(output_dir+source+"_meanings_header.txt", "w")    
-    meanings_header = m.get_meanings_header()
-    for item in meanings_header:
-        file.write(item+"\n")
-    file.close()
-
-    # 4. write ngrams header: count \t ngram
-    file = open(output_dir+source+"_ngrams_header.txt", "w")    
-    ngrams_header = m.get_ngrams_header()
-    # additional call to add in "_" separated ngrams
-    split_ngrams_header = m.get_split_ngrams_header(ngrams_header)
-    for item in split_ngrams_header:
-        file.write(item+"\n")
-    file.close()
-
-    # 5. write phonemes header: count \t phoneme
-    file = open(output_dir+source+"_phonemes_header.txt", "w")        
-    phoneme_header = m.get_ngram_header()
-    for item in phoneme_header:
-        file.write(item+"\n")
-    file.close()
-
-    # 6. write the word and ngrams/ngrams-indices
-    file = open(output_dir+source+"_words_ngrams_strings.txt", "w")
-    words_ngrams_strings_header = m.get_words_ngrams_strings()    
-    for item in words_ngrams_strings_header:
-        file.write(item+"\n")
-    file.close()
-
-    file = open(output_dir+source+"_words_ngrams_indices.txt", "w")
-    words_ngrams_indices_header = m.get_words_ngrams_indices()
-    for item in words_ngrams_indices_header:
-        file.write(item+"\n")
-    file.close()
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+    # write the matrices, headers and word-ngram indices as one bundle
+    wordlist_ids_names = [ (wordlist_id, cr.get_language_bookname_for_wordlistdata_id(wordlist_id))
+        for wordlist_id in cr.wordlistdata_ids_for_bibtex_key(source) ]
+    m.save_bundle(output_dir+source+".npz", wordlist_ids_names)
 
+    # write the old text layout for consumers that read the .mtx and header files
+    if "--text" in sys.argv[2:]:
+        bundle_to_text(output_dir+source+".npz", output_dir, source)
@@ -14,10 +14,17 @@ those into various ngram formats, returning
 
 
 import collections
+import hashlib
+import itertools
+import math
+import multiprocessing
 import numpy
+import scipy.sparse
 import sys
 import operator
 
+from numpy.lib.stride_tricks import sliding_window_view
+
 from qlc.corpusreader import CorpusReaderWordlist
 from qlc.orthography import OrthographyParser
 
@@ -41,7 +48,7 @@ def unigram_model(list):
     for segment in segments_sorted:
         segment, count = segment[0], segment[1]
         frequency = segments_hash[segment]/segment_count
-        plog = "coming..."
+        plog = -math.log(frequency)
         print(segment+"\t"+str(count)+"\t"+str(frequency)+"\t"+str(plog))
 
 def bigram_model(corpusreader_iterator, orthography_profile):
@@ -49,8 +56,31 @@ def bigram_model(corpusreader_iterator, orthography_profile):
     Take a corpusreader iterator of wordlist IDs, concepts, counterparts
     and returns a bigram model -- a matrix of unigrams (rows) by unigrams
     (columns) with frequencies of their co-occurrence in each cell.
+
+    Returns
+    -------
+    matrix: scipy.sparse.csr_matrix
+        the bigram counts, rows are the first and columns the second grapheme
+    vocabulary: list
+        the sorted list of graphemes for the rows and columns
     """
-    pass
+    o = orthography_profile
+    if isinstance(o, str):
+        o = OrthographyParser(o)
+
+    graphemes_list = []
+    for wordlistdata_id, concept, counterpart in corpusreader_iterator:
+        success, graphemes = o.parse_string_to_graphemes(counterpart)
+        if success:
+            graphemes_list.append(graphemes)
+
+    codes, lengths, vocabulary = encode_graphemes_list(graphemes_list)
+    rows, windows = _ngram_windows(codes, lengths, 2)
+    matrix = scipy.sparse.coo_matrix(
+        (numpy.ones(len(windows), dtype=numpy.int64), (windows[:, 0], windows[:, 1])),
+        shape=(len(vocabulary), len(vocabulary))).tocsr()
+    matrix.sum_duplicates()
+    return matrix, vocabulary
 
 
 
@@ -150,44 +180,587 @@ def words_ngrams_matrix_for_graphemes_list(graphemes_list, n=1):
         
     Returns
     -------
-    row_names: list
-        list of strings from the input list (row names of the matrix)
-    ngrams_list: list
-        list of ngrams that occur in the matrix
     matrix: array
-        a matrix of ngrams with the list of graphemes as its rows, the
-        list of n-grams as its columns and the counts of each ngram for
-        the respective word in the cells
-    """
-    ngrams_counts = list()
-    ngrams_set = set()
-    row_names = list()
-    # go through the list of words
-    for i, graphemes in enumerate(graphemes_list):
-
-        ngrams_counts.append(collections.defaultdict(int))
-        row_names.append(graphemes)
-        ngrams = ngrams_from_graphemes(graphemes, n)
+        a dense matrix of ngrams with the list of graphemes as its rows, the
+        sorted list of n-grams as its columns and the counts of each ngram for
+        the respective word in the cells. For large lists of words use
+        words_ngrams_sparse_matrix_for_graphemes_list() instead.
+    """
+    matrix, ngrams = words_ngrams_sparse_matrix_for_graphemes_list(graphemes_list, n)
+    return matrix.toarray().astype(float)
 
-        # go through the list of ngrams and store them in a set
-        for ngram in ngrams:
-            ngrams_counts[i][ngram] += 1
-            ngrams_set.add(ngram)
+#-----------------------------------------------------------------------------
+# Integer encoded ngrams
+#-----------------------------------------------------------------------------
 
-    ngrams_list = sorted(list(ngrams_set))
-    # generate a matrix with zeros
+def encode_graphemes_list(graphemes_list):
+    """
+    Maps the graphemes of a list of words to integer IDs. The IDs are assigned
+    in the sort order of the graphemes, so that integer ngrams sort in the same
+    order as the tuples of graphemes.
 
-    matrix = numpy.zeros( (len(row_names), len(ngrams_list)) )
-    # matrix = numpy.zeros( ( len(row_names), len(ngrams_list) ) )
+    Parameters
+    ----------
+    graphemes_list: list of tuples
+        a list of (orthographically parsed) tuples of graphemes, or a list
+        of strings where each character is a grapheme
 
-    
-    # fill the matrix with the ngram counts
-    for i in range(len(row_names)):
-        for j, ngram in enumerate(ngrams_list):
-            matrix[i][j] = ngrams_counts[i][ngram]
+    Returns
+    -------
+    codes: array
+        the grapheme IDs of all words, concatenated
+    lengths: array
+        the number of graphemes of each word
+    vocabulary: list
+        the sorted list of graphemes; the ID of a grapheme is its index
+    """
+    graphemes_list = list(graphemes_list)
+    vocabulary = sorted(set(itertools.chain.from_iterable(graphemes_list)))
+    index = dict( (grapheme, i) for i, grapheme in enumerate(vocabulary) )
+
+    lengths = numpy.fromiter((len(graphemes) for graphemes in graphemes_list),
+        dtype=numpy.int64, count=len(graphemes_list))
+    codes = numpy.fromiter((index[grapheme] for graphemes in graphemes_list
+        for grapheme in graphemes), dtype=numpy.int64, count=int(lengths.sum()))
+    return codes, lengths, vocabulary
+
+def packed_ngrams(codes, lengths, n, base, word_of_position=None):
+    """
+    Extracts all ngrams of a list of encoded words as integers. Each window of
+    n grapheme IDs is packed into one integer (the window read as a number
+    of base "base"). Windows that cross a word boundary are dropped.
+
+    Parameters
+    ----------
+    codes: array
+        the concatenated grapheme IDs of the words, from encode_graphemes_list()
+    lengths: array
+        the number of graphemes of each word
+    n: integer
+        the length of the ngrams
+    base: integer
+        the number of distinct graphemes
+    word_of_position: array
+        the index of the word for each element of codes; computed from
+        lengths if not given
+
+    Returns
+    -------
+    rows: array
+        the index of the word for each ngram
+    keys: array
+        the packed ngram for each ngram; for base ** n >= 2 ** 63 the
+        windows are returned as a 2-dimensional array instead
+    """
+    rows, windows = _ngram_windows(codes, lengths, n, word_of_position)
+    if len(rows) == 0:
+        return rows, numpy.zeros(0, dtype=numpy.int64)
+
+    if base ** n >= 2 ** 63:
+        return rows, windows
+    weights = base ** numpy.arange(n-1, -1, -1, dtype=numpy.int64)
+    return rows, windows @ weights
+
+def _ngram_windows(codes, lengths, n, word_of_position=None):
+    # Returns the word index and the window of n codes for each ngram that
+    # lies completely inside a word.
+    if len(codes) < n:
+        return numpy.zeros(0, dtype=numpy.int64), numpy.zeros((0, n), dtype=codes.dtype)
+
+    if word_of_position is None:
+        word_of_position = numpy.repeat(numpy.arange(len(lengths)), lengths)
+    windows = sliding_window_view(codes, n)
+    # a window is inside a word if it starts and ends in the same word
+    valid = word_of_position[:len(windows)] == word_of_position[n-1:]
+    return word_of_position[:len(windows)][valid], windows[valid]
+
+def unpack_ngram(key, n, base):
+    """
+    Returns the tuple of grapheme IDs of a packed ngram.
+    """
+    ids = []
+    for i in range(n):
+        key, id = divmod(int(key), base)
+        ids.append(id)
+    return tuple(reversed(ids))
+
+def words_ngrams_sparse_matrix_for_graphemes_list(graphemes_list, n=1):
+    """
+    Counts the ngrams of each word in a list of words and returns a sparse
+    word x ngram matrix. The graphemes are mapped to integers once and the
+    ngrams are extracted for all words at once with NumPy.
+
+    Parameters
+    ----------
+    graphemes_list: list of tuples
+        a list of (orthographically parsed) tuples of graphemes, or a list
+        of strings where each character is a grapheme
+    n: integer
+        the number of graphemes that have to be looked at for the ngram
+        default: n = 1 (unigram mode)
+
+    Returns
+    -------
+    matrix: scipy.sparse.csr_matrix
+        the counts of each ngram (columns) for each word (rows)
+    ngrams: list
+        the sorted list of ngrams as tuples of graphemes, one for each column
+    """
+    codes, lengths, vocabulary = encode_graphemes_list(graphemes_list)
+    return _ngram_count_matrix(codes, lengths, vocabulary, n)
+
+def words_ngrams_sparse_matrices_for_graphemes_list(graphemes_list, max_n,
+        combined=False):
+    """
+    Counts the ngrams of all orders 1..max_n of each word in a list of words.
+    The words are encoded only once; all orders are extracted from the same
+    buffer of grapheme IDs.
+
+    Parameters
+    ----------
+    graphemes_list: list of tuples
+        a list of (orthographically parsed) tuples of graphemes, or a list
+        of strings where each character is a grapheme
+    max_n: integer
+        the highest ngram order
+    combined: boolean
+        if True, return one matrix with the columns of all orders side by side
+
+    Returns
+    -------
+    if combined is False, a dict { n : (matrix, ngrams) } with the result of
+    words_ngrams_sparse_matrix_for_graphemes_list() for each order n.
+
+    if combined is True, a tuple (matrix, ngrams, offsets): the sparse matrix
+    with the columns of all orders, the list of ngrams for all columns and an
+    array of max_n + 1 offsets, where the columns of order n are
+    offsets[n-1]:offsets[n].
+    """
+    codes, lengths, vocabulary = encode_graphemes_list(graphemes_list)
+    word_of_position = numpy.repeat(numpy.arange(len(lengths)), lengths)
+
+    orders = {}
+    for n in range(1, max_n+1):
+        orders[n] = _ngram_count_matrix(codes, lengths, vocabulary, n,
+                                        word_of_position)
+    if not combined:
+        return orders
+
+    ngrams = []
+    for n in range(1, max_n+1):
+        ngrams.extend(orders[n][1])
+    offsets = numpy.cumsum([0] + [ len(orders[n][1]) for n in range(1, max_n+1) ])
+    matrix = scipy.sparse.hstack([ orders[n][0] for n in range(1, max_n+1) ],
+                                 format="csr")
+    return matrix, ngrams, offsets
+
+def _ngram_count_matrix(codes, lengths, vocabulary, n, word_of_position=None):
+    base = max(len(vocabulary), 1)
+    rows, keys = packed_ngrams(codes, lengths, n, base, word_of_position)
+
+    if keys.ndim == 2:
+        unique_keys, columns = numpy.unique(keys, axis=0, return_inverse=True)
+        ngrams = [ tuple(vocabulary[id] for id in key) for key in unique_keys ]
+    else:
+        unique_keys, columns = numpy.unique(keys, return_inverse=True)
+        ngrams = [ tuple(vocabulary[id] for id in unpack_ngram(key, n, base))
+            for key in unique_keys ]
+
+    matrix = scipy.sparse.coo_matrix(
+        (numpy.ones(len(rows), dtype=numpy.int64), (rows, columns.ravel())),
+        shape=(len(lengths), len(ngrams))).tocsr()
+    matrix.sum_duplicates()
+    return matrix, ngrams
+
+#-----------------------------------------------------------------------------
+# Hashed ngrams
+#-----------------------------------------------------------------------------
+
+class HashingVectorizer(object):
+    """
+    Maps the ngrams of words into a sparse feature space of fixed width by
+    hashing, so that no vocabulary has to be collected first and memory does
+    not grow with the number of distinct ngrams. The hashes are stable across
+    processes and runs: chunks of a corpus can be vectorized independently
+    (e.g. in a multiprocessing.Pool) and the results simply summed.
+
+    Example:
+
+    >>> vectorizer = HashingVectorizer(n=(1, 2), n_features=2**18)
+    >>> matrix = vectorizer.transform([ ("#", "a", "b", "#"), ("#", "b", "#") ])
+    >>> totals = vectorizer.count(graphemes_iterator, processes=4)
+    """
+
+    def __init__(self, n=2, n_features=2**20, signed=True):
+        """
+        Constructor of HashingVectorizer class.
+
+        Parameters
+        ----------
+        n : integer or tuple of integers
+            the ngram length, or several ngram lengths that are hashed into
+            the same feature space
+        n_features : integer
+            the number of columns of the feature space
+        signed : boolean
+            if True, each ngram adds +1 or -1 depending on one bit of its
+            hash, so that collisions tend to cancel out instead of adding up
+
+        Returns
+        -------
+        Nothing
+        """
+        if isinstance(n, int):
+            n = (n,)
+        self.orders = tuple(n)
+        self.n_features = n_features
+        self.signed = signed
+        self._grapheme_hashes = {}
+
+    def __getstate__(self):
+        # the cache of grapheme hashes is rebuilt in each process
+        state = self.__dict__.copy()
+        state["_grapheme_hashes"] = {}
+        return state
+
+    def _grapheme_hash(self, grapheme):
+        try:
+            return self._grapheme_hashes[grapheme]
+        except KeyError:
+            digest = hashlib.blake2b(grapheme.encode("utf-8"), digest_size=8).digest()
+            h = self._grapheme_hashes[grapheme] = int.from_bytes(digest, "little")
+            return h
+
+    def _hashes(self, graphemes_list):
+        lengths = numpy.fromiter((len(graphemes) for graphemes in graphemes_list),
+            dtype=numpy.int64, count=len(graphemes_list))
+        codes = numpy.fromiter((self._grapheme_hash(grapheme)
+            for graphemes in graphemes_list for grapheme in graphemes),
+            dtype=numpy.uint64, count=int(lengths.sum()))
+        word_of_position = numpy.repeat(numpy.arange(len(lengths)), lengths)
+
+        all_rows = []
+        all_hashes = []
+        for n in self.orders:
+            rows, windows = _ngram_windows(codes, lengths, n, word_of_position)
+            # FNV-1a style combination of the grapheme hashes, seeded with
+            # the order, and a final bit mixing step (from MurmurHash3)
+            h = numpy.full(len(rows), 0xcbf29ce484222325 ^ n, dtype=numpy.uint64)
+            for k in range(n):
+                h = (h ^ windows[:, k]) * numpy.uint64(0x100000001b3)
+            h ^= h >> numpy.uint64(33)
+            h *= numpy.uint64(0xff51afd7ed558ccd)
+            h ^= h >> numpy.uint64(33)
+            all_rows.append(rows)
+            all_hashes.append(h)
+        return len(lengths), numpy.concatenate(all_rows), numpy.concatenate(all_hashes)
+
+    def transform(self, graphemes_list):
+        """
+        Returns a sparse matrix with one row per word and n_features columns,
+        with the (signed) counts of the hashed ngrams of the word.
+
+        Parameters
+        ----------
+        graphemes_list: list of tuples
+            a list of (orthographically parsed) tuples of graphemes, or a list
+            of strings where each character is a grapheme
+
+        Returns
+        -------
+        a scipy.sparse.csr_matrix
+        """
+        graphemes_list = list(graphemes_list)
+        n_rows, rows, hashes = self._hashes(graphemes_list)
+        columns = (hashes % numpy.uint64(self.n_features)).astype(numpy.int64)
+        if self.signed:
+            data = 1 - 2 * (hashes >> numpy.uint64(63)).astype(numpy.int64)
+        else:
+            data = numpy.ones(len(hashes), dtype=numpy.int64)
+        matrix = scipy.sparse.coo_matrix((data, (rows, columns)),
+            shape=(n_rows, self.n_features)).tocsr()
+        matrix.sum_duplicates()
+        return matrix
+
+    def transform_sum(self, graphemes_list):
+        """
+        Returns the sum of all rows of transform() as a sparse 1 x n_features
+        matrix. The sums of several chunks can be added up.
+        """
+        return scipy.sparse.csr_matrix(self.transform(graphemes_list).sum(axis=0))
+
+    def transform_stream(self, graphemes_iterable, chunksize=10000):
+        """
+        Returns a generator of transform() matrices for consecutive chunks of
+        chunksize words of an iterable of any length.
+        """
+        iterator = iter(graphemes_iterable)
+        while True:
+            chunk = list(itertools.islice(iterator, chunksize))
+            if not chunk:
+                return
+            yield self.transform(chunk)
+
+    def count(self, graphemes_iterable, chunksize=10000, processes=1,
+            max_chunks_in_flight=None):
+        """
+        Returns the total (signed) counts of the hashed ngrams of all words of
+        an iterable in one streaming pass, as a sparse 1 x n_features matrix.
+        With processes > 1 the chunks are vectorized in worker processes
+        (None for the number of CPUs); at most max_chunks_in_flight chunks
+        (default: 2 * processes) are read ahead of the summation.
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        total = scipy.sparse.csr_matrix((1, self.n_features), dtype=numpy.int64)
+        iterator = iter(graphemes_iterable)
+        chunks = iter(lambda: list(itertools.islice(iterator, chunksize)), [])
+
+        if processes == 1:
+            for chunk in chunks:
+                total = total + self.transform_sum(chunk)
+            return total
+
+        if max_chunks_in_flight is None:
+            max_chunks_in_flight = 2 * processes
+        pool = multiprocessing.Pool(processes)
+        try:
+            pending = collections.deque()
+            for chunk in chunks:
+                pending.append(pool.apply_async(self.transform_sum, (chunk,)))
+                if len(pending) >= max_chunks_in_flight:
+                    total = total + pending.popleft().get()
+            while pending:
+                total = total + pending.popleft().get()
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+        return total
+
+#-----------------------------------------------------------------------------
+# Ngram language model
+#-----------------------------------------------------------------------------
+
+class NgramModel(object):
+    """
+    Grapheme ngram language model with interpolated Witten-Bell smoothing,
+    e.g. a phonotactic model of a language for scoring words or detecting
+    loanwords.
+
+    The counts are stored in dicts keyed by packed integers: each grapheme
+    gets an integer ID (0 is reserved for unknown graphemes) and an ngram is
+    the IDs shifted into one 64 bit integer. The model can be updated with
+    new words at any time. For scoring, the tables are converted to sorted
+    NumPy arrays, so that whole wordlists are scored with array lookups.
+
+    The probability of each grapheme of a word is conditioned on up to n-1
+    preceding graphemes of the same word; the first grapheme of a word
+    (usually the boundary "#") is not scored.
+
+    Example:
+
+    >>> model = NgramModel(3)
+    >>> model.update([ ("#", "a", "b", "#"), ("#", "b", "a", "#") ])
+    >>> model.score([ ("#", "a", "b", "a", "#") ])
+    array([-3.34...])
+    >>> model.save("bora_3gram.npz")
+    >>> model = NgramModel.load("bora_3gram.npz")
+    """
+
+    def __init__(self, n=3):
+        """
+        Constructor of NgramModel class.
+
+        Parameters
+        ----------
+        n : integer
+            the highest ngram order
+
+        Returns
+        -------
+        Nothing
+        """
+        self.n = n
+        self.bits = 63 // n
+        self.vocabulary = [ None ] # ID 0: unknown grapheme
+        self._ids = {}
+        # for each order k = 1..n:
+        # { packed k-gram : count }
+        self.ngram_counts = [ None ] + [ {} for k in range(n) ]
+        # { packed (k-1)-gram context : count of all k-grams with that context }
+        self.context_counts = [ None ] + [ {} for k in range(n) ]
+        # { packed (k-1)-gram context : number of distinct k-grams with that context }
+        self.context_types = [ None ] + [ {} for k in range(n) ]
+        self._tables = None
+
+    def _encode(self, graphemes_list, add):
+        ids = self._ids
+        lengths = numpy.fromiter((len(graphemes) for graphemes in graphemes_list),
+            dtype=numpy.int64, count=len(graphemes_list))
+        if add:
+            for graphemes in graphemes_list:
+                for grapheme in graphemes:
+                    if grapheme not in ids:
+                        if len(self.vocabulary) >= 2 ** self.bits:
+                            raise ValueError("too many distinct graphemes for a model of order {0}".format(self.n))
+                        ids[grapheme] = len(self.vocabulary)
+                        self.vocabulary.append(grapheme)
+        codes = numpy.fromiter((ids.get(grapheme, 0)
+            for graphemes in graphemes_list for grapheme in graphemes),
+            dtype=numpy.int64, count=int(lengths.sum()))
+        return codes, lengths
+
+    def _keys(self, codes, lengths, k):
+        # packed k-grams and their (k-1)-gram contexts ending at each position
+        # that has at least k-1 predecessors in its word; returns the positions,
+        # too
+        starts = numpy.cumsum(lengths) - lengths
+        position_in_word = numpy.arange(len(codes)) - numpy.repeat(starts, lengths)
+        positions = numpy.nonzero(position_in_word >= k-1)[0]
+        contexts = numpy.zeros(len(positions), dtype=numpy.int64)
+        for j in range(k-1, 0, -1):
+            contexts = (contexts << self.bits) | codes[positions - j]
+        keys = (contexts << self.bits) | codes[positions]
+        return positions, contexts, keys
+
+    def update(self, graphemes_list):
+        """
+        Adds the ngrams of a list of words to the counts.
+
+        Parameters
+        ----------
+        graphemes_list: list of tuples
+            a list of (orthographically parsed) tuples of graphemes
+        """
+        graphemes_list = list(graphemes_list)
+        codes, lengths = self._encode(graphemes_list, True)
+        for k in range(1, self.n+1):
+            positions, contexts, keys = self._keys(codes, lengths, k)
+            unique_keys, counts = numpy.unique(keys, return_counts=True)
+            ngram_counts = self.ngram_counts[k]
+            context_counts = self.context_counts[k]
+            context_types = self.context_types[k]
+            for key, count in zip(unique_keys.tolist(), counts.tolist()):
+                context = key >> self.bits
+                if key not in ngram_counts:
+                    ngram_counts[key] = 0
+                    context_types[context] = context_types.get(context, 0) + 1
+                ngram_counts[key] += count
+                context_counts[context] = context_counts.get(context, 0) + count
+        self._tables = None
+
+    def _table(self, table):
+        keys = numpy.fromiter(table.keys(), dtype=numpy.int64, count=len(table))
+        values = numpy.fromiter(table.values(), dtype=numpy.int64, count=len(table))
+        order = numpy.argsort(keys)
+        return keys[order], values[order]
+
+    def _lookup(self, table, keys):
+        table_keys, table_values = table
+        if len(table_keys) == 0:
+            return numpy.zeros(len(keys), dtype=numpy.int64)
+        index = numpy.searchsorted(table_keys, keys)
+        index[index == len(table_keys)] = 0
+        found = table_keys[index] == keys
+        return numpy.where(found, table_values[index], 0)
+
+    def _freeze(self):
+        if self._tables is None:
+            self._tables = [ None ] + [ (self._table(self.ngram_counts[k]),
+                                         self._table(self.context_counts[k]),
+                                         self._table(self.context_types[k]))
+                                       for k in range(1, self.n+1) ]
+        return self._tables
+
+    def logprobs(self, graphemes_list):
+        """
+        Returns the natural log probabilities of all graphemes of a list of
+        words, except the first grapheme of each word.
+
+        Returns
+        -------
+        logprobs: array
+            the log probabilities, concatenated for all words
+        lengths: array
+            the number of log probabilities for each word
+        """
+        graphemes_list = list(graphemes_list)
+        tables = self._freeze()
+        codes, lengths = self._encode(graphemes_list, False)
+
+        # base distribution: uniform over the known graphemes and "unknown"
+        probs = numpy.full(len(codes), 1.0 / len(self.vocabulary))
+        for k in range(1, self.n+1):
+            positions, contexts, keys = self._keys(codes, lengths, k)
+            ngram_table, context_count_table, context_type_table = tables[k]
+            c_hw = self._lookup(ngram_table, keys)
+            c_h = self._lookup(context_count_table, contexts)
+            t_h = self._lookup(context_type_table, contexts)
+            seen = c_h > 0
+            p = probs[positions]
+            probs[positions] = numpy.where(seen,
+                (c_hw + t_h * p) / numpy.maximum(c_h + t_h, 1), p)
+
+        starts = numpy.cumsum(lengths) - lengths
+        scored = numpy.ones(len(codes), dtype=bool)
+        scored[starts[lengths > 0]] = False
+        return numpy.log(probs[scored]), numpy.maximum(lengths - 1, 0)
+
+    def score(self, graphemes_list, normalize=False):
+        """
+        Returns the log probability of each word of a list of words.
+
+        Parameters
+        ----------
+        graphemes_list: list of tuples
+            a list of (orthographically parsed) tuples of graphemes
+        normalize: boolean
+            if True, return the mean log probability per scored grapheme
+            instead of the sum, to compare words of different lengths
+
+        Returns
+        -------
+        an array with one (natural) log probability per word
+        """
+        logprobs, lengths = self.logprobs(graphemes_list)
+        words = numpy.repeat(numpy.arange(len(lengths)), lengths)
+        sums = numpy.bincount(words, weights=logprobs, minlength=len(lengths))
+        if normalize:
+            return sums / numpy.maximum(lengths, 1)
+        return sums
+
+    def save(self, path):
+        """
+        Saves the model to a NumPy .npz file.
+        """
+        arrays = { "n": numpy.array(self.n),
+                   "vocabulary": numpy.array(self.vocabulary[1:], dtype=str) }
+        for k in range(1, self.n+1):
+            for name in ("ngram_counts", "context_counts", "context_types"):
+                keys, values = self._table(getattr(self, name)[k])
+                arrays["{0}_{1}_keys".format(name, k)] = keys
+                arrays["{0}_{1}_values".format(name, k)] = values
+        numpy.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a model that was saved with save(). The loaded model can be
+        updated further.
+        """
+        with numpy.load(path) as arrays:
+            model = cls(int(arrays["n"]))
+            for grapheme in arrays["vocabulary"].tolist():
+                model._ids[grapheme] = len(model.vocabulary)
+                model.vocabulary.append(grapheme)
+            for k in range(1, model.n+1):
+                for name in ("ngram_counts", "context_counts", "context_types"):
+                    keys = arrays["{0}_{1}_keys".format(name, k)].tolist()
+                    values = arrays["{0}_{1}_values".format(name, k)].tolist()
+                    getattr(model, name)[k] = dict(zip(keys, values))
+        return model
 
-    return matrix
-        
 if __name__ == '__main__':
     """
     # NgramTest().run()
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+#-----------------------------------------------------------------------------
+# Copyright (c) 2012, Quantitative Language Comparison Team
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""
+Positional inverted index of grapheme ngrams, to find the counterparts that
+contain a given sequence of graphemes, e.g. all words that start with "# p"
+or contain "a n" and "k u", without scanning all counterparts.
+"""
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+import numpy
+
+from qlc.tokenizer import tokenize_parallel
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+class NgramIndex(object):
+    """
+    Inverted index from integer coded grapheme ngrams of the orders 1 to n
+    to postings of (word, position). Each word is stored with its language,
+    concept and counterpart.
+
+    The postings of each order are kept in NumPy arrays sorted by the packed
+    ngram, so the postings of an ngram are found with a binary search. A
+    query sequence longer than n is split into overlapping n-grams whose
+    postings are intersected on (word, start position). The word boundary
+    "#" is a grapheme like any other, so a query that starts or ends with
+    "#" is anchored at the start or end of the word.
+
+    Example:
+
+    >>> index = NgramIndex.from_records(cr_iterator, orthography_parser)
+    >>> for language, concept, counterpart in index.search("# p a"):
+    ...     print(language, concept, counterpart)
+    >>> index.search_all([ "a n", "k u #" ])
+    """
+
+    def __init__(self, n=2):
+        """
+        Constructor of NgramIndex class.
+
+        Parameters
+        ----------
+        n : int
+            The highest ngram order that is indexed.
+
+        Returns
+        -------
+        Nothing
+        """
+        self.n = n
+        self.bits = 63 // n
+        self.vocabulary = [ None ] # ID 0: unknown grapheme
+        self._ids = {}
+        # [ (language, concept, counterpart), ... ], the list index is the
+        # word ID
+        self.words = []
+        self._codes = []
+        self._lengths = []
+        self._postings = None
+
+    @classmethod
+    def from_records(cls, records, orthography_parser, n=2, processes=1):
+        """
+        Creates an index from (language, concept, counterpart) records, e.g.
+        the source of a Tokenizer or the iterator that is passed to Matrix.
+        Counterparts that cannot be parsed are skipped.
+        """
+        index = cls(n)
+        index.add_records(tokenize_parallel(records, orthography_parser,
+                                            processes=processes))
+        return index
+
+    @classmethod
+    def from_tokenizer(cls, tokenizer, n=2, processes=1):
+        """
+        Creates an index from the source and orthography parser of a
+        Tokenizer.
+        """
+        return cls.from_records(tokenizer.source, tokenizer.o, n, processes)
+
+    def _graphemes(self, graphemes):
+        if isinstance(graphemes, str):
+            return graphemes.split()
+        return graphemes
+
+    def add(self, language, concept, counterpart, graphemes):
+        """
+        Adds a parsed word to the index.
+
+        Parameters
+        ----------
+        language, concept, counterpart : str
+            The data that is returned for the word in search results.
+        graphemes : tuple or str
+            The parsed graphemes, as a tuple or as a space separated string
+            like "# w a n è n e #".
+        """
+        ids = self._ids
+        codes = []
+        for grapheme in self._graphemes(graphemes):
+            if grapheme not in ids:
+                if len(self.vocabulary) >= 2 ** self.bits:
+                    raise ValueError("too many distinct graphemes for an index of order {0}".format(self.n))
+                ids[grapheme] = len(self.vocabulary)
+                self.vocabulary.append(grapheme)
+            codes.append(ids[grapheme])
+        self.words.append((language, concept, counterpart))
+        self._codes.extend(codes)
+        self._lengths.append(len(codes))
+        self._postings = None
+
+    def add_records(self, records):
+        """
+        Adds all records of an iterable of (language, concept, counterpart,
+        graphemes) tuples, e.g. the output of tokenize_parallel().
+        """
+        for language, concept, counterpart, graphemes in records:
+            self.add(language, concept, counterpart, graphemes)
+
+    def _build(self):
+        if self._postings is not None:
+            return self._postings
+        codes = numpy.array(self._codes, dtype=numpy.int64)
+        lengths = numpy.array(self._lengths, dtype=numpy.int64)
+        starts = numpy.cumsum(lengths) - lengths
+        word_of_position = numpy.repeat(numpy.arange(len(lengths)), lengths)
+        position_in_word = numpy.arange(len(codes)) - numpy.repeat(starts, lengths)
+
+        # postings of order k: [ keys, words, positions ], sorted by key, word
+        # and position
+        self._postings = [ None ]
+        for k in range(1, self.n+1):
+            remaining = lengths[word_of_position] - position_in_word
+            valid = numpy.nonzero(remaining >= k)[0]
+            keys = numpy.zeros(len(valid), dtype=numpy.int64)
+            for j in range(k):
+                keys = (keys << self.bits) | codes[valid + j]
+            words = word_of_position[valid]
+            positions = position_in_word[valid]
+            order = numpy.lexsort((positions, words, keys))
+            self._postings.append((keys[order], words[order], positions[order]))
+        return self._postings
+
+    def _occurrences_of_ngram(self, ids):
+        keys, words, positions = self._build()[len(ids)]
+        key = 0
+        for i in ids:
+            key = (key << self.bits) | i
+        start, end = numpy.searchsorted(keys, [ key, key + 1 ])
+        return words[start:end], positions[start:end]
+
+    def occurrences(self, query):
+        """
+        Returns the occurrences of a sequence of graphemes.
+
+        Parameters
+        ----------
+        query : tuple or str
+            The graphemes, as a tuple or as a space separated string like
+            "# p a".
+
+        Returns
+        -------
+        words : array
+            The word IDs (indices of self.words), sorted.
+        positions : array
+            The position of the first grapheme of each occurrence.
+        """
+        graphemes = self._graphemes(query)
+        if len(graphemes) == 0:
+            raise ValueError("empty query")
+        empty = numpy.zeros(0, dtype=numpy.int64)
+        ids = [ self._ids.get(grapheme, 0) for grapheme in graphemes ]
+        if 0 in ids:
+            return empty, empty
+
+        k = min(self.n, len(ids))
+        # overlapping k-grams that cover the query; the last one is aligned
+        # with the end of the query
+        offsets = list(range(0, len(ids) - k + 1, k))
+        if offsets[-1] != len(ids) - k:
+            offsets.append(len(ids) - k)
+
+        # intersect the occurrences on (word, start position) of the query
+        matches = None
+        shift = numpy.int64(32)
+        for offset in offsets:
+            words, positions = self._occurrences_of_ngram(ids[offset:offset+k])
+            # a k-gram at a position before its offset in the query cannot
+            # be part of a match; its start position would be negative
+            keep = positions >= offset
+            # the (word, position) postings of a k-gram are unique, and so
+            # are the packed keys
+            packed = (words[keep] << shift) | (positions[keep] - offset)
+            if matches is None:
+                matches = packed
+            else:
+                matches = numpy.intersect1d(matches, packed, assume_unique=True)
+            if len(matches) == 0:
+                return empty, empty
+        return matches >> shift, matches & ((1 << shift) - 1)
+
+    def word_ids(self, query):
+        """
+        Returns the sorted IDs of the words that contain a sequence of
+        graphemes.
+        """
+        words, _ = self.occurrences(query)
+        return numpy.unique(words)
+
+    def word_ids_all(self, queries):
+        """
+        Returns the sorted IDs of the words that contain all of the given
+        sequences of graphemes. The rarest sequences are intersected first.
+        """
+        results = sorted((self.word_ids(query) for query in queries), key=len)
+        if len(results) == 0:
+            return numpy.zeros(0, dtype=numpy.int64)
+        words = results[0]
+        for other in results[1:]:
+            if len(words) == 0:
+                break
+            words = numpy.intersect1d(words, other, assume_unique=True)
+        return words
+
+    def search(self, query):
+        """
+        Returns the (language, concept, counterpart) tuples of all words that
+        contain a sequence of graphemes.
+        """
+        return [ self.words[i] for i in self.word_ids(query) ]
+
+    def search_all(self, queries):
+        """
+        Returns the (language, concept, counterpart) tuples of all words that
+        contain all of the given sequences of graphemes.
+        """
+        return [ self.words[i] for i in self.word_ids_all(queries) ]
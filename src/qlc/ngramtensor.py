@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+#-----------------------------------------------------------------------------
+# Copyright (c) 2012, Quantitative Language Comparison Team
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""
+Sparse language x concept x ngram tensor and the significance of the
+co-occurrence of ngrams in the counterparts of two languages.
+
+For two languages, the co-occurrence k of the ngrams a and b is the number
+of concepts for which a is in a counterpart of the first language and b is
+in a counterpart of the second language. With n_a and n_b the numbers of
+concepts with a and b and N the number of concepts, the expected
+co-occurrence is E = n_a * n_b / N, and the significance is the negative
+log probability of k under a Poisson distribution with mean E:
+
+    sig = E + log(k!) - k * log(E)
+"""
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+import itertools
+import multiprocessing
+
+import numpy
+import scipy.sparse
+from scipy.special import gammaln
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def poisson_significance(cooccurrences, counts1, counts2, n_concepts):
+    """
+    Computes the Poisson significance of the non-zero co-occurrences.
+
+    Parameters
+    ----------
+    cooccurrences : scipy.sparse matrix
+        the co-occurrence counts k of the ngrams of the first language (rows)
+        and the second language (columns)
+    counts1, counts2 : array
+        the number of concepts of each ngram in the first and second language
+    n_concepts : int
+        the number of concepts N
+
+    Returns
+    -------
+    A CSR matrix with the significance of each non-zero co-occurrence. For a
+    pair of ngrams that do not co-occur the significance is just the
+    expectation E, see expectation().
+    """
+    k = scipy.sparse.coo_matrix(cooccurrences)
+    counts1 = numpy.asarray(counts1, dtype=float).ravel()
+    counts2 = numpy.asarray(counts2, dtype=float).ravel()
+    expectation = counts1[k.row] * counts2[k.col] / n_concepts
+    # log(k!) = gammaln(k + 1) does not overflow like factorial()
+    significance = expectation + gammaln(k.data + 1.0) - k.data * numpy.log(expectation)
+    return scipy.sparse.csr_matrix((significance, (k.row, k.col)), shape=k.shape)
+
+def expectation(counts1, counts2, n_concepts, rows=None, cols=None):
+    """
+    Returns the expected co-occurrence of the ngrams as a dense matrix,
+    optionally only for the given rows and columns.
+    """
+    counts1 = numpy.asarray(counts1, dtype=float).ravel()
+    counts2 = numpy.asarray(counts2, dtype=float).ravel()
+    if rows is not None:
+        counts1 = counts1[rows]
+    if cols is not None:
+        counts2 = counts2[cols]
+    return numpy.outer(counts1, counts2) / n_concepts
+
+_worker_tensor = None
+
+def _init_worker(tensor):
+    # the tensor is sent once to each worker process, not with every pair
+    global _worker_tensor
+    _worker_tensor = tensor
+
+def _pair_significance(pair):
+    language1, language2 = pair
+    return (language1, language2, _worker_tensor.significance(language1, language2))
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+class LanguageConceptNgramTensor(object):
+    """
+    Binary 3-way tensor of languages x concepts x ngrams: the entry is 1 if
+    a counterpart of the language for the concept contains the ngram. The
+    tensor is stored as one sparse concepts x ngrams matrix per language;
+    the ngram columns are the same for all languages.
+
+    Example:
+
+    >>> m = Matrix(wordlist_iterator, o, "graphemes", 2)
+    >>> tensor = LanguageConceptNgramTensor.from_matrix(m)
+    >>> for language1, language2, (k, sig) in tensor.pairwise_significance(processes=4):
+    ...     print(language1, language2, sig.max())
+    """
+
+    def __init__(self, slices, languages, concepts, ngrams):
+        """
+        Constructor of LanguageConceptNgramTensor class.
+
+        Parameters
+        ----------
+        slices : list of scipy.sparse matrices
+            a concepts x ngrams matrix for each language
+        languages, concepts, ngrams : list
+            the headers of the three dimensions
+
+        Returns
+        -------
+        Nothing
+        """
+        self.slices = [ (scipy.sparse.csr_matrix(s) > 0).astype(numpy.int64)
+            for s in slices ]
+        self.languages = list(languages)
+        self.concepts = list(concepts)
+        self.ngrams = list(ngrams)
+        self.languages_index = dict( (l, i) for i, l in enumerate(self.languages) )
+        self.ngrams_index = dict( (n, i) for i, n in enumerate(self.ngrams) )
+
+    @classmethod
+    def from_matrix(cls, m):
+        """
+        Builds the tensor from the WG, WL and WM matrices of a Matrix. The
+        language specific ngrams are mapped to the composed ngrams, e.g.
+        "#a_7522" to "#a".
+        """
+        wg = m.get_wg_matrix().tocsc()
+        wl = m.get_wl_matrix().tocsc()
+        wm = m.get_wm_matrix().tocsr()
+
+        # language specific ngrams (rows) x composed ngrams (columns)
+        ngrams_index = {}
+        columns = numpy.zeros(wg.shape[1], dtype=numpy.int64)
+        valid = numpy.zeros(wg.shape[1], dtype=bool)
+        for j, ngram in enumerate(m.non_unique_ngrams):
+            if ngram is not None:
+                columns[j] = ngrams_index.setdefault(ngram.partition("_")[0], len(ngrams_index))
+                valid[j] = True
+        rows = numpy.nonzero(valid)[0]
+        ngram_map = scipy.sparse.csr_matrix(
+            (numpy.ones(len(rows), dtype=numpy.int64), (rows, columns[rows])),
+            shape=(wg.shape[1], len(ngrams_index)))
+        # words x composed ngrams
+        words_ngrams = (wg @ ngram_map).tocsr()
+
+        languages, slices = [], []
+        for j, language in enumerate(m.languages):
+            if language is None:
+                continue
+            words = wl[:, j].nonzero()[0]
+            languages.append(language)
+            slices.append(wm[words].T @ words_ngrams[words])
+
+        ngrams = [ None ] * len(ngrams_index)
+        for ngram, j in ngrams_index.items():
+            ngrams[j] = ngram
+        return cls(slices, languages, m.concepts, ngrams)
+
+    def __getitem__(self, language):
+        """
+        Returns the concepts x ngrams matrix of a language.
+        """
+        return self.slices[self.languages_index[language]]
+
+    def to_coo(self):
+        """
+        Returns the (language, concept, ngram) indices of all non-zero
+        entries.
+        """
+        indices = [ [], [], [] ]
+        for i, s in enumerate(self.slices):
+            s = s.tocoo()
+            indices[0].append(numpy.full(s.nnz, i, dtype=numpy.int64))
+            indices[1].append(s.row.astype(numpy.int64))
+            indices[2].append(s.col.astype(numpy.int64))
+        return tuple(numpy.concatenate(index) if index else numpy.zeros(0, dtype=numpy.int64)
+            for index in indices)
+
+    def counts(self, language):
+        """
+        Returns the number of concepts for each ngram in a language.
+        """
+        return numpy.asarray(self[language].sum(axis=0)).ravel()
+
+    def cooccurrences(self, language1, language2):
+        """
+        Returns the sparse ngrams x ngrams matrix of the number of concepts
+        in which the ngram of the row is in language1 and the ngram of the
+        column is in language2.
+        """
+        return (self[language1].T @ self[language2]).tocsr()
+
+    def significance(self, language1, language2):
+        """
+        Returns the co-occurrence counts and their Poisson significance for
+        two languages, as two sparse matrices with the same non-zeros.
+        """
+        k = self.cooccurrences(language1, language2)
+        return (k, poisson_significance(k, self.counts(language1),
+                                        self.counts(language2), len(self.concepts)))
+
+    def pairwise_significance(self, pairs=None, processes=1, chunksize=1):
+        """
+        Computes the significance for pairs of languages, in parallel if
+        processes is not 1.
+
+        Parameters
+        ----------
+        pairs : iterable
+            (language1, language2) tuples, defaults to all pairs of languages
+        processes : int
+            the number of worker processes, None for the number of CPUs
+        chunksize : int
+            the number of pairs that are sent to a worker at once
+
+        Returns
+        -------
+        A generator of (language1, language2, (k, sig)) tuples, in the order
+        of the pairs. The workers are stopped when the generator is closed,
+        so the remaining pairs are not computed if the caller stops early.
+        """
+        if pairs is None:
+            pairs = itertools.combinations(self.languages, 2)
+        if processes == 1:
+            for language1, language2 in pairs:
+                yield (language1, language2, self.significance(language1, language2))
+            return
+
+        pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(self,))
+        try:
+            for result in pool.imap(_pair_significance, pairs, chunksize):
+                yield result
+            pool.close()
+        finally:
+            # a caller that stops early must not wait for the remaining pairs
+            pool.terminate()
+            pool.join()
@@ -8,21 +8,28 @@ import sys
 import unicodedata
 import regex
 import os
+import hashlib
+import json
+import tempfile
 
-class DuplicateExceptation(Exception): pass
+import qlc
+import qlc.utils
 
-class GraphemeParser(object):
-    def __init__(self):
-        self.grapheme_pattern = regex.compile("\X", regex.UNICODE)
+class DuplicateException(Exception): pass
+
+# old misspelled name, kept for scripts that catch it
+DuplicateExceptation = DuplicateException
+
+# the version of the output of compile_orthography_profile(); it is part of
+# the name of cached compiled profiles, so change it when the output changes
+compiled_profile_format = 1
 
+class GraphemeParser(object):
     def parse_string_to_graphemes_string(self, string):
         string = string.replace(" ", "#") # add boundaries between words
-        string = unicodedata.normalize("NFD", string)
-        result = "#"
-        graphemes = self.grapheme_pattern.findall(string)
-        for grapheme in graphemes:
-            result += " "+grapheme
-        result += " #"
+        string = qlc.utils.normalize(string)
+        graphemes = qlc.utils.parse_graphemes(string)
+        result = " ".join(("#",) + graphemes + ("#",))
         # sys.stderr.write(result+"\n")
         return (True, result)
 
@@ -97,49 +104,42 @@ class OrthographyParser(object):
         """
 
         try:
-            open(orthography_profile)
+            file = open(orthography_profile, "r", encoding="utf-8")
         except IOError as e:
             print("\nWARNING: There is no file at the path you've specified.\n\n")
+            raise
 
-        # read in orthography profile and create a tree structure
-        self.root = createTree(orthography_profile)
-
-        # lookup table
-        self.grapheme_to_phoneme = {}
-
-        # create look up table of grapheme to IPA from orthography profile
-        # TODO: move this into a function when we start adding more than just 
-        # 2 columns to the orthography profiles
+        # read the profile once and build both the tree structure and the
+        # grapheme to IPA lookup table from it
+        lines = file.readlines()
+        file.close()
+        (self.root, self.grapheme_to_phoneme) = compile_orthography_profile(lines)
 
-        file = open(orthography_profile, "r", encoding="utf-8")
+        # uncomment this line if you want to see the orthography profile tree structure
+        # printTree(self.root, "")
 
-        line_count = 0
-        for line in file:
-            line_count += 1
-            line = line.strip()
+    @classmethod
+    def from_compiled(cls, root, grapheme_to_phoneme):
+        """
+        Creates a parser from an already compiled orthography profile, as
+        returned by compile_orthography_profile(). No file is read.
 
-            # skip any comments
-            if line.startswith("#") or line == "":
-                continue
+        Args:
+        - root (obligatory): the root TreeNode of the grapheme tree
+        - grapheme_to_phoneme (obligatory): the grapheme to IPA lookup table
 
-            line = unicodedata.normalize("NFD", line)
-            tokens = line.split(",") # split the orthography profile into columns
-
-            grapheme = tokens[0].strip()
-            phoneme = tokens[1].strip()
-            
-            if not grapheme in self.grapheme_to_phoneme:
-                self.grapheme_to_phoneme[grapheme] = phoneme
-            else:
-                raise DuplicateException("You have a duplicate in your orthography profile at: {0}".format(line_count))
-        file.close()
+        Returns:
+        - an OrthographyParser object
 
-        # uncomment this line if you want to see the orthography profile tree structure
-        # printTree(self.root, "")
+        """
+        parser = cls.__new__(cls)
+        parser.root = root
+        parser.grapheme_to_phoneme = grapheme_to_phoneme
+        return parser
 
     def parse_string_to_graphemes_string_DEPRECATED(self, string):
         string = string.replace(" ", "#") # add boundaries between words
-        string = unicodedata.normalize("NFD", string)
+        string = qlc.utils.normalize(string)
         result = ""
         result += printMultigraphs(self.root, string, result+"# ")
         return (True, result)
@@ -160,7 +160,7 @@ class OrthographyParser(object):
         """
         success = True
         parses = []
-        string = unicodedata.normalize("NFD", string)
+        string = qlc.utils.normalize(string)
         for word in string.split():
             # print("word: "+"\t"+word)
             parse = getParse(self.root, word)
@@ -281,6 +281,142 @@ class OrthographyParser(object):
         return result
     
 
+class OrthographyProfileRegistry(object):
+    """
+    Registry of orthography parsers, keyed on the source name (bibtex key)
+    of a book, e.g. "huber1992". Parsers are only created when a source is
+    first requested. The compiled profile is stored in a cache directory
+    under the SHA-1 hash of the profile file's content and the version of
+    the compiled format, so that later runs (and other scripts) can skip
+    compiling an unchanged profile. Editing a profile changes its hash and
+    invalidates the cached version; so does a new compiled_profile_format.
+
+    The cache files are JSON (see compiled_profile_to_json()), so loading a
+    cache file that someone else wrote cannot execute code; at worst a
+    tampered file gives wrong parses for its source.
+
+    Example:
+
+    >>> registry = OrthographyProfileRegistry()
+    >>> registry["huber1992"].parse_string_to_graphemes("wanène")
+    (True, ('#', 'w', 'a', 'n', 'e\\u0300', 'n', 'e', '#'))
+
+    The graphemes are in Unicode NFD, so "è" is returned as "e" followed by
+    the combining grave accent.
+
+    """
+
+    def __init__(self, profiles_dir=None, cache_dir=None):
+        """
+        Constructor of OrthographyProfileRegistry class.
+
+        Args:
+        - profiles_dir (optional): the directory that contains the orthography
+        profiles as "<source>.txt". Defaults to qlc's data/orthography_profiles.
+        - cache_dir (optional): the directory for the compiled profiles.
+        Defaults to ".qlc/cache" in the user's home directory. Pass False to
+        disable the on-disk cache.
+
+        Returns:
+        - nothing
+
+        """
+        if profiles_dir is None:
+            profiles_dir = qlc.get_orthography_profile("")
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.expanduser("~"), ".qlc", "cache")
+        self.profiles_dir = profiles_dir
+        self.cache_dir = cache_dir
+        self._parsers = {}
+
+    def __getitem__(self, source):
+        return self.parser_for_source(source)
+
+    def __contains__(self, source):
+        return os.path.exists(self.profile_path(source))
+
+    def profile_path(self, source):
+        return os.path.join(self.profiles_dir, source+".txt")
+
+    def sources(self):
+        """
+        Returns a sorted list of all source names that have a profile in the
+        profiles directory.
+        """
+        return sorted(f[:-4] for f in os.listdir(self.profiles_dir)
+            if f.endswith(".txt") and f != "README.txt")
+
+    def parser_for_source(self, source):
+        """
+        Returns the OrthographyParser for a source, compiling or loading it from
+        the cache on first use.
+
+        Args:
+        - source (obligatory): the source name, e.g. "huber1992"
+
+        Returns:
+        - an OrthographyParser object
+
+        """
+        if source not in self._parsers:
+            self._parsers[source] = self._load(source)
+        return self._parsers[source]
+
+    def _load(self, source):
+        file = open(self.profile_path(source), "rb")
+        content = file.read()
+        file.close()
+
+        cache_file = None
+        if self.cache_dir:
+            digest = hashlib.sha1(content).hexdigest()
+            cache_file = os.path.join(self.cache_dir,
+                "{0}-{1}-v{2}.json".format(source, digest, compiled_profile_format))
+            if os.path.exists(cache_file):
+                try:
+                    with open(cache_file, "r", encoding="utf-8") as file:
+                        compiled = compiled_profile_from_json(json.load(file))
+                    return OrthographyParser.from_compiled(*compiled)
+                except (IOError, ValueError, KeyError, TypeError):
+                    # a broken cache file is simply rebuilt
+                    pass
+
+        compiled = compile_orthography_profile(
+            content.decode("utf-8").splitlines())
+
+        if cache_file:
+            self._write_cache(cache_file, compiled)
+        return OrthographyParser.from_compiled(*compiled)
+
+    def _write_cache(self, cache_file, compiled):
+        # write to a temporary file first, so that concurrent runs never see
+        # a half written cache file
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(compiled_profile_to_json(*compiled), file, ensure_ascii=False)
+        os.replace(tmp_path, cache_file)
+
+    def parse_records(self, records, method="parse_string_to_graphemes"):
+        """
+        Parses a mixed-source batch of records, routing each record to the
+        parser of its source.
+
+        Args:
+        - records (obligatory): an iterable of (source, language, concept,
+        counterpart) tuples
+        - method (optional): the name of the OrthographyParser method to use
+
+        Returns:
+        - a generator of (source, language, concept, counterpart, parse) tuples,
+        where parse is the (success, result) tuple of the parser method
+
+        """
+        for source, language, concept, counterpart in records:
+            parse = getattr(self.parser_for_source(source), method)(counterpart)
+            yield (source, language, concept, counterpart, parse)
+
 # ---------- Tree node --------
 
 class TreeNode(object):
@@ -317,21 +453,36 @@ class TreeNode(object):
 # ---------- Util functions ------
     
 def createTree(file_name):
+    file = open(file_name, "r", encoding="utf-8")
+    root, _ = compile_orthography_profile(file)
+    file.close()
+    return root
+
+def compile_orthography_profile(lines):
+    """
+    Compiles the lines of an orthography profile into the grapheme tree and
+    the grapheme to IPA lookup table. Skips "#" comments and blank lines.
+
+    Args:
+    - lines (obligatory): an iterable of lines of the orthography profile
+
+    Returns:
+    - a tuple (root, grapheme_to_phoneme)
+
+    """
     # Internal function to add a multigraph starting at node.
     def addMultigraph(node, line):
         for char in line:
             node = node.addChild(char)
         node.makeSentinel()
 
-    # Add all multigraphs in each line of file_name. Skip "#" comments and blank lines.
     root = TreeNode('')
     root.makeSentinel()
+    grapheme_to_phoneme = {}
 
-    #file = codecs.open(file_name, "r", "utf-8")
-    file = open(file_name, "r", encoding="utf-8")
-
-    for line in file:
-        #print(line.encode("utf-8"))
+    line_count = 0
+    for line in lines:
+        line_count += 1
         line = line.strip()
 
         # skip any comments
@@ -340,10 +491,62 @@ def createTree(file_name):
 
         line = unicodedata.normalize("NFD", line)
         tokens = line.split(",") # split the orthography profile into columns
-        grapheme = tokens[0]
-        addMultigraph(root, grapheme)
+        addMultigraph(root, tokens[0])
 
-    return root
+        grapheme = tokens[0].strip()
+        phoneme = tokens[1].strip()
+        if not grapheme in grapheme_to_phoneme:
+            grapheme_to_phoneme[grapheme] = phoneme
+        else:
+            raise DuplicateException("You have a duplicate in your orthography profile at: {0}".format(line_count))
+
+    return (root, grapheme_to_phoneme)
+
+def compiled_profile_to_json(root, grapheme_to_phoneme):
+    """
+    Converts a compiled orthography profile to plain JSON data types. Every
+    tree node is written as [sentinel, { char : child node }].
+
+    Args:
+    - root (obligatory): the root TreeNode of the grapheme tree
+    - grapheme_to_phoneme (obligatory): the grapheme to IPA lookup table
+
+    Returns:
+    - a dict that can be serialized with json
+
+    """
+    def node_to_json(node):
+        return [ node.isSentinel(), { char : node_to_json(child)
+            for char, child in node.getChildren().items() } ]
+
+    return { "format" : compiled_profile_format,
+             "tree" : node_to_json(root),
+             "grapheme_to_phoneme" : grapheme_to_phoneme }
+
+def compiled_profile_from_json(data):
+    """
+    Rebuilds a compiled orthography profile from the output of
+    compiled_profile_to_json(). Raises a ValueError if the data has another
+    compiled_profile_format.
+
+    Returns:
+    - a tuple (root, grapheme_to_phoneme)
+
+    """
+    if data["format"] != compiled_profile_format:
+        raise ValueError("compiled profile format {0} is not {1}".format(
+            data["format"], compiled_profile_format))
+
+    def node_from_json(char, data):
+        sentinel, children = data
+        node = TreeNode(char)
+        if sentinel:
+            node.makeSentinel()
+        for child_char, child in children.items():
+            node.children[child_char] = node_from_json(child_char, child)
+        return node
+
+    return (node_from_json('', data["tree"]), dict(data["grapheme_to_phoneme"]))
 
 def printMultigraphs(root, line, result):
     # Base (or degenerate..) case.
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+#-----------------------------------------------------------------------------
+# Copyright (c) 2012, Quantitative Language Comparison Team
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""
+Coverage and throughput profiler for orthography profiles. Runs the
+orthography parser once over a stream of counterparts (or heads) and collects
+statistics on how well the profile covers real data.
+"""
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+import collections
+import heapq
+import json
+import time
+import unicodedata
+
+import qlc.utils
+from qlc.orthography import getParse
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+class OrthographyCoverage(object):
+    """
+    Streaming profiler for an orthography profile. Counterparts are added one
+    by one, every counterpart is parsed exactly once and only counts and
+    bounded top-k lists are kept in memory, so the input can be of any size.
+
+    Example:
+
+    >>> registry = OrthographyProfileRegistry()
+    >>> coverage = OrthographyCoverage(registry)
+    >>> coverage.add_records(records) # (source, language, concept, counterpart)
+    >>> print(coverage.to_json())
+    """
+
+    def __init__(self, orthography_parser, n_top=20, n_examples=3):
+        """
+        Constructor of OrthographyCoverage class.
+
+        Parameters
+        ----------
+        orthography_parser : OrthographyParser or OrthographyProfileRegistry
+            The parser to profile. If a registry is given, each counterpart
+            is parsed with the profile of its source.
+        n_top : int
+            The number of entries in the lists of unmatched graphemes (per
+            source), longest and slowest inputs.
+        n_examples : int
+            The number of example words stored per unmatched grapheme.
+
+        Returns
+        -------
+        Nothing
+        """
+        self.orthography_parser = orthography_parser
+        self.n_top = n_top
+        self.n_examples = n_examples
+
+        self.words = 0
+        self.parsed = 0
+        self.parse_seconds = 0.0
+
+        # { source : [words, unparsable] }
+        self._sources = collections.defaultdict(lambda : [0, 0])
+        # { (source, grapheme) : count }, graphemes are matched per profile
+        self._unmatched_counts = collections.defaultdict(int)
+        # { (source, grapheme) : [example, ...] }
+        self._unmatched_examples = collections.defaultdict(list)
+        # { (source, grapheme) : True/False }, a grapheme is checked only once
+        self._grapheme_is_matched = {}
+
+        # min-heaps of (length, counterpart) and (seconds, counterpart)
+        self._longest = []
+        self._slowest = []
+
+        self._start_time = time.perf_counter()
+
+    def _parser_for_source(self, source):
+        if hasattr(self.orthography_parser, "parser_for_source"):
+            return self.orthography_parser.parser_for_source(source)
+        return self.orthography_parser
+
+    def _push(self, heap, item):
+        if len(heap) < self.n_top:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+    def add(self, counterpart, source=None):
+        """
+        Parses a single counterpart and updates the statistics.
+
+        Parameters
+        ----------
+        counterpart : str
+            The string to parse.
+        source : str
+            The source of the counterpart, used for the per source statistics
+            and to select the profile if the parser is a registry.
+
+        Returns
+        -------
+        The (success, parse) tuple of the parser.
+        """
+        parser = self._parser_for_source(source)
+
+        start = time.perf_counter()
+        success, parse = parser.parse_string_to_graphemes_string(counterpart)
+        seconds = time.perf_counter() - start
+
+        self.words += 1
+        self.parse_seconds += seconds
+        self._sources[source][0] += 1
+        self._push(self._longest, (len(counterpart), counterpart))
+        self._push(self._slowest, (seconds, counterpart))
+
+        if success:
+            self.parsed += 1
+        else:
+            self._sources[source][1] += 1
+            self._add_unmatched(parser, source, counterpart)
+
+        return (success, parse)
+
+    def add_records(self, records):
+        """
+        Adds all records of an iterable of (source, language, concept,
+        counterpart) tuples, e.g. a corpus reader generator.
+        """
+        for source, _, _, counterpart in records:
+            self.add(counterpart, source)
+
+    def _add_unmatched(self, parser, source, counterpart):
+        counterpart = qlc.utils.normalize(counterpart)
+        for grapheme in set(qlc.utils.parse_graphemes(counterpart)):
+            if grapheme.isspace():
+                continue
+            key = (source, grapheme)
+            if key not in self._grapheme_is_matched:
+                # a grapheme that cannot be parsed on its own is not covered
+                # by the profile
+                self._grapheme_is_matched[key] =\
+                    len(getParse(parser.root, grapheme)) > 0
+            if not self._grapheme_is_matched[key]:
+                self._unmatched_counts[key] += 1
+                if len(self._unmatched_examples[key]) < self.n_examples:
+                    self._unmatched_examples[key].append(counterpart)
+
+    def report(self):
+        """
+        Returns the statistics as a dict of plain Python data types, that can
+        be serialized with json. The unmatched graphemes are reported per
+        source, as they are missing from the profile of that source.
+        """
+        unmatched = collections.defaultdict(list)
+        for (source, grapheme), count in self._unmatched_counts.items():
+            unmatched[source].append((grapheme, count))
+
+        sources = {}
+        for source, (words, unparsable) in self._sources.items():
+            graphemes = sorted(unmatched[source],
+                key=lambda item: (-item[1], item[0]))[:self.n_top]
+            sources[str(source)] = {
+                "words": words,
+                "unparsable": unparsable,
+                "unparsable_rate": unparsable / words,
+                "unmatched_graphemes": [ {
+                        "grapheme": grapheme,
+                        "codepoints": [ "U+{0:04X}".format(ord(c)) for c in grapheme ],
+                        "names": [ unicodedata.name(c, "") for c in grapheme ],
+                        "count": count,
+                        "examples": self._unmatched_examples[(source, grapheme)]
+                    } for grapheme, count in graphemes ]
+            }
+
+        return {
+            "words": self.words,
+            "parsed": self.parsed,
+            "parse_rate": self.parsed / self.words if self.words else 0.0,
+            "sources": sources,
+            "longest_inputs": [ { "counterpart": counterpart, "length": length }
+                for length, counterpart in sorted(self._longest, reverse=True) ],
+            "slowest_inputs": [ { "counterpart": counterpart, "seconds": seconds }
+                for seconds, counterpart in sorted(self._slowest, reverse=True) ],
+            "parse_seconds": self.parse_seconds,
+            "words_per_second": self.words / self.parse_seconds
+                if self.parse_seconds else 0.0,
+            "wall_seconds": time.perf_counter() - self._start_time
+        }
+
+    def to_json(self, **kwargs):
+        """
+        Returns the report as a JSON string. Keyword arguments are passed to
+        json.dumps().
+        """
+        kwargs.setdefault("ensure_ascii", False)
+        kwargs.setdefault("indent", 2)
+        kwargs.setdefault("sort_keys", True)
+        return json.dumps(self.report(), **kwargs)
@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+#-----------------------------------------------------------------------------
+# Copyright (c) 2012, Quantitative Language Comparison Team
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""
+Persistent store for orthography parses. Parses are saved in an SQLite
+database, keyed by the content hash of the orthography profile and the
+(NFD normalized) counterpart. When a profile is edited, the parses of the
+previous version of the profile are moved to the new version and only the
+counterparts that contain one of the added or removed graphemes are parsed
+again. Only the current version of each profile keeps its parses, so the
+store does not grow with the number of edits.
+"""
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+
+import qlc.utils
+from qlc.orthography import OrthographyParser, compile_orthography_profile
+
+#-----------------------------------------------------------------------------
+# Globals
+#-----------------------------------------------------------------------------
+
+# the maximum number of values in one "IN (...)" or "OR" clause, below the
+# limit of SQLite on the number of parameters of a statement
+_max_parameters = 500
+
+_schema = """
+CREATE TABLE IF NOT EXISTS profiles (
+    profile_hash TEXT PRIMARY KEY,
+    name TEXT,
+    graphemes TEXT,
+    created REAL
+);
+CREATE TABLE IF NOT EXISTS parses (
+    profile_hash TEXT,
+    counterpart TEXT,
+    success INTEGER,
+    parse TEXT,
+    PRIMARY KEY (profile_hash, counterpart)
+);
+"""
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def graphemes_from_tree(root):
+    """
+    Returns the set of all graphemes that are stored in the tree of an
+    orthography profile.
+    """
+    graphemes = set()
+    nodes = [ (root, "") ]
+    while nodes:
+        node, path = nodes.pop()
+        if node.isSentinel() and path != "":
+            graphemes.add(path)
+        for char, child in node.getChildren().items():
+            nodes.append((child, path + char))
+    return graphemes
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+class ParseStore(object):
+    """
+    On-disk store of orthography parses.
+
+    Example:
+
+    >>> store = ParseStore("output/parses.sqlite")
+    >>> o = store.parser("data/orthography_profiles/huber1992.txt")
+    >>> o.parse_string_to_graphemes_string("wanène")
+    (True, '# w a n è n e #')
+    >>> store.close()
+
+    After editing huber1992.txt, store.parser() with the same profile path
+    only parses the counterparts again that are affected by the edit.
+    """
+
+    def __init__(self, path):
+        """
+        Constructor of ParseStore class.
+
+        Parameters
+        ----------
+        path : str
+            The path of the SQLite database file. It is created if it does not
+            exist.
+
+        Returns
+        -------
+        Nothing
+        """
+        self.path = path
+        # number of counterparts parsed again after the last profile change
+        self.reparsed = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(_schema)
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def parser(self, orthography_profile, name=None):
+        """
+        Returns a parser for the given orthography profile that reads and
+        writes its parses from and to the store. If the content of the profile
+        is new, the parses of the latest stored version of the profile with the
+        same name are taken over; counterparts that contain an added or
+        removed grapheme are parsed again.
+
+        Parameters
+        ----------
+        orthography_profile : str
+            The path to the orthography profile file.
+        name : str
+            The name under which the versions of the profile are stored.
+            Defaults to the file name without ".txt", e.g. "huber1992".
+
+        Returns
+        -------
+        A StoredOrthographyParser object.
+        """
+        if name is None:
+            name = os.path.basename(orthography_profile)
+            if name.endswith(".txt"):
+                name = name[:-4]
+
+        file = open(orthography_profile, "rb")
+        content = file.read()
+        file.close()
+        profile_hash = hashlib.sha1(content).hexdigest()
+        (root, grapheme_to_phoneme) = compile_orthography_profile(
+            content.decode("utf-8").splitlines())
+        orthography_parser = OrthographyParser.from_compiled(root, grapheme_to_phoneme)
+
+        latest = self.connection.execute(
+            "SELECT profile_hash, graphemes FROM profiles "
+            "WHERE name = ? ORDER BY created DESC LIMIT 1", (name,)).fetchone()
+        if latest is None or latest[0] != profile_hash:
+            # a new version, or a return to an older one
+            graphemes = graphemes_from_tree(root)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?)",
+                (profile_hash, name, json.dumps(sorted(graphemes)), time.time()))
+            self.reparsed = 0
+            if latest is not None:
+                self._take_over_parses(latest[0], set(json.loads(latest[1])),
+                    profile_hash, graphemes, orthography_parser)
+            self.connection.commit()
+
+        return StoredOrthographyParser(self, profile_hash, orthography_parser)
+
+    def _take_over_parses(self, old_hash, old_graphemes, profile_hash, graphemes,
+                          orthography_parser):
+        changed_graphemes = sorted(graphemes.symmetric_difference(old_graphemes))
+
+        # the parses of all other counterparts stay the same; they are moved
+        # to the new version instead of copied, so the old version has no
+        # parses left
+        affected = set()
+        for start in range(0, len(changed_graphemes), _max_parameters):
+            chunk = changed_graphemes[start:start + _max_parameters]
+            affected.update(counterpart for (counterpart,) in self.connection.execute(
+                "SELECT counterpart FROM parses WHERE profile_hash = ? AND (" +
+                " OR ".join([ "instr(counterpart, ?) > 0" ] * len(chunk)) + ")",
+                [ old_hash ] + chunk))
+        self.connection.execute(
+            "DELETE FROM parses WHERE profile_hash = ?", (profile_hash,))
+        self.connection.execute(
+            "UPDATE parses SET profile_hash = ? WHERE profile_hash = ?",
+            (profile_hash, old_hash))
+
+        rows = []
+        for counterpart in affected:
+            success, parse = orthography_parser.parse_string_to_graphemes_string(counterpart)
+            rows.append((success, parse, profile_hash, counterpart))
+        self.connection.executemany(
+            "UPDATE parses SET success = ?, parse = ? "
+            "WHERE profile_hash = ? AND counterpart = ?", rows)
+        self.reparsed = len(rows)
+
+    def lookup(self, profile_hash, counterpart):
+        return self.connection.execute(
+            "SELECT success, parse FROM parses "
+            "WHERE profile_hash = ? AND counterpart = ?",
+            (profile_hash, counterpart)).fetchone()
+
+    def lookup_many(self, profile_hash, counterparts):
+        """
+        Returns a dict { counterpart : (success, parse) } of the stored
+        parses of the given counterparts, with one query per chunk of
+        counterparts. Counterparts without a stored parse are missing.
+        """
+        counterparts = list(set(counterparts))
+        result = {}
+        for start in range(0, len(counterparts), _max_parameters):
+            chunk = counterparts[start:start + _max_parameters]
+            for counterpart, success, parse in self.connection.execute(
+                    "SELECT counterpart, success, parse FROM parses "
+                    "WHERE profile_hash = ? AND counterpart IN (" +
+                    ", ".join([ "?" ] * len(chunk)) + ")",
+                    [ profile_hash ] + chunk):
+                result[counterpart] = (bool(success), parse)
+        return result
+
+    def insert(self, profile_hash, counterpart, success, parse):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO parses VALUES (?, ?, ?, ?)",
+            (profile_hash, counterpart, success, parse))
+
+    def insert_many(self, profile_hash, parses):
+        """
+        Stores (counterpart, success, parse) tuples.
+        """
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO parses VALUES (?, ?, ?, ?)",
+            [ (profile_hash, counterpart, success, parse)
+              for counterpart, success, parse in parses ])
+
+class StoredOrthographyParser(object):
+    """
+    Orthography parser that looks up parses in a ParseStore and only parses
+    counterparts that are not stored yet. Supports the grapheme methods of
+    OrthographyParser, so it can be used in place of one for the Tokenizer
+    and Matrix classes. The batch methods look up a whole chunk of
+    counterparts at once; tokenize_parallel() uses them.
+    """
+
+    # the SQLite connection of the store cannot be shared with worker
+    # processes, so tokenize_parallel() parses in the calling process
+    parse_in_process = True
+
+    def __init__(self, store, profile_hash, orthography_parser):
+        self.store = store
+        self.profile_hash = profile_hash
+        self.orthography_parser = orthography_parser
+
+    def parse_string_to_graphemes_string(self, string):
+        string = qlc.utils.normalize(string)
+        row = self.store.lookup(self.profile_hash, string)
+        if row is not None:
+            return (bool(row[0]), row[1])
+        (success, parse) = self.orthography_parser.parse_string_to_graphemes_string(string)
+        self.store.insert(self.profile_hash, string, success, parse)
+        return (success, parse)
+
+    def parse_string_to_graphemes(self, string):
+        (success, graphemes) = self.parse_string_to_graphemes_string(string)
+        return (success, tuple(graphemes.split(" ")))
+
+    def parse_string_to_graphemes_string_batch(self, strings):
+        """
+        Returns the list of (success, parse) tuples of a list of strings,
+        like parse_string_to_graphemes_string() for each string.
+        """
+        strings = [ qlc.utils.normalize(string) for string in strings ]
+        stored = self.store.lookup_many(self.profile_hash, strings)
+        new = []
+        for string in strings:
+            if string not in stored:
+                (success, parse) = self.orthography_parser.parse_string_to_graphemes_string(string)
+                stored[string] = (success, parse)
+                new.append((string, success, parse))
+        self.store.insert_many(self.profile_hash, new)
+        return [ stored[string] for string in strings ]
+
+    def parse_string_to_graphemes_batch(self, strings):
+        return [ (success, tuple(graphemes.split(" "))) for success, graphemes
+            in self.parse_string_to_graphemes_string_batch(strings) ]
+
+    def parse_string_to_ipa_phonemes(self, string):
+        return self.orthography_parser.parse_string_to_ipa_phonemes(string)
+
+    def parse_string_to_ipa_string(self, string):
+        return self.orthography_parser.parse_string_to_ipa_string(string)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+#-----------------------------------------------------------------------------
+# Copyright (c) 2012, Quantitative Language Comparison Team
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import numpy.testing
+
+from qlc.comparison.aline import Aline, AlineRepr, AlineEngine, ALINE, ASJP
+
+# ASJP transcriptions of "hand", "water", "two", "fish" and "night"
+asjp_words = [ "hEnt", "hEnd", "hant", "mano", "mEn", "ruka", "kai", "rEka",
+    "kE7", "lima", "vat3r", "wat3r", "vod3", "akwa", "aga", "vas3r", "nero",
+    "tsvai", "dva", "tu", "dos", "due", "ni", "fiS", "fisk", "piSk", "riba",
+    "pEsk", "nat", "noCi", "nakt", "nox", "noC", "no*Ce", "ya~m", "7a\"ta" ]
+
+aline_words = [ "tu", "dos", "kwand", "kwan", "pakH", "pAkaH", "ziNtaV",
+    "tSentas", "ekwus", "aFsvo", "hunt", "kaNt" ]
+
+class testAlineScoring(numpy.testing.TestCase):
+
+    def test_tables(self):
+        model = Aline.scoring_model()
+        for word in aline_words:
+            model.encode(AlineRepr(word, ALINE))
+        costs = Aline(None, None)
+        segments = model.segments
+        ids = numpy.arange(len(segments))
+        expansion = model.expansion(ids[:, None, None], ids[None, :, None], ids[None, None, :])
+        for p in ids[1:]:
+            assert model.skip[p] == costs.sigma_skip(segments[p])
+            for q1 in ids[1:]:
+                assert model.sub[p, q1] == costs.sigma_sub(segments[p], segments[q1])
+                for q2 in ids[::5]:
+                    assert expansion[p, q1, q2] ==\
+                        costs.sigma_exp(segments[p], segments[q1], segments[q2])
+
+    def test_compiled_similarity(self):
+        for words, string_type in ((asjp_words, ASJP), (aline_words, ALINE)):
+            for word1 in words:
+                for word2 in words:
+                    x = AlineRepr(word1, string_type)
+                    y = AlineRepr(word2, string_type)
+                    compiled = Aline(x, y)
+                    legacy = Aline(x, y, compiled = False)
+                    assert compiled.get_similarity() == legacy.get_similarity()
+                    assert [ list(row) for row in compiled.S ] == [ list(row) for row in legacy.S ]
+                    if word1 == word2:
+                        assert compiled.get_self_similarity() == legacy.get_self_similarity()
+                    if legacy.get_similarity() > 0:
+                        assert compiled.get_normalized_similarity() ==\
+                            legacy.get_normalized_similarity()
+
+class testAlineEngine(numpy.testing.TestCase):
+
+    def test_asjp_pairs(self):
+        engine = AlineEngine(ASJP)
+        for word1 in asjp_words:
+            for word2 in asjp_words:
+                legacy = Aline(AlineRepr(word1, ASJP), AlineRepr(word2, ASJP), compiled = False)
+                legacy.compute_similarity()
+                assert engine.score_matrix(word1, word2).tolist() ==\
+                    [ list(row) for row in legacy.S ]
+                assert engine.similarity(word1, word2) == legacy.get_similarity()
+                assert engine.normalized_similarity(word1, word2) ==\
+                    legacy.get_normalized_similarity()
+                assert engine.distance(word1, word2) == legacy.get_distance()
+
+    def test_aline_strings(self):
+        engine = AlineEngine(ALINE)
+        for word1 in aline_words + [ "" ]:
+            for word2 in aline_words + [ "" ]:
+                legacy = Aline(AlineRepr(word1, ALINE), AlineRepr(word2, ALINE), compiled = False)
+                assert engine.similarity(word1, word2) == legacy.get_similarity()
+                if word1 == word2:
+                    assert engine.self_similarity(word1) == legacy.get_self_similarity()
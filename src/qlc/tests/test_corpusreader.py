@@ -7,7 +7,7 @@
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
-import os, types
+import os, types, unicodedata
 import numpy.testing
 
 from qlc.corpusreader import CorpusReaderDict, CorpusReaderWordlist
@@ -97,3 +97,20 @@ class testCorpusReaderWordlist(numpy.testing.TestCase):
         print("Head: {0}, Translation {1}".format(head, translation))
         (head, translation) = generator.__next__()
         print("Head: {0}, Translation {1}".format(head, translation))
+
+class testCorpusReaderNormalization(numpy.testing.TestCase):
+
+    def setUp(self):
+        self.data_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "data", "testcorpus")
+
+    def test_counterparts_are_nfd(self):
+        cr = CorpusReaderWordlist(self.data_path, normalization="NFD")
+        assert cr.normalization == "NFD"
+        for wordlistdata_id in cr.wordlistdata_ids_for_bibtex_key("huber1992"):
+            for concept, counterpart in cr.concepts_with_counterparts_for_wordlistdata_id(wordlistdata_id):
+                assert unicodedata.is_normalized("NFD", counterpart)
+
+    def test_no_normalization(self):
+        # strings are kept as they are in the files by default
+        assert CorpusReaderDict(self.data_path).normalization is None
+        assert CorpusReaderWordlist(self.data_path).normalization is None
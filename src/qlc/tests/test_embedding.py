@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+#-----------------------------------------------------------------------------
+# Copyright (c) 2012, Quantitative Language Comparison Team
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import os, shutil, tempfile
+import numpy.testing
+import scipy.sparse
+
+import qlc
+from qlc.corpusreader import CorpusReaderWordlist
+from qlc.orthography import OrthographyParser
+from qlc.matrix import Matrix, load_bundle, add_to_bundle
+from qlc.embedding import idf, randomized_svd, bundle_embedding
+
+class testEmbedding(numpy.testing.TestCase):
+
+    def setUp(self):
+        rng = numpy.random.default_rng(0)
+        # a sparse matrix of rank 4
+        left = rng.random((60, 4)) * (rng.random((60, 4)) < 0.3)
+        right = rng.random((4, 40)) * (rng.random((4, 40)) < 0.3)
+        dense = left @ right
+        self.matrix = scipy.sparse.csr_matrix(dense)
+
+    def test_randomized_svd(self):
+        dense = self.matrix.toarray()
+        expected = numpy.linalg.svd(dense, compute_uv=False)[:4]
+        embedding, s, vt = randomized_svd(self.matrix, 4, block_size=7, random_state=1)
+        numpy.testing.assert_array_almost_equal(s, expected)
+        # the embedding is the projection of the rows on the components
+        numpy.testing.assert_array_almost_equal(embedding, dense @ vt.T)
+        numpy.testing.assert_array_almost_equal(vt @ vt.T, numpy.eye(4))
+
+    def test_tfidf(self):
+        dense = self.matrix.toarray()
+        df = (dense > 0).sum(axis=0)
+        weights = numpy.log((1.0 + 60) / (1.0 + df)) + 1.0
+        numpy.testing.assert_array_almost_equal(idf(self.matrix, block_size=7), weights)
+
+        weighted = dense * weights
+        norms = numpy.sqrt((weighted ** 2).sum(axis=1))
+        norms[norms == 0] = 1.0
+        weighted /= norms[:, None]
+        expected = numpy.linalg.svd(weighted, compute_uv=False)[:3]
+        embedding, s, vt = randomized_svd(self.matrix, 3, tfidf=True, n_iter=8,
+                                          block_size=16, random_state=1)
+        numpy.testing.assert_array_almost_equal(s, expected)
+
+    def test_bundle_embedding(self):
+        data_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "data", "testcorpus")
+        cr = CorpusReaderWordlist(data_path)
+        records = [ (wordlistdata_id, concept, counterpart)
+            for wordlistdata_id in cr.wordlistdata_ids_for_bibtex_key("huber1992")
+            for concept, counterpart in cr.concepts_with_counterparts_for_wordlistdata_id(wordlistdata_id) ]
+        o = OrthographyParser(qlc.get_orthography_profile("huber1992.txt"))
+
+        cwd = os.getcwd()
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            os.chdir(tmp_dir)
+            os.mkdir("output")
+            m = Matrix(iter(records), o, "graphemes", 2)
+            m.save_bundle("bundle.npz", [])
+
+            embedding, s, vt = bundle_embedding("bundle.npz", "wg", 8, tfidf=True, random_state=0)
+            assert embedding.shape == (m.get_wg_matrix().shape[0], 8)
+            bundle = load_bundle("bundle.npz", mmap_mode="r")
+            assert isinstance(bundle.arrays["embedding_wg_8_tfidf_vectors"], numpy.memmap)
+            assert (bundle.get_wg_matrix() != m.get_wg_matrix()).nnz == 0
+
+            # the second call loads the cached embedding
+            cached = bundle_embedding(bundle, "wg", 8, tfidf=True, random_state=1)
+            numpy.testing.assert_array_equal(cached[0], embedding)
+            numpy.testing.assert_array_equal(cached[1], s)
+
+            # arrays with the same name are replaced
+            add_to_bundle("bundle.npz", { "embedding_wg_8_tfidf_singular_values" : s * 2 })
+            bundle = load_bundle("bundle.npz")
+            assert sorted(name for name in bundle.arrays if name.startswith("embedding")) ==\
+                [ "embedding_wg_8_tfidf_components", "embedding_wg_8_tfidf_singular_values",
+                  "embedding_wg_8_tfidf_vectors" ]
+            numpy.testing.assert_array_equal(bundle.arrays["embedding_wg_8_tfidf_singular_values"], s * 2)
+            assert (bundle.get_wg_matrix() != m.get_wg_matrix()).nnz == 0
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(tmp_dir)
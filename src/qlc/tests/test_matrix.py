@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+#-----------------------------------------------------------------------------
+# Copyright (c) 2012, Quantitative Language Comparison Team
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import collections, os, shutil, tempfile
+import numpy.testing
+
+import qlc
+from qlc.corpusreader import CorpusReaderWordlist
+from qlc.orthography import OrthographyParser
+from qlc.matrix import Matrix, TripleRuns, load_bundle, bundle_to_text, _csr_from_blocks
+from qlc.ngram import ngrams_from_graphemes
+
+class FailingParser(OrthographyParser):
+    """
+    Parser that fails on the counterpart "fail", to test errors in workers.
+    """
+
+    def parse_string_to_graphemes(self, string):
+        if string == "fail":
+            raise ValueError("cannot parse " + string)
+        return OrthographyParser.parse_string_to_graphemes(self, string)
+
+class testMatrix(numpy.testing.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        data_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "data", "testcorpus")
+        cr = CorpusReaderWordlist(data_path)
+        cls.records = [ (wordlistdata_id, concept, counterpart)
+            for wordlistdata_id in cr.wordlistdata_ids_for_bibtex_key("huber1992")
+            for concept, counterpart in cr.concepts_with_counterparts_for_wordlistdata_id(wordlistdata_id) ]
+        cls.o = OrthographyParser(qlc.get_orthography_profile("huber1992.txt"))
+
+        # the Matrix writes unparsable counterparts to output/unparsables.txt
+        cls.cwd = os.getcwd()
+        cls.tmp_dir = tempfile.mkdtemp()
+        os.chdir(cls.tmp_dir)
+        os.mkdir("output")
+        cls.m = Matrix(iter(cls.records), cls.o, "graphemes", 2)
+
+        # the ordered language specific ngrams of each language specific word
+        cls.words_ngrams = {}
+        for language, concept, counterpart in cls.records:
+            success, graphemes = cls.o.parse_string_to_graphemes(counterpart)
+            if success:
+                word = "".join(graphemes).strip("#").replace("#", " ")+"_"+language
+                cls.words_ngrams[word] = [ "".join(ngram)+"_"+language
+                    for ngram in ngrams_from_graphemes(graphemes, 2) ]
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.cwd)
+        shutil.rmtree(cls.tmp_dir)
+
+    def test_wg_matrix(self):
+        m = self.m
+        wg = m.get_wg_matrix()
+        assert wg.shape == (len(m.non_unique_parsed_words), len(m.non_unique_ngrams))
+        rows, cols = wg.nonzero()
+        for i, j in zip(rows, cols):
+            word = m.non_unique_parsed_words[i]
+            ngram = m.non_unique_ngrams[j]
+            # only ngrams of the word's language
+            assert word.partition("_")[2] == ngram.partition("_")[2]
+            assert wg[i, j] == self.words_ngrams[word].count(ngram)
+        # all ngrams of the words are counted
+        assert sorted(m.non_unique_parsed_words) == sorted(self.words_ngrams)
+        assert wg.sum() == sum(len(ngrams) for ngrams in self.words_ngrams.values())
+
+    def test_wl_wm_matrices(self):
+        m = self.m
+        wl = m.get_wl_matrix()
+        wm = m.get_wm_matrix()
+        assert wl.shape == (len(m.non_unique_parsed_words), len(m.languages))
+        assert wm.shape == (len(m.non_unique_parsed_words), len(m.concepts))
+        # every language specific word is in exactly one language
+        numpy.testing.assert_array_equal(wl.sum(axis=1).A1, 1)
+        for i, word in enumerate(m.non_unique_parsed_words):
+            assert m.languages[wl[i].indices[0]] == word.partition("_")[2]
+        assert wm.max() == 1 and wm.sum() > 0
+
+    def test_gp_matrix(self):
+        m = self.m
+        gp = m.get_gp_matrix()
+        assert gp.shape == (len(m.non_unique_ngrams), len(m.unique_ngrams))
+        for i, ngram in enumerate(m.non_unique_ngrams):
+            for j in gp[i].indices:
+                assert "".join(m.unique_ngrams[j]) == ngram.partition("_")[0]
+        # every language specific ngram is one of the unique ngrams
+        assert (gp.sum(axis=1).A1 >= 1).all()
+
+    def test_words_ngrams_indices(self):
+        m = self.m
+        for line, word in zip(m.iter_words_ngrams(True), m.non_unique_parsed_words):
+            tokens = line.split("\t")
+            assert tokens[0] == word
+            assert [ m.non_unique_ngrams[int(i)-1] for i in tokens[1:] ] ==\
+                self.words_ngrams[word]
+
+    def test_write_lines(self):
+        m = self.m
+        m.write_lines("meanings_header.txt", m.iter_header(m.concepts))
+        file = open("meanings_header.txt")
+        assert file.read().splitlines() == m.get_meanings_header()
+        file.close()
+
+    def _assert_same(self, m1, m2):
+        assert m1.non_unique_parsed_words == m2.non_unique_parsed_words
+        assert m1.non_unique_ngrams == m2.non_unique_ngrams
+        assert m1.languages == m2.languages
+        for name in ("wg", "wl", "wm", "gp"):
+            matrix1 = getattr(m1, "get_"+name+"_matrix")()
+            matrix2 = getattr(m2, "get_"+name+"_matrix")()
+            assert matrix1.shape == matrix2.shape
+            assert (matrix1 != matrix2).nnz == 0
+
+    def test_add(self):
+        m = Matrix(iter(self.records[:40]), self.o, "graphemes", 2)
+        m.add(iter(self.records[40:]))
+        self._assert_same(m, self.m)
+
+    def test_remove_language(self):
+        language = self.records[0][0]
+        m = Matrix(iter(self.records), self.o, "graphemes", 2)
+        m.remove_language(language)
+        assert language not in m.languages
+        self._assert_same(m, Matrix(
+            (record for record in self.records if record[0] != language),
+            self.o, "graphemes", 2))
+
+    def test_stable_numbering(self):
+        language = self.records[0][0]
+        m = Matrix(iter(self.records), self.o, "graphemes", 2, stable_numbering=True)
+        words_header = m.get_words_header()
+        ngrams_header = m.get_ngrams_header()
+        wg = m.get_wg_matrix()
+
+        m.remove_language(language)
+        # the remaining rows keep their numbers, the matrix keeps its shape
+        assert set(m.get_words_header()) < set(words_header)
+        assert m.get_wg_matrix().shape == wg.shape
+        assert m.get_wl_matrix()[:, m.languages.index(None)].nnz == 0
+
+        m.add(record for record in self.records if record[0] == language)
+        assert m.get_words_header() == words_header
+        assert m.get_ngrams_header() == ngrams_header
+        assert (m.get_wg_matrix() != wg).nnz == 0
+
+    def test_bundle(self):
+        m = self.m
+        m.save_bundle("bundle.npz", [ ("2", "Language B"), ("1", "Language A") ])
+        for mmap_mode in (None, "r"):
+            bundle = load_bundle("bundle.npz", mmap_mode=mmap_mode)
+            for name in ("wg", "wl", "wm", "gp"):
+                matrix = bundle.matrix(name)
+                assert (matrix != getattr(m, "get_"+name+"_matrix")()).nnz == 0
+            assert bundle.header("words") == m.non_unique_parsed_words
+            assert bundle.header("concepts") == m.concepts
+            assert bundle.metadata["ngram_length"] == 2
+        assert isinstance(bundle.arrays["wg_data"], numpy.memmap)
+
+        os.mkdir("text")
+        bundle_to_text("bundle.npz", "text", "test")
+        file = open(os.path.join("text", "test_words_ngrams_indices.txt"))
+        assert file.read().splitlines() == m.get_words_ngrams_indices()
+        file.close()
+        file = open(os.path.join("text", "test_ngrams_header.txt"))
+        assert file.read().splitlines() ==\
+            m.get_split_ngrams_header(m.get_ngrams_header())
+        file.close()
+        file = open(os.path.join("text", "test_wordlistids_lgnames_header.txt"))
+        assert file.read().splitlines() == [ "1\tLanguage A", "2\tLanguage B" ]
+        file.close()
+
+    def test_sharded_build(self):
+        m = Matrix(iter(self.records), self.o, "graphemes", 2, processes=2)
+        self._assert_same(m, self.m)
+        assert m.get_words_ngrams_indices() == self.m.get_words_ngrams_indices()
+        # merge shards into a matrix that has some of the languages already
+        m = Matrix(iter(self.records[:30]), self.o, "graphemes", 2)
+        m.add(iter(self.records[30:]), processes=2)
+        self._assert_same(m, self.m)
+
+    def test_sharded_unparsables(self):
+        records = [ (self.records[-1][0], "x", "\u0416a") ] + self.records +\
+            [ (self.records[0][0], "y", "\u0416e") ]
+        m = Matrix(iter(records), self.o, "graphemes", 2)
+        file = open(m.unparsables_path)
+        serial = file.read().splitlines()
+        file.close()
+        assert serial[0].startswith(records[0][0] + "\tx\t")
+        assert serial[-1].startswith(records[-1][0] + "\ty\t")
+
+        m = Matrix(iter([]), self.o, "graphemes", 2)
+        m.add_sharded(iter(records), processes=2, shards_per_process=1, shard_size=7)
+        self._assert_same(m, self.m)
+        file = open(m.unparsables_path)
+        assert file.read().splitlines() == serial
+        file.close()
+
+    def test_sharded_error(self):
+        o = FailingParser(qlc.get_orthography_profile("huber1992.txt"))
+        records = [ ("l", "c", "fail") ] + self.records * 20
+        m = Matrix(iter([]), o, "graphemes", 2)
+        # the error of the worker is raised and the pool is terminated
+        self.assertRaises(ValueError, m.add_sharded, iter(records),
+            processes=2, shards_per_process=8, shard_size=1)
+
+    def test_out_of_core(self):
+        language = self.records[0][0]
+        spill_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        m = Matrix(iter(self.records), self.o, "graphemes", 2,
+                   memory_budget=10, spill_dir=spill_dir)
+        # the runs of the word-concept counts and of the ngrams of the words
+        assert len(os.listdir(spill_dir)) == 2
+        # the matrices are built from the merged blocks, the runs are never
+        # merged into one array
+        def merge():
+            raise AssertionError("all runs merged at once")
+        m._occurrences.merge = m._word_ngrams.merge = merge
+        self._assert_same(m, self.m)
+        assert list(m.iter_words_header()) == self.m.get_words_header()
+        assert m.get_words_ngrams_indices() == self.m.get_words_ngrams_indices()
+        assert m.get_words_ngrams_strings() == self.m.get_words_ngrams_strings()
+        m.save_bundle("out_of_core.npz", [])
+        bundle = load_bundle("out_of_core.npz")
+        assert bundle.header("words") == self.m.non_unique_parsed_words
+        assert [ bundle.words_ngrams(row).tolist() for row in range(len(self.m.non_unique_parsed_words)) ] ==\
+            [ [ int(i)-1 for i in line.split("\t")[1:] ] for line in self.m.get_words_ngrams_indices() ]
+
+        # dropped rows in runs on disk are skipped by the merge
+        m.remove_language(language)
+        self._assert_same(m, Matrix(
+            (record for record in self.records if record[0] != language),
+            self.o, "graphemes", 2))
+        m.add(record for record in self.records if record[0] == language)
+        self._assert_same(m, self.m)
+
+        m.close()
+        assert os.listdir(spill_dir) == []
+
+    def test_triple_runs(self):
+        for budget in (None, 3):
+            runs = TripleRuns(budget, self.tmp_dir)
+            runs.extend([ 2, 0, 2, 1, 0, 2 ], [ 1, 5, 1, 0, 5, 0 ], [ 1, 1, 2, 1, 1, 1 ])
+            rows, cols, counts = runs.merge()
+            assert list(zip(rows, cols, counts)) ==\
+                [ (0, 5, 2), (1, 0, 1), (2, 0, 1), (2, 1, 3) ]
+            runs.drop_rows([ 2 ])
+            runs.append(2, 7)
+            rows, cols, counts = runs.merge()
+            assert list(zip(rows, cols, counts)) ==\
+                [ (0, 5, 2), (1, 0, 1), (2, 7, 1) ]
+            runs.close()
+
+        # many runs that are merged a few triples at a time
+        rng = numpy.random.default_rng(0)
+        triples = rng.integers(0, 20, size=(500, 2))
+        runs = TripleRuns(37, self.tmp_dir, block_size=5)
+        runs.extend(triples[:300, 0].tolist(), triples[:300, 1].tolist(), [ 1 ] * 300)
+        runs.drop_rows([ 3, 4 ])
+        runs.extend(triples[300:, 0].tolist(), triples[300:, 1].tolist(), [ 1 ] * 200)
+        expected = collections.Counter( (row, col) for i, (row, col) in
+            enumerate(triples.tolist()) if i >= 300 or row not in (3, 4) )
+        blocks = list(runs.iter_merged())
+        assert len(blocks) > 1
+        rows, cols, counts = runs.merge()
+        assert list(zip(rows.tolist(), cols.tolist(), counts.tolist())) ==\
+            [ key + (count,) for key, count in sorted(expected.items()) ]
+
+        # a CSR matrix is filled block by block, with rows in another order
+        permutation = rng.permutation(20)
+        def blocks():
+            for rows, cols, counts in runs.iter_merged():
+                yield permutation[rows], cols, counts
+        matrix = _csr_from_blocks(blocks, (20, 20))
+        dense = numpy.zeros((20, 20), dtype=int)
+        for (row, col), count in expected.items():
+            dense[permutation[row], col] = count
+        numpy.testing.assert_array_equal(matrix.toarray(), dense)
+        assert matrix.has_sorted_indices
+        runs.close()
@@ -7,11 +7,14 @@
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
-import os, types
+import os, types, math, tempfile, shutil
 import numpy.testing
 
 from qlc.ngram import ngrams_from_graphemes,\
-    words_ngrams_matrix_for_graphemes_list
+    words_ngrams_matrix_for_graphemes_list,\
+    words_ngrams_sparse_matrix_for_graphemes_list,\
+    words_ngrams_sparse_matrices_for_graphemes_list, HashingVectorizer,\
+    NgramModel, bigram_model
 
 class testNgram(numpy.testing.TestCase):
     """
@@ -30,3 +33,140 @@ class testNgram(numpy.testing.TestCase):
         resulting_matrix = \
             words_ngrams_matrix_for_graphemes_list(test_list_words)
         assert(len(resulting_matrix[0]) == len(test_list_words))
+
+    def test_words_ngrams_sparse_matrix_for_graphemes_list(self):
+        test_list_words = [ ("#", "a", "b", "a", "b", "#"), ("#", "uu", "b", "#"), "ab", "" ]
+        matrix, ngrams = \
+            words_ngrams_sparse_matrix_for_graphemes_list(test_list_words, 2)
+        assert ngrams == [ ("#", "a"), ("#", "uu"), ("a", "b"), ("b", "#"),
+                           ("b", "a"), ("uu", "b") ]
+        assert matrix.shape == (4, 6)
+        numpy.testing.assert_array_equal(matrix.toarray(),
+            [ [1, 0, 2, 1, 1, 0], [0, 1, 0, 1, 0, 1], [0, 0, 1, 0, 0, 0],
+              [0, 0, 0, 0, 0, 0] ])
+
+    def test_sparse_matrix_for_large_vocabularies(self):
+        # 300 ** 8 does not fit into a 64 bit integer
+        matrix, ngrams = \
+            words_ngrams_sparse_matrix_for_graphemes_list([ tuple(range(300)) ], 8)
+        assert matrix.shape == (1, 293)
+        assert ngrams[0] == tuple(range(8))
+
+    def test_words_ngrams_sparse_matrices_for_graphemes_list(self):
+        test_list_words = [ "#abab#", "#cd#", "#a#" ]
+        orders = words_ngrams_sparse_matrices_for_graphemes_list(test_list_words, 3)
+        for n in (1, 2, 3):
+            matrix, ngrams = \
+                words_ngrams_sparse_matrix_for_graphemes_list(test_list_words, n)
+            assert orders[n][1] == ngrams
+            assert (orders[n][0] != matrix).nnz == 0
+
+        matrix, ngrams, offsets = words_ngrams_sparse_matrices_for_graphemes_list(
+            test_list_words, 3, combined=True)
+        assert list(offsets) == [ 0, 5, 5 + len(orders[2][1]), len(ngrams) ]
+        assert matrix.shape == (3, len(ngrams))
+        assert ngrams[offsets[1]:offsets[2]] == orders[2][1]
+        numpy.testing.assert_array_equal(
+            matrix[:, offsets[2]:offsets[3]].toarray(), orders[3][0].toarray())
+
+class testHashingVectorizer(numpy.testing.TestCase):
+
+    def setUp(self):
+        self.words = [ ("#", "a", "b", "#"), ("#", "b", "#"), "#abab#", "" ] * 10
+
+    def test_transform(self):
+        vectorizer = HashingVectorizer(n=2, n_features=2**16, signed=False)
+        matrix = vectorizer.transform(self.words)
+        assert matrix.shape == (40, 2**16)
+        # no collisions for a handful of ngrams in 2**16 columns
+        counts, ngrams = words_ngrams_sparse_matrix_for_graphemes_list(self.words, 2)
+        assert sorted(matrix.sum(axis=0).A1[numpy.unique(matrix.indices)]) ==\
+            sorted(counts.sum(axis=0).A1)
+        assert matrix[3].nnz == 0
+
+    def test_signed(self):
+        vectorizer = HashingVectorizer(n=(1, 2), n_features=2**16)
+        matrix = vectorizer.transform(self.words[:1])
+        # "#", "a", "b", "#a", "ab", "b#"; "#" appears twice
+        assert matrix.nnz == 6
+        assert sorted(abs(matrix.data)) == [ 1, 1, 1, 1, 1, 2 ]
+
+    def test_chunks_sum_up(self):
+        vectorizer = HashingVectorizer(n=(1, 2, 3), n_features=2**10)
+        total = vectorizer.transform_sum(self.words)
+        assert (vectorizer.count(self.words, chunksize=3) != total).nnz == 0
+        assert (vectorizer.count(iter(self.words), chunksize=3, processes=2) != total).nnz == 0
+        assert (vectorizer.count(iter(self.words), chunksize=3, processes=None) != total).nnz == 0
+        chunks = vectorizer.transform_stream(self.words, chunksize=7)
+        assert (sum(chunk.sum(axis=0) for chunk in chunks) != total.toarray()).sum() == 0
+
+class testNgramModel(numpy.testing.TestCase):
+
+    def setUp(self):
+        self.words = [ ("#", "a", "b", "#"), ("#", "b", "a", "#") ]
+        self.model = NgramModel(3)
+        self.model.update(self.words)
+
+    def test_score(self):
+        # a bigram model of "#a#" and "#ab#", with the vocabulary "#", "a",
+        # "b" and unknown:
+        #   unigrams: # 4, a 2, b 1; 7 tokens, 3 types
+        #   P1(g) = (c(g) + 3 * 1/4) / (7 + 3)
+        #   P1(#) = 0.475, P1(a) = 0.275, P1(b) = 0.175, P1(unknown) = 0.075
+        #   bigrams: #a 2, a# 1, ab 1, b# 1
+        #   P(g|h) = (c(hg) + t(h) * P1(g)) / (c(h) + t(h))
+        model = NgramModel(2)
+        model.update([ ("#", "a", "#"), ("#", "a", "b", "#") ])
+        probs = [ (2 + 1 * 0.275) / (2 + 1),    # P(a|#)
+                  (1 + 2 * 0.175) / (2 + 2),    # P(b|a)
+                  (0 + 1 * 0.275) / (1 + 1),    # P(a|b)
+                  (1 + 2 * 0.475) / (2 + 2) ]   # P(#|a)
+        word = ("#", "a", "b", "a", "#")
+        expected = sum(math.log(p) for p in probs)
+        scores = model.score([ word, ("#", "z", "#"), ("#",), () ])
+        numpy.testing.assert_almost_equal(scores[0], expected)
+        # P(z|#) = 0.075 / 3, P(#|z) = 0.475
+        numpy.testing.assert_almost_equal(scores[1], math.log(0.025) + math.log(0.475))
+        assert list(scores[2:]) == [ 0.0, 0.0 ]
+        normalized = model.score([ word ], normalize=True)
+        numpy.testing.assert_almost_equal(normalized[0], expected / 4)
+
+    def test_probabilities_sum_to_one(self):
+        for history in [ ("#",), ("#", "a"), ("#", "z") ]:
+            before = self.model.score([ history ])[0]
+            total = sum(math.exp(self.model.score([ history + (g,) ])[0] - before)
+                for g in self.model.vocabulary[1:] + [ "unknown" ])
+            numpy.testing.assert_almost_equal(total, 1.0)
+
+    def test_update_and_save(self):
+        word = ("#", "a", "b", "a", "#")
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "model.npz")
+            self.model.save(path)
+            loaded = NgramModel.load(path)
+            numpy.testing.assert_almost_equal(
+                loaded.score([ word ]), self.model.score([ word ]))
+            before = self.model.score([ word ])
+            self.model.update([ word ])
+            loaded.update([ word ])
+            assert self.model.score([ word ]) > before
+            numpy.testing.assert_almost_equal(
+                loaded.score([ word ]), self.model.score([ word ]))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_bigram_model(self):
+        import qlc
+        from qlc.corpusreader import CorpusReaderWordlist
+        cr = CorpusReaderWordlist(os.path.join(
+            os.path.dirname(qlc.__file__), "data", "testcorpus"))
+        records = [ (wordlistdata_id, concept, counterpart)
+            for wordlistdata_id in cr.wordlistdata_ids_for_bibtex_key("huber1992")
+            for concept, counterpart in cr.concepts_with_counterparts_for_wordlistdata_id(wordlistdata_id) ]
+        matrix, vocabulary = bigram_model(records,
+            qlc.get_orthography_profile("huber1992.txt"))
+        assert matrix.shape == (len(vocabulary), len(vocabulary))
+        boundary = vocabulary.index("#")
+        # every parsed word starts and ends with a boundary
+        assert matrix[boundary].sum() == matrix[:, boundary].sum() > 0
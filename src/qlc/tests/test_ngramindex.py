@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+#-----------------------------------------------------------------------------
+# Copyright (c) 2012, Quantitative Language Comparison Team
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import os
+import numpy.testing
+
+import qlc
+from qlc.corpusreader import CorpusReaderWordlist
+from qlc.orthography import OrthographyParser
+from qlc.ngramindex import NgramIndex
+
+class testNgramIndex(numpy.testing.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        data_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "data", "testcorpus")
+        cr = CorpusReaderWordlist(data_path)
+        records = [ (wordlistdata_id, concept, counterpart)
+            for wordlistdata_id in cr.wordlistdata_ids_for_bibtex_key("huber1992")
+            for concept, counterpart in cr.concepts_with_counterparts_for_wordlistdata_id(wordlistdata_id) ]
+        o = OrthographyParser(qlc.get_orthography_profile("huber1992.txt"))
+        cls.index = NgramIndex.from_records(records, o, n=2)
+        cls.parsed = []
+        for language, concept, counterpart in records:
+            success, parse = o.parse_string_to_graphemes_string(counterpart)
+            if success:
+                cls.parsed.append(((language, concept, counterpart), " " + parse + " "))
+
+    def _scan(self, *queries):
+        return sorted(record for record, parse in self.parsed
+            if all(" " + query + " " in parse for query in queries))
+
+    def test_search(self):
+        for query in [ "a", "# a", "a #", "k a", "# k a", "a n a", "o k o #",
+                       "# w a n", "zzz" ]:
+            assert sorted(self.index.search(query)) == self._scan(query), query
+
+    def test_search_all(self):
+        assert sorted(self.index.search_all([ "a", "# k" ])) ==\
+            self._scan("a", "# k")
+        assert self.index.search_all([ "# a", "zzz" ]) == []
+
+    def test_occurrences(self):
+        index = NgramIndex(n=2)
+        index.add("l1", "c1", "abab", ("#", "a", "b", "a", "b", "#"))
+        index.add("l1", "c2", "ba", "# b a #")
+        words, positions = index.occurrences("a b a")
+        assert list(words) == [ 0 ] and list(positions) == [ 1 ]
+        words, positions = index.occurrences("b")
+        assert list(zip(words, positions)) == [ (0, 2), (0, 4), (1, 1) ]
+        assert index.search("b a #") == [ ("l1", "c2", "ba") ]
+
+    def test_query_offsets(self):
+        # the covering k-grams of a query also occur near the start of
+        # other words, at positions before their offset in the query
+        index = NgramIndex(n=2)
+        for i, word in enumerate([ "# b c #", "# b c x #", "# z z #", "# x # b c #" ]):
+            index.add("l", str(i), word.replace(" ", ""), word)
+        assert index.search("x # b c") == [ ("l", "3", "#x#bc#") ]
+        assert index.search("c x #") == [ ("l", "1", "#bcx#") ]
+        assert index.search("z z # b") == []
+        assert index.search("# b c") == [ ("l", "0", "#bc#"), ("l", "1", "#bcx#"),
+            ("l", "3", "#x#bc#") ]
+        words, positions = index.occurrences("# b c")
+        assert list(words) == [ 0, 1, 3 ] and list(positions) == [ 0, 0, 2 ]
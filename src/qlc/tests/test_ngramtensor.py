@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+#-----------------------------------------------------------------------------
+# Copyright (c) 2012, Quantitative Language Comparison Team
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import os, math, itertools, shutil, tempfile
+import numpy.testing
+import scipy.sparse
+
+import qlc
+from qlc.corpusreader import CorpusReaderWordlist
+from qlc.orthography import OrthographyParser
+from qlc.matrix import Matrix
+from qlc.ngram import ngrams_from_graphemes
+from qlc.ngramtensor import LanguageConceptNgramTensor, poisson_significance
+
+class testLanguageConceptNgramTensor(numpy.testing.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        data_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "data", "testcorpus")
+        cr = CorpusReaderWordlist(data_path)
+        cls.records = [ (wordlistdata_id, concept, counterpart)
+            for wordlistdata_id in cr.wordlistdata_ids_for_bibtex_key("huber1992")
+            for concept, counterpart in cr.concepts_with_counterparts_for_wordlistdata_id(wordlistdata_id) ]
+        cls.o = OrthographyParser(qlc.get_orthography_profile("huber1992.txt"))
+
+        cwd = os.getcwd()
+        tmp_dir = tempfile.mkdtemp()
+        os.chdir(tmp_dir)
+        os.mkdir("output")
+        try:
+            m = Matrix(iter(cls.records), cls.o, "graphemes", 2)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(tmp_dir)
+        cls.tensor = LanguageConceptNgramTensor.from_matrix(m)
+
+    def test_from_matrix(self):
+        tensor = self.tensor
+        expected = set()
+        for language, concept, counterpart in self.records:
+            success, graphemes = self.o.parse_string_to_graphemes(counterpart)
+            if success:
+                for ngram in ngrams_from_graphemes(graphemes, 2):
+                    expected.add((language, concept, "".join(ngram)))
+        languages, concepts, ngrams = tensor.to_coo()
+        assert set(zip([ tensor.languages[i] for i in languages ],
+                       [ tensor.concepts[i] for i in concepts ],
+                       [ tensor.ngrams[i] for i in ngrams ])) == expected
+
+    def test_poisson_significance(self):
+        k = scipy.sparse.csr_matrix([ [ 2, 0 ], [ 1, 30 ] ])
+        significance = poisson_significance(k, [ 3, 40 ], [ 4, 50 ], 100)
+        for i, j in zip(*k.nonzero()):
+            e = [ 3, 40 ][i] * [ 4, 50 ][j] / 100.0
+            numpy.testing.assert_almost_equal(significance[i, j],
+                e + math.lgamma(k[i, j] + 1) - k[i, j] * math.log(e))
+        # no overflow for large counts
+        significance = poisson_significance(scipy.sparse.csr_matrix([ [ 500 ] ]), [ 600 ], [ 700 ], 1000)
+        assert numpy.isfinite(significance.data).all()
+
+    def test_pairwise_significance(self):
+        tensor = self.tensor
+        pairs = [ (tensor.languages[0], tensor.languages[1]),
+                  (tensor.languages[2], tensor.languages[0]) ]
+        serial = list(tensor.pairwise_significance(pairs))
+        parallel = list(tensor.pairwise_significance(pairs, processes=2))
+        for (l1, l2, (k1, s1)), (l3, l4, (k2, s2)) in zip(serial, parallel):
+            assert (l1, l2) == (l3, l4)
+            assert (k1 != k2).nnz == 0
+            numpy.testing.assert_array_almost_equal(s1.toarray(), s2.toarray())
+
+        # stopping early closes the pool without computing all pairs
+        results = tensor.pairwise_significance(pairs * 100, processes=2)
+        assert [ pair[:2] for pair in itertools.islice(results, 3) ] ==\
+            [ pairs[0], pairs[1], pairs[0] ]
+        results.close()
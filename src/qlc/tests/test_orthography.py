@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#-----------------------------------------------------------------------------
+# Copyright (c) 2011, 2012, Quantitative Language Comparison Team
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import os, shutil, tempfile, unicodedata, json
+import numpy.testing
+
+import qlc
+from qlc.orthography import OrthographyParser, OrthographyProfileRegistry,\
+    compiled_profile_format
+from qlc.orthographycoverage import OrthographyCoverage
+
+class testOrthographyProfileRegistry(numpy.testing.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.registry = OrthographyProfileRegistry(cache_dir=self.cache_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_parser_matches_orthography_parser(self):
+        o = OrthographyParser(qlc.get_orthography_profile("huber1992.txt"))
+        for word in ["wanène", "wanùma", "lengua boca"]:
+            assert self.registry["huber1992"].parse_string_to_graphemes(word) ==\
+                o.parse_string_to_graphemes(word)
+
+    def test_parser_is_loaded_once(self):
+        assert self.registry["huber1992"] is self.registry["huber1992"]
+
+    def test_cache(self):
+        self.registry["huber1992"]
+        cache_files = os.listdir(self.cache_dir)
+        assert len(cache_files) == 1
+        assert cache_files[0].startswith("huber1992-")
+        # the version of the compiled format is part of the cache key
+        assert cache_files[0].endswith("-v{0}.json".format(compiled_profile_format))
+        with open(os.path.join(self.cache_dir, cache_files[0]), encoding="utf-8") as file:
+            assert json.load(file)["format"] == compiled_profile_format == 1
+
+        registry = OrthographyProfileRegistry(cache_dir=self.cache_dir)
+        assert registry["huber1992"].parse_string_to_graphemes("wanène") ==\
+            (True, ('#', 'w', 'a', 'n', unicodedata.normalize("NFD", 'è'),
+                    'n', 'e', '#'))
+
+    def test_broken_cache_is_rebuilt(self):
+        self.registry["huber1992"]
+        cache_file = os.path.join(self.cache_dir, os.listdir(self.cache_dir)[0])
+        with open(cache_file, "w", encoding="utf-8") as file:
+            file.write('{ "format" : 1, "tree" : [')
+        registry = OrthographyProfileRegistry(cache_dir=self.cache_dir)
+        assert registry["huber1992"].parse_string_to_graphemes("wanène") ==\
+            self.registry["huber1992"].parse_string_to_graphemes("wanène")
+        with open(cache_file, encoding="utf-8") as file:
+            assert json.load(file)["format"] == compiled_profile_format
+
+    def test_sources(self):
+        sources = self.registry.sources()
+        assert "huber1992" in sources
+        assert "README" not in sources
+
+    def test_parse_records(self):
+        records = [ ("huber1992", "48", "LENGUA_TONGUE", "wanène"),
+                    ("thiesen1998", "1", "BOCA_MOUTH", "uubo"),
+                    ("huber1992", "48", "BOCA_MOUTH", "wanùma") ]
+        result = list(self.registry.parse_records(records))
+        assert [ r[0] for r in result ] == [ "huber1992", "thiesen1998", "huber1992" ]
+        assert result[0][4] == self.registry["huber1992"].parse_string_to_graphemes("wanène")
+        assert result[1][4] == self.registry["thiesen1998"].parse_string_to_graphemes("uubo")
+
+class testOrthographyCoverage(numpy.testing.TestCase):
+
+    def setUp(self):
+        self.o = OrthographyParser(qlc.get_orthography_profile("huber1992.txt"))
+
+    def test_report(self):
+        coverage = OrthographyCoverage(self.o, n_top=2)
+        coverage.add_records([ ("huber1992", "48", "LENGUA_TONGUE", "wanène"),
+                               ("huber1992", "48", "BOCA_MOUTH", "wan$ma"),
+                               ("other", "1", "BOCA_MOUTH", "$boca") ])
+        report = json.loads(coverage.to_json())
+        assert report["words"] == 3
+        assert report["parsed"] == 1
+        assert report["sources"]["huber1992"]["unparsable"] == 1
+        assert report["sources"]["other"]["unparsable_rate"] == 1.0
+        # unmatched graphemes are reported for the source that misses them
+        unmatched = report["sources"]["huber1992"]["unmatched_graphemes"]
+        assert [ (u["grapheme"], u["count"], u["examples"]) for u in unmatched ] ==\
+            [ ("$", 1, [ "wan$ma" ]) ]
+        unmatched = report["sources"]["other"]["unmatched_graphemes"]
+        assert [ (u["grapheme"], u["count"], u["examples"]) for u in unmatched ] ==\
+            [ ("$", 1, [ "$boca" ]) ]
+        coverage.add("$$", "other")
+        assert coverage.report()["sources"]["other"]["unmatched_graphemes"][0]["count"] == 2
+        assert len(report["longest_inputs"]) == 2
+        assert report["longest_inputs"][0]["length"] == 6
+        assert len(report["slowest_inputs"]) == 2
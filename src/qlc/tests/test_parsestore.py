@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#-----------------------------------------------------------------------------
+# Copyright (c) 2012, Quantitative Language Comparison Team
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import os, shutil, tempfile
+import numpy.testing
+
+from qlc.orthography import OrthographyParser
+from qlc.parsestore import ParseStore
+from qlc.tokenizer import tokenize_parallel
+
+class testParseStore(numpy.testing.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.profile = os.path.join(self.tmp_dir, "test.txt")
+        self.write_profile([ "a, a", "b, b", "o, o", "u, u" ])
+        self.store = ParseStore(os.path.join(self.tmp_dir, "parses.sqlite"))
+        self.words = [ "uubo", "abba", "baba", "ouo", "tuu" ]
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def write_profile(self, lines):
+        file = open(self.profile, "w", encoding="utf-8")
+        file.write("\n".join(lines) + "\n")
+        file.close()
+
+    def test_parses_are_stored(self):
+        o = self.store.parser(self.profile)
+        result = [ o.parse_string_to_graphemes_string(w) for w in self.words ]
+        assert result[0] == (True, "# u u b o #")
+        assert result[4][0] == False
+        self.store.insert(o.profile_hash, "uubo", True, "stored")
+        assert o.parse_string_to_graphemes_string("uubo") == (True, "stored")
+
+    def test_profile_edit(self):
+        o = self.store.parser(self.profile)
+        for w in self.words:
+            o.parse_string_to_graphemes_string(w)
+
+        self.write_profile([ "a, a", "b, b", "o, o", "u, u", "uu, u:", "t, t" ])
+        o = self.store.parser(self.profile)
+        # only "uubo" and "tuu" contain "uu" or "t"
+        assert self.store.reparsed == 2
+
+        fresh = OrthographyParser(self.profile)
+        for w in self.words:
+            assert o.parse_string_to_graphemes_string(w) ==\
+                fresh.parse_string_to_graphemes_string(w)
+        assert o.parse_string_to_graphemes("tuu") == (True, ("#", "t", "uu", "#"))
+
+    def count_parses(self):
+        return self.store.connection.execute("SELECT COUNT(*) FROM parses").fetchone()[0]
+
+    def test_edits_do_not_grow_the_store(self):
+        o = self.store.parser(self.profile)
+        for w in self.words:
+            o.parse_string_to_graphemes_string(w)
+        assert self.count_parses() == len(self.words)
+
+        self.write_profile([ "a, a", "b, b", "o, o", "u, u", "uu, u:" ])
+        self.store.parser(self.profile)
+        self.write_profile([ "a, a", "b, b", "o, o", "u, u", "uu, u:", "t, t" ])
+        o = self.store.parser(self.profile)
+        assert self.count_parses() == len(self.words)
+        assert o.parse_string_to_graphemes("tuu") == (True, ("#", "t", "uu", "#"))
+
+        # going back to the first version parses the affected words again
+        self.write_profile([ "a, a", "b, b", "o, o", "u, u" ])
+        o = self.store.parser(self.profile)
+        assert self.store.reparsed == 2
+        assert self.count_parses() == len(self.words)
+        fresh = OrthographyParser(self.profile)
+        for w in self.words:
+            assert o.parse_string_to_graphemes_string(w) ==\
+                fresh.parse_string_to_graphemes_string(w)
+
+    def test_batch(self):
+        o = self.store.parser(self.profile)
+        o.parse_string_to_graphemes_string("uubo")
+        fresh = OrthographyParser(self.profile)
+        words = self.words + [ "uubo" ]
+        assert o.parse_string_to_graphemes_batch(words) ==\
+            [ fresh.parse_string_to_graphemes(w) for w in words ]
+        assert self.count_parses() == len(self.words)
+        assert sorted(self.store.lookup_many(o.profile_hash, [ "ouo", "xyz" ])) == [ "ouo" ]
+
+        # the store is used in the calling process, whatever the processes
+        records = [ ("l", "c", w) for w in self.words ]
+        unparsables = []
+        result = list(tokenize_parallel(records, o, processes=2, chunksize=2,
+                                        unparsables=unparsables))
+        assert [ r[3] for r in result ] ==\
+            [ fresh.parse_string_to_graphemes_string(w)[1] for w in self.words[:4] ]
+        assert [ r[2] for r in unparsables ] == [ "tuu" ]
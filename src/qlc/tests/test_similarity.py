@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+#-----------------------------------------------------------------------------
+# Copyright (c) 2012, Quantitative Language Comparison Team
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import os, shutil, tempfile
+import numpy.testing
+import scipy.sparse
+from scipy.spatial.distance import pdist, squareform
+
+import qlc
+from qlc.corpusreader import CorpusReaderWordlist
+from qlc.orthography import OrthographyParser
+from qlc.matrix import Matrix
+from qlc.distance.similarity import language_ngram_profiles,\
+    pairwise_similarity, top_k_similar
+
+class testSimilarity(numpy.testing.TestCase):
+
+    def setUp(self):
+        self.profiles = scipy.sparse.csr_matrix(numpy.array([
+            [ 1, 0, 2, 0, 1 ],
+            [ 0, 1, 1, 0, 0 ],
+            [ 1, 0, 3, 0, 1 ],
+            [ 0, 0, 0, 4, 1 ],
+            [ 2, 1, 0, 0, 0 ] ]))
+
+    def test_pairwise_similarity(self):
+        dense = self.profiles.toarray()
+        for metric in ("cosine", "jaccard", "dice"):
+            if metric == "cosine":
+                expected = 1 - pdist(dense, "cosine")
+            else:
+                expected = 1 - pdist(dense > 0, metric)
+            numpy.testing.assert_array_almost_equal(
+                pairwise_similarity(self.profiles, metric, block_size=2), expected)
+
+    def test_top_k_similar(self):
+        square = squareform(pairwise_similarity(self.profiles, "cosine"))
+        numpy.fill_diagonal(square, -numpy.inf)
+        indices, similarities = top_k_similar(self.profiles, 2, "cosine", block_size=3)
+        for i in range(5):
+            assert list(indices[i]) == list(numpy.argsort(-square[i], kind="stable")[:2])
+            numpy.testing.assert_array_almost_equal(similarities[i], square[i, indices[i]])
+        indices, similarities = top_k_similar(self.profiles[:2], 3)
+        assert list(indices[0]) == [ 1, -1, -1 ]
+
+    def test_language_ngram_profiles(self):
+        data_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "data", "testcorpus")
+        cr = CorpusReaderWordlist(data_path)
+        records = [ (wordlistdata_id, concept, counterpart)
+            for wordlistdata_id in cr.wordlistdata_ids_for_bibtex_key("huber1992")
+            for concept, counterpart in cr.concepts_with_counterparts_for_wordlistdata_id(wordlistdata_id) ]
+        o = OrthographyParser(qlc.get_orthography_profile("huber1992.txt"))
+
+        cwd = os.getcwd()
+        tmp_dir = tempfile.mkdtemp()
+        os.chdir(tmp_dir)
+        os.mkdir("output")
+        try:
+            m = Matrix(iter(records), o, "graphemes", 1)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(tmp_dir)
+
+        profiles, languages, ngrams = language_ngram_profiles(m, binary=True)
+        assert profiles.shape == (len(m.languages), len(m.unique_ngrams))
+        # every word contains a word boundary
+        boundary = ngrams.index(("#",))
+        assert (profiles[:, boundary].toarray() == 1).all()
+        condensed = pairwise_similarity(profiles, "jaccard")
+        assert len(condensed) == len(languages) * (len(languages) - 1) // 2
+        assert ((condensed >= 0) & (condensed <= 1)).all()
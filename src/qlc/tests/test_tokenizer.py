@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#-----------------------------------------------------------------------------
+# Copyright (c) 2011, 2012, Quantitative Language Comparison Team
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import os, io, gc, types, shutil, tempfile, warnings
+import numpy.testing
+
+import qlc
+from qlc.corpusreader import CorpusReaderWordlist
+from qlc.orthography import OrthographyParser
+from qlc.tokenizer import tokenize_parallel, Tokenizer, FileSource, CorpusReaderSource
+
+class testTokenizeParallel(numpy.testing.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        data_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "data", "testcorpus")
+        cr = CorpusReaderWordlist(data_path)
+        cls.records = [ (wordlistdata_id, concept, counterpart)
+            for wordlistdata_id in cr.wordlistdata_ids_for_bibtex_key("huber1992")
+            for concept, counterpart in cr.concepts_with_counterparts_for_wordlistdata_id(wordlistdata_id) ]
+        # add a record that does not parse
+        cls.records.append(("1", "NADA_NOTHING", "$$$"))
+        cls.o = OrthographyParser(qlc.get_orthography_profile("huber1992.txt"))
+
+    def test_serial(self):
+        unparsables = []
+        result = list(tokenize_parallel(self.records, self.o, processes=1,
+                                        unparsables=unparsables))
+        assert len(result) == len(self.records) - 1
+        assert unparsables[0][:3] == ("1", "NADA_NOTHING", "$$$")
+        for record, parsed in zip(self.records, result):
+            assert parsed[:3] == record
+            assert parsed[3] == self.o.parse_string_to_graphemes_string(record[2])[1]
+
+    def test_parallel_keeps_order(self):
+        unparsables = []
+        serial = list(tokenize_parallel(self.records, self.o, processes=1))
+        parallel = list(tokenize_parallel(iter(self.records), self.o,
+            processes=2, chunksize=7, max_chunks_in_flight=2,
+            unparsables=unparsables))
+        assert parallel == serial
+        assert len(unparsables) == 1
+
+    def test_generator(self):
+        generator = tokenize_parallel(self.records, self.o, processes=1)
+        assert type(generator) == types.GeneratorType
+
+class testTokenizer(numpy.testing.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.data = os.path.join(self.tmp_dir, "data.tsv")
+        file = open(self.data, "w", encoding="utf-8")
+        file.write("wanène\tLENGUA_TONGUE\tbora\n")
+        file.write("?\tBOCA_MOUTH\tbora\n")
+        file.write("$$$\tBOCA_MOUTH\tbora\n")
+        file.close()
+        self.t = Tokenizer(self.data, qlc.get_orthography_profile("huber1992.txt"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_qlc_output_format(self):
+        output = io.StringIO()
+        self.t.qlc_output_format(output)
+        lines = output.getvalue().splitlines()
+        assert lines[0] == "COUNTERPART\tORTHO_PARSE\tCONCEPT\tLANGUAGE"
+        assert len(lines) == 3
+        assert lines[1].split("\t")[2:] == [ "LENGUA_TONGUE", "bora" ]
+        assert lines[2] == "?\t?\tBOCA_MOUTH\tbora"
+
+    def test_lingpy_output_is_repeatable(self):
+        for i in range(2):
+            output = io.StringIO()
+            self.t.lingpy_output(output)
+            lines = output.getvalue().splitlines()
+            assert len(lines) == 2
+            assert lines[1].startswith("bora\tLENGUA_TONGUE\twanène\t# w a n")
+
+    def test_write_keeps_order(self):
+        class AllFormat(object):
+            header = None
+            def missing(self, language, concept, counterpart):
+                return "missing " + counterpart
+            def parsed(self, language, concept, counterpart, ortho_parse):
+                return "parsed " + counterpart
+            def unparsable(self, language, concept, counterpart, invalid_parse):
+                return "unparsable " + counterpart
+        for processes in (1, 2):
+            output = io.StringIO()
+            self.t.write(AllFormat(), output, processes=processes)
+            assert output.getvalue().splitlines() ==\
+                [ "parsed wanène", "missing ?", "unparsable $$$" ]
+            assert [ record[2] for record in self.t.unparsables ] == [ "?", "$$$" ]
+
+    def test_tokenized_words(self):
+        words = self.t.get_qlc_tokenized_words(processes=1)
+        assert len(words) == 1
+        assert len(self.t.unparsables) == 2
+
+    def test_file_source_closes_file(self):
+        source = FileSource(self.data)
+        assert list(source) == [ ("bora", "LENGUA_TONGUE", "wanène"),
+            ("bora", "BOCA_MOUTH", "?"), ("bora", "BOCA_MOUTH", "$$$") ]
+        # the file is closed when the consumer stops early
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            records = iter(source)
+            next(records)
+            records.close()
+            del records
+            gc.collect()
+        assert not [ w for w in caught if issubclass(w.category, ResourceWarning) ]
+
+    def test_corpusreader_source(self):
+        data_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "data", "testcorpus")
+        source = CorpusReaderSource(CorpusReaderWordlist(data_path), "huber1992")
+        assert len(list(source)) == len(list(source)) > 0
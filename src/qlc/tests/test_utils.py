@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+#-----------------------------------------------------------------------------
+# Copyright (c) 2011, 2012, Quantitative Language Comparison Team
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import unicodedata
+import numpy.testing
+
+from qlc.utils import parse_graphemes, parse_graphemes_batch, normalize,\
+    remove_stopwords, _stopword_filter, PhraseNormalizer
+from qlc.orthography import GraphemeParser
+
+class testGraphemes(numpy.testing.TestCase):
+
+    def test_parse_graphemes(self):
+        assert parse_graphemes("abc") == ("a", "b", "c")
+        assert parse_graphemes("kʷa") == ("k", "ʷ", "a")
+        assert parse_graphemes("") == ()
+        word = unicodedata.normalize("NFD", "wanène")
+        assert parse_graphemes(word) ==\
+            ("w", "a", "n", unicodedata.normalize("NFD", "è"), "n", "e")
+        assert parse_graphemes("a\r\nb") == ("a", "\r\n", "b")
+
+    def test_parse_graphemes_batch(self):
+        result = parse_graphemes_batch(["ab", "c"])
+        assert result == [ ("a", "b"), ("c",) ]
+
+    def test_grapheme_parser(self):
+        g = GraphemeParser()
+        assert g.parse_string_to_graphemes_string("ab c") == (True, "# a b # c #")
+        assert g.parse_string_to_graphemes("ab") == (True, ("#", "a", "b", "#"))
+
+class testNormalize(numpy.testing.TestCase):
+
+    def test_normalize(self):
+        nfd = unicodedata.normalize("NFD", "wanène")
+        assert normalize("wanène") == nfd
+        assert normalize(nfd) is nfd
+        assert normalize(nfd, "NFC") == unicodedata.normalize("NFC", "wanène")
+
+class testPhraseNormalizer(numpy.testing.TestCase):
+
+    class Stemmer(object):
+        def __init__(self):
+            self.calls = 0
+        def stem(self, word):
+            self.calls += 1
+            return word[:4]
+
+    def setUp(self):
+        self.stemmer = self.Stemmer()
+        self.normalizer = PhraseNormalizer(
+            [ "de", "la", "especie de", "una especie de" ], self.stemmer)
+
+    def test_remove_stopwords(self):
+        assert self.normalizer.remove_stopwords("la casa de piedra") == "casa piedra"
+        assert self.normalizer.remove_stopwords("una especie de  pez") == "pez"
+        assert self.normalizer.remove_stopwords("la") == "la"
+        assert remove_stopwords(" la casa ", [ "la" ]) == "casa"
+        # the filter is built once for the same stopwords
+        hits = _stopword_filter.cache_info().hits
+        assert remove_stopwords("la casa de piedra", [ "de", "la" ]) == "casa piedra"
+        assert remove_stopwords("casa de la piedra", [ "la", "de" ]) == "casa piedra"
+        assert _stopword_filter.cache_info().hits == hits + 1
+
+    def test_normalize(self):
+        assert self.normalizer.normalize("la casa") == [ "casa" ]
+        assert self.normalizer.normalize("casa grande") == []
+        assert self.normalizer.normalize("casas grandes", True) == [ "casa", "gran" ]
+        assert self.normalizer.normalize_batch([ "casas", "casas", "" ]) ==\
+            [ [ "casa" ], [ "casa" ], [] ]
+        assert self.stemmer.calls == 3
@@ -3,9 +3,10 @@
 import os
 import sys
 import unicodedata
-from qlc.corpusreader import CorpusReaderWordlist
+import collections
+import itertools
+import multiprocessing
 from qlc.orthography import OrthographyParser
-from configparser import SafeConfigParser
 from configparser import ConfigParser
 
 # class tokenzier:
@@ -45,9 +46,209 @@ class SpreadsheetParser:
     output_file.close()
     """
 
+# orthography parser of a worker process, set by _init_worker()
+_worker_parser = None
+
+def _init_worker(orthography_parser):
+    global _worker_parser
+    _worker_parser = orthography_parser
+
+def _parse_chunk(counterparts, method, orthography_parser=None):
+    if orthography_parser is None:
+        orthography_parser = _worker_parser
+    # parsers may parse a whole chunk at once, e.g. StoredOrthographyParser
+    parse_batch = getattr(orthography_parser, method + "_batch", None)
+    if parse_batch is not None:
+        return parse_batch(counterparts)
+    parse = getattr(orthography_parser, method)
+    return [ parse(counterpart) for counterpart in counterparts ]
+
+def _chunks(iterable, chunksize):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+def _emit(chunk, parses, unparsables):
+    for record, (success, parse) in zip(chunk, parses):
+        if success:
+            yield record + (parse,)
+        elif unparsables is not None:
+            unparsables.append(record + (parse,))
+
+def tokenize_parallel(records, orthography_parser,
+        method="parse_string_to_graphemes_string", processes=None,
+        chunksize=1000, max_chunks_in_flight=None, unparsables=None):
+    """
+    Parses the counterparts of (language, concept, counterpart) records with
+    an orthography parser in a pool of worker processes. Every worker gets
+    its own copy of the (compiled) parser once, at startup; afterwards only
+    chunks of counterparts and their parses are sent between the processes.
+
+    Parameters
+    ----------
+    records : iterable
+        An iterable of (language, concept, counterpart) tuples, e.g. a corpus
+        reader generator.
+    orthography_parser : OrthographyParser or GraphemeParser
+        The parser to use, it must be picklable.
+    method : str
+        The name of the parser method, e.g. "parse_string_to_graphemes".
+    processes : int
+        The number of worker processes, defaults to the number of CPUs. With
+        processes=1, or a parser with a true parse_in_process attribute
+        (e.g. a StoredOrthographyParser), the records are parsed in the
+        calling process.
+    chunksize : int
+        The number of records that are sent to a worker at once.
+    max_chunks_in_flight : int
+        The maximum number of chunks that are queued or being parsed at the
+        same time. This bounds the memory that is used independently of the
+        number of records. Defaults to twice the number of processes.
+    unparsables : list
+        If given, records that could not be parsed are appended to it as
+        (language, concept, counterpart, invalid_parse) tuples.
+
+    Returns
+    -------
+    A generator of (language, concept, counterpart, parse) tuples for all
+    parsable records, in the order of the input.
+    """
+    chunks = _chunks(records, chunksize)
+
+    if processes == 1 or getattr(orthography_parser, "parse_in_process", False):
+        for chunk in chunks:
+            counterparts = [ counterpart for _, _, counterpart in chunk ]
+            parses = _parse_chunk(counterparts, method, orthography_parser)
+            yield from _emit(chunk, parses, unparsables)
+        return
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if max_chunks_in_flight is None:
+        max_chunks_in_flight = 2 * processes
+
+    pool = multiprocessing.Pool(processes, _init_worker, (orthography_parser,))
+    try:
+        pending = collections.deque()
+        for chunk in chunks:
+            counterparts = [ counterpart for _, _, counterpart in chunk ]
+            pending.append(
+                (chunk, pool.apply_async(_parse_chunk, (counterparts, method))))
+            if len(pending) >= max_chunks_in_flight:
+                chunk, result = pending.popleft()
+                yield from _emit(chunk, result.get(), unparsables)
+        while pending:
+            chunk, result = pending.popleft()
+            yield from _emit(chunk, result.get(), unparsables)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+class FileSource(object):
+    """
+    Re-iterable source of (language, concept, counterpart) records from a
+    file in QLC format: counterpart \t concept \t language. The file is
+    opened again for every iteration and read line by line.
+    """
+
+    def __init__(self, path, encoding="utf-8"):
+        self.path = path
+        self.encoding = encoding
+
+    def __iter__(self):
+        with open(self.path, "r", encoding=self.encoding) as file:
+            for line in file:
+                line = line.strip()
+                if line == "":
+                    continue
+                line = line.replace("  ", " ")
+                counterpart, concept, language = line.split("\t")
+                yield (language, concept, counterpart)
+
+class CorpusReaderSource(object):
+    """
+    Re-iterable source of (wordlistdata_id, concept, counterpart) records of
+    a source (bibtex key) from a CorpusReaderWordlist.
+    """
+
+    def __init__(self, corpusreader, bibtex_key):
+        self.corpusreader = corpusreader
+        self.bibtex_key = bibtex_key
+
+    def __iter__(self):
+        cr = self.corpusreader
+        return ( (wordlistdata_id, concept, counterpart)
+            for wordlistdata_id in cr.wordlistdata_ids_for_bibtex_key(self.bibtex_key)
+            for concept, counterpart in cr.concepts_with_counterparts_for_wordlistdata_id(wordlistdata_id) )
+
+class LineWriter(object):
+    """
+    Collects lines and writes them to a file object in blocks of
+    buffer_lines lines, instead of one write call per line.
+    """
+
+    def __init__(self, file, buffer_lines=1000):
+        self.file = file
+        self.buffer_lines = buffer_lines
+        self._buffer = []
+
+    def write_line(self, line):
+        self._buffer.append(line)
+        if len(self._buffer) >= self.buffer_lines:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.file.write("\n".join(self._buffer) + "\n")
+            self._buffer = []
+        self.file.flush()
+
+class QlcFormat(object):
+    """
+    Output format counterpart \t ortho parse \t concept \t language.
+    Missing counterparts ("?", "NONE") are written as they are, unparsable
+    counterparts are skipped. Each method returns the line to write or None.
+    """
+
+    header = "COUNTERPART"+"\t"+"ORTHO_PARSE"+"\t"+"CONCEPT"+"\t"+"LANGUAGE"
+
+    def missing(self, language, concept, counterpart):
+        return counterpart+"\t"+counterpart+"\t"+concept+"\t"+language
+
+    def parsed(self, language, concept, counterpart, ortho_parse):
+        return counterpart+"\t"+ortho_parse+"\t"+concept+"\t"+language
+
+    def unparsable(self, language, concept, counterpart, invalid_parse):
+        return None
+
+class LingpyFormat(object):
+    """
+    LingPy output format language \t concept \t counterpart \t ortho parse.
+    Missing and unparsable counterparts are skipped.
+    """
+
+    header = "# LANGUAGE"+"\t"+"CONCEPT"+"\t"+"COUNTERPART"+"\t"+"ORTHO_PARSE"
+
+    def missing(self, language, concept, counterpart):
+        # skip for Mattis
+        return None
+
+    def parsed(self, language, concept, counterpart, ortho_parse):
+        return language+"\t"+concept+"\t"+counterpart+"\t"+ortho_parse
+
+    def unparsable(self, language, concept, counterpart, invalid_parse):
+        return None
+
+output_formats = { "qlc": QlcFormat, "lingpy": LingpyFormat }
+
 class Tokenizer:
 
-    """ takes as input a file with the QLC format:
+    """ takes as input a source of (language, concept, counterpart) records,
+    e.g. a file with the QLC format:
     counterpart \t concept \t language
 
     and does things like 
@@ -56,121 +257,137 @@ class Tokenizer:
     - tokenizes the data into ortographically parsed QLC format
     - locates unicorns
 
+    The source is read again for every output, so a Tokenizer can be used
+    any number of times. The records are parsed in chunks by a pool of
+    worker processes (see tokenize_parallel()), so only a bounded number of
+    chunks is held in memory at a time.
+
     """
 
-    def __init__(self):
-        # deal with configuration file
-        # configparser.read(default.cfg)
-        cfg = SafeConfigParser()
-        cfg.read("default.cfg")
+    # counterparts that mark missing data in the wordlists
+    missing_counterparts = ("?", "NONE")
 
-        data = cfg.get("Paths", "data")
-        orthography_profile = cfg.get("Paths", "orthography_profile")
+    def __init__(self, source, orthography_parser):
+        """
+        Constructor of Tokenizer class.
 
-        # set variables, e.g. source, orthography parser, etc.
-        self.data = open(data, "r")
+        Parameters
+        ----------
+        source : str or iterable
+            The path to a file in QLC format, or any re-iterable object of
+            (language, concept, counterpart) tuples, e.g. a CorpusReaderSource.
+        orthography_parser : OrthographyParser or str
+            The parser, or the path to an orthography profile.
 
-        self.o = OrthographyParser(orthography_profile)        
-        self._languages = []
-        self._concepts = []
-        self._counterparts = []
-        self._wordlist_iterator = self._process_input(self.data)
+        Returns
+        -------
+        Nothing
+        """
+        if isinstance(source, str):
+            source = FileSource(source)
+        if isinstance(orthography_parser, str):
+            orthography_parser = OrthographyParser(orthography_parser)
 
-        # print(type(self.iterator))
-        # print(len(self.counterparts))
-        # words = self.get_qlc_tokenized_words()
+        self.source = source
+        self.o = orthography_parser
+        self.unparsables = []
 
+    @classmethod
+    def from_config(cls, config_file="default.cfg"):
         """
-        count = 0
-        for line in words:
-            if line != "":
-                print(line)
-                count += 1
-        print(count)
+        Creates a Tokenizer from the "data" and "orthography_profile" entries
+        of the "Paths" section of a configuration file.
         """
+        cfg = ConfigParser()
+        cfg.read(config_file)
+        return cls(cfg.get("Paths", "data"), cfg.get("Paths", "orthography_profile"))
+
+    def get_qlc_tokenized_words(self, processes=None):
+        # unparsable records are collected in self.unparsables
+        self.unparsables = []
+        return [ grapheme_parse for _, _, _, grapheme_parse in
+            tokenize_parallel(self.source, self.o, processes=processes,
+                              unparsables=self.unparsables) ]
 
+    def get_ipa_tokenized_words(self, processes=None):
+        self.unparsables = []
+        return [ ipa_parse for _, _, _, ipa_parse in
+            tokenize_parallel(self.source, self.o,
+                              method="parse_string_to_ipa_string",
+                              processes=processes,
+                              unparsables=self.unparsables) ]
+
+    def write(self, output_format="qlc", output=None, buffer_lines=1000,
+              processes=None):
         """
-        self.cr = CorpusReaderWordlist("data/csv")
-        self.wordlist_iterator = ( (wordlistdata_id, concept, counterpart)
-            for wordlistdata_id in self.cr.wordlistdata_ids_for_bibtex_key(source)
-            for concept, counterpart in self.cr.concepts_with_counterparts_for_wordlistdata_id(wordlistdata_id)
-        )
+        Parses all records of the source with tokenize_parallel() and writes
+        them in the given output format, in the order of the source.
+
+        Parameters
+        ----------
+        output_format : str or object
+            "qlc", "lingpy" or an object with the same interface as QlcFormat.
+        output : file
+            The file object to write to, defaults to sys.stdout.
+        buffer_lines : int
+            The number of lines that are written at once.
+        processes : int
+            The number of worker processes, defaults to the number of CPUs.
+
+        Returns
+        -------
+        Nothing
         """
+        if isinstance(output_format, str):
+            output_format = output_formats[output_format]()
+        if output is None:
+            output = sys.stdout
 
-    def _process_input(self, file):
-        lines = []
-        for line in file:
-            line = line.strip()
-            line = line.replace("  ", " ")
-            concept, counterpart, language = line.split("\t")
-            result = (concept, counterpart, language)
-            lines.append(result)
-
-            self._languages.append(language) # pointless
-            self._concepts.append(concept) # pointless
-            self._counterparts.append(counterpart)
-        return ((concept, counterpart, language) for concept, counterpart, language in lines)
-
-
-    def get_qlc_tokenized_words(self):
-        unparasables = open("unparsables.txt", "w")
-        tokenized_words = []
-        for counterpart, concept, language in self._wordlist_iterator:
-            counterpart = unicodedata.normalize("NFD", counterpart)
-            grapheme_parsed_counterpart_tuple = self.o.parse_string_to_graphemes_string(counterpart)
-            if grapheme_parsed_counterpart_tuple[0] == False:
-                unparsables.write(grapheme_parsed_counterpart_tuple[1])
-                continue
-        
-            grapheme_parse = grapheme_parsed_counterpart_tuple[1]
-            tokenized_words.append(grapheme_parse)
-        return tokenized_words
-
-    def get_ipa_tokenized_words(self):
-        tokenized_words = []
-        words = get_list_qlc_tokenized_words()
-        for word in words:
-            grapheme_parsed_counterpart_tuple = self.o.parse_string_to_graphemes_string(counterpart)
-            
-    def lingpy_output(self):
-        # given some data set from the corpusreader, output a lingpy format
-        print("# LANGUAGE"+"\t"+"CONCEPT"+"\t"+"COUNTERPART"+"\t"+"ORTHO_PARSE")
-        for counterpart, concept, language in self._wordlist_iterator:
-            # skip for Mattis
-            if counterpart == "?" or counterpart == "NONE":
-                continue
+        writer = LineWriter(output, buffer_lines)
+        if output_format.header is not None:
+            writer.write_line(output_format.header)
+
+        def write_record(language, concept, counterpart, parse, success):
+            if counterpart in self.missing_counterparts:
+                line = output_format.missing(language, concept, counterpart)
+            elif success:
+                line = output_format.parsed(language, concept, counterpart, parse)
+            else:
+                line = output_format.unparsable(language, concept, counterpart, parse)
+            if line is not None:
+                writer.write_line(line)
 
-            grapheme_parsed_counterpart_tuple = self.o.parse_string_to_graphemes_string(counterpart)
-            if grapheme_parsed_counterpart_tuple[0] == False:
-                continue
+        # unparsable records are collected in self.unparsables; all the
+        # unparsables before a parsed record in the source are appended
+        # before the record is yielded, so the order is kept
+        self.unparsables = []
+        written = 0
+        for record in tokenize_parallel(self.source, self.o, processes=processes,
+                                        unparsables=self.unparsables):
+            for unparsable in self.unparsables[written:]:
+                write_record(*unparsable, success=False)
+            written = len(self.unparsables)
+            write_record(*record, success=True)
+        for unparsable in self.unparsables[written:]:
+            write_record(*unparsable, success=False)
+        writer.flush()
 
-            ortho_parse = grapheme_parsed_counterpart_tuple[1]
-            print(language+"\t"+concept+"\t"+counterpart+"\t"+grapheme_parsed_counterpart_tuple[1])
+    def lingpy_output(self, output=None, processes=None):
+        # given some data set from the corpusreader, output a lingpy format
+        self.write("lingpy", output, processes=processes)
 
     def matrix_output(self):
         # produce Jelena style output format with matrix
         pass
 
-    def qlc_output_format(self):
+    def qlc_output_format(self, output=None, processes=None):
         # produce counterpart \t concept \t language QLC output format
-        print("COUNTERPART"+"\t"+"ORTHO_PARSE"+"\t"+"CONCEPT"+"\t"+"LANGUAGE")
-        for counterpart, concept, language in self._wordlist_iterator:
-            if counterpart == "?" or counterpart == "NONE":
-                print(counterpart+"\t"+counterpart+"\t"+concept+"\t"+language)                
-                continue
-            grapheme_parsed_counterpart_tuple = self.o.parse_string_to_graphemes_string(counterpart)
-            
-            # skip shit that doesn't parse
-            if grapheme_parsed_counterpart_tuple[0] == False:
-                continue
-
-            ortho_parse = grapheme_parsed_counterpart_tuple[1]
-            print(counterpart+"\t"+ortho_parse+"\t"+concept+"\t"+language)
+        self.write("qlc", output, processes=processes)
 
 if __name__=="__main__":
     from qlc.tokenizer import Tokenizer
     from qlc import ngram
-    t = Tokenizer()
+    t = Tokenizer.from_config()
     t.qlc_output_format()
 #    words = t.get_qlc_tokenized_words()
 #    ngram.unigram_model(words)
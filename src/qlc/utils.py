@@ -6,6 +6,37 @@
 import regex
 import codecs
 import unicodedata
+import functools
+import collections
+
+# Unicode extended grapheme cluster
+_grapheme_pattern = regex.compile(r"\X", regex.UNICODE)
+
+# matches any character that may be part of a grapheme cluster with its
+# neighbours (combining marks, joiners, CR, Hangul jamo, ...). Strings without
+# these characters consist of single character graphemes.
+_cluster_char_pattern = regex.compile(r"[^\p{Grapheme_Cluster_Break=Other}]")
+
+def normalize(string, form="NFD"):
+    """
+    Returns the string in the given Unicode normalization form. Strings that
+    are already normalized (e.g. those from a corpus reader created with
+    normalization="NFD") are returned unchanged after a quick check.
+
+    Parameters
+    ----------
+    string : str
+        The string to normalize.
+    form : str
+        The normalization form: "NFD" (default), "NFC", "NFKD" or "NFKC".
+
+    Returns
+    -------
+    The normalized string.
+    """
+    if unicodedata.is_normalized(form, string):
+        return string
+    return unicodedata.normalize(form, string)
 
 def stopwords_from_file(stopwords_filepath = "data/stopwords/spa.txt"):
     stopwords = codecs.open(stopwords_filepath, "r", "utf-8")
@@ -14,22 +45,22 @@ def stopwords_from_file(stopwords_filepath = "data/stopwords/spa.txt"):
         word = line.rstrip("\n")
         word = regex.sub(" *\|.*$", "", word)
         if regex.search("[^\s]", word):
-            word = unicodedata.normalize("NFD", word)
-            ret.add(word)
+            ret.add(normalize(word))
     return ret
 
+@functools.lru_cache(maxsize=16)
+def _stopword_filter(stopwords):
+    return StopwordFilter(stopwords)
+
 def remove_stopwords(phrase, stopwords):
-    re_stopwords = regex.compile(r"\b(?:{0})\b".format( "|".join(stopwords).encode("utf-8") ))
-    re_spaces = regex.compile(" +")
-
-    phrase = phrase.strip(" ")
-    w_stop = phrase
-    if " " in w_stop:
-        w_stop = re_stopwords.sub("", w_stop)
-        w_stop = w_stop.strip(" ")
-        w_stop = re_spaces.sub(" ", w_stop)
-    return w_stop
-        
+    """
+    Removes all stopwords from a phrase of more than one word. The
+    StopwordFilter is cached per set of stopwords, so it is only built on
+    the first call; repeated calls still convert the stopwords to a
+    frozenset, a StopwordFilter or PhraseNormalizer avoids that.
+    """
+    return _stopword_filter(frozenset(stopwords)).remove_stopwords(phrase)
+
 def stem_phrase(phrase, stemmer, split_multiwords=False):
     if " " in phrase:
         if split_multiwords:
@@ -44,6 +75,133 @@ def stem_phrase(phrase, stemmer, split_multiwords=False):
     else:
         return([])
 
+class StopwordFilter(object):
+    """
+    Removes stopwords from phrases by looking up the words of the phrase in
+    a set. Stopwords that consist of more than one word (e.g. "especie de")
+    are matched on the word sequence, longer stopwords first.
+    """
+
+    def __init__(self, stopwords):
+        self.single_stopwords = set()
+        # { first word : [ (word, word, ...), ... ] }, longest first
+        self.multi_stopwords = collections.defaultdict(list)
+        for stopword in stopwords:
+            words = tuple(stopword.split())
+            if len(words) == 1:
+                self.single_stopwords.add(words[0])
+            elif len(words) > 1:
+                self.multi_stopwords[words[0]].append(words)
+        for first_word in self.multi_stopwords:
+            self.multi_stopwords[first_word].sort(key=len, reverse=True)
+
+    def remove_stopwords(self, phrase):
+        phrase = phrase.strip(" ")
+        if not " " in phrase:
+            return phrase
+
+        words = phrase.split()
+        ret = []
+        i = 0
+        while i < len(words):
+            word = words[i]
+            for stopword in self.multi_stopwords.get(word, ()):
+                if tuple(words[i:i+len(stopword)]) == stopword:
+                    i += len(stopword)
+                    break
+            else:
+                if not word in self.single_stopwords:
+                    ret.append(word)
+                i += 1
+        return " ".join(ret)
+
+class PhraseNormalizer(object):
+    """
+    Removes stopwords from phrases and stems them, e.g. for Spanish
+    translations in the translation graphs. Stems are cached per word, so
+    each distinct word is passed to the stemmer only once.
+
+    Example:
+
+    >>> from nltk.stem.snowball import SpanishStemmer
+    >>> normalizer = PhraseNormalizer(
+    ...     stopwords_from_file("data/stopwords/spa.txt"), SpanishStemmer())
+    >>> stems = normalizer.normalize("la casa grande", split_multiwords=True)
+    """
+
+    def __init__(self, stopwords, stemmer):
+        """
+        Constructor of PhraseNormalizer class.
+
+        Parameters
+        ----------
+        stopwords : iterable
+            The stopwords, e.g. from stopwords_from_file().
+        stemmer : object
+            A stemmer with a method stem() (NLTK) or stemWord() (PyStemmer).
+
+        Returns
+        -------
+        Nothing
+        """
+        self.stopword_filter = StopwordFilter(stopwords)
+        if hasattr(stemmer, "stemWord"):
+            self._stem = stemmer.stemWord
+        else:
+            self._stem = stemmer.stem
+        self._stems = {}
+
+    def stem(self, word):
+        try:
+            return self._stems[word]
+        except KeyError:
+            stem = self._stems[word] = self._stem(word)
+            return stem
+
+    def remove_stopwords(self, phrase):
+        return self.stopword_filter.remove_stopwords(phrase)
+
+    def stem_phrase(self, phrase, split_multiwords=False):
+        return stem_phrase(phrase, self, split_multiwords)
+
+    def normalize(self, phrase, split_multiwords=False):
+        """
+        Removes the stopwords from a phrase and returns the list of stems,
+        like stem_phrase(remove_stopwords(phrase, stopwords), stemmer).
+        """
+        return self.stem_phrase(self.remove_stopwords(phrase), split_multiwords)
+
+    def normalize_batch(self, phrases, split_multiwords=False):
+        """
+        Returns a list with the list of stems for each phrase.
+        """
+        return [ self.normalize(phrase, split_multiwords) for phrase in phrases ]
+
+@functools.lru_cache(maxsize=65536)
 def parse_graphemes(string):
-    grapheme_pattern = regex.compile("\X", regex.UNICODE)
-    return regex.split(grapheme_pattern, string)
+    """
+    Splits a string into its Unicode graphemes (extended grapheme clusters).
+    Results are cached per string.
+
+    Parameters
+    ----------
+    string : str
+        The string to split.
+
+    Returns
+    -------
+    A tuple of graphemes, e.g. ("a", "b", "e\u0301").
+    """
+    if _cluster_char_pattern.search(string) is None:
+        return tuple(string)
+    return tuple(_grapheme_pattern.findall(string))
+
+def parse_graphemes_batch(strings):
+    """
+    Splits each string of an iterable into its Unicode graphemes.
+
+    Returns
+    -------
+    A list of tuples of graphemes, one tuple for each input string.
+    """
+    return [ parse_graphemes(string) for string in strings ]